@@ -1,5 +1,5 @@
 from django.apps import AppConfig
-from django.db.models.signals import post_migrate
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save
 
 
 class AccountsConfig(AppConfig):
@@ -7,16 +7,30 @@ class AccountsConfig(AppConfig):
     name = 'accounts'
 
     def ready(self):
+        from django.contrib.auth.models import Group, Permission
+        from . import backends
+        from .models import User
         post_migrate.connect(create_groups, sender=self)
+        for through in (User.groups.through, User.user_permissions.through, Group.permissions.through):
+            m2m_changed.connect(backends.permissions_changed, sender=through)
+        for model in (Group, Permission):
+            post_save.connect(backends.group_changed, sender=model)
+            post_delete.connect(backends.group_changed, sender=model)
 
 
 def create_groups(sender, **kwargs):
+    from django.apps import apps
+    from django.contrib.auth.management import create_permissions
     from django.contrib.auth.models import Group, Permission
     from django.contrib.contenttypes.models import ContentType
     from events.models import Event, Review
+    from .models import STAFF_GROUP
+
+    # accounts migrates before events, so events' permissions may not exist yet
+    create_permissions(apps.get_app_config('events'), verbosity=0, using=kwargs.get('using', 'default'))
 
     # Create limited staff group
-    staff_group, _ = Group.objects.get_or_create(name='StaffEditors')
+    staff_group, _ = Group.objects.get_or_create(name=STAFF_GROUP)
 
     event_ct = ContentType.objects.get_for_model(Event)
     review_ct = ContentType.objects.get_for_model(Review)
@@ -25,6 +39,7 @@ def create_groups(sender, **kwargs):
         ('add_event', event_ct),
         ('change_event', event_ct),
         ('view_event', event_ct),
+        ('approve_event', event_ct),
         ('add_review', review_ct),
         ('change_review', review_ct),
         ('view_review', review_ct),
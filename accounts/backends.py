@@ -0,0 +1,70 @@
+"""Permission and group lookups cached across requests.
+
+ModelBackend already remembers a user's permissions on the user object, but
+that object only lives for one request, so every request that checks a
+permission pays two queries for it. CachedModelBackend keeps the sets in the
+cache under versioned keys (see events.cache): changing a group's permissions
+bumps the 'permissions' version for everyone, changing one user's groups or
+direct permissions bumps just theirs.
+
+The bumps only reach processes sharing the cache, so with the per-process
+default cache entries expire after PERMISSION_CACHE_TIMEOUT seconds instead.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+
+from events import cache as versions
+
+GLOBAL = 'permissions'
+
+
+def user_scope(pk):
+    return f'permissions:user:{pk}'
+
+
+def _key(user, kind):
+    return (f'perms:{kind}:{user.pk}:{int(user.is_superuser)}:'
+            f'{versions.version(GLOBAL)}:{versions.version(user_scope(user.pk))}')
+
+
+def _cached(user, kind, load):
+    attr = f'_{kind}_cache'
+    if not hasattr(user, attr):
+        key = _key(user, kind)
+        value = cache.get(key)
+        if value is None:
+            value = load()
+            cache.set(key, value, settings.PERMISSION_CACHE_TIMEOUT)
+        setattr(user, attr, value)
+    return getattr(user, attr)
+
+
+def group_names(user):
+    """frozenset of the user's group names."""
+    if not user.is_authenticated:
+        return frozenset()
+    return _cached(user, 'group_names', lambda: frozenset(user.groups.values_list('name', flat=True)))
+
+
+class CachedModelBackend(ModelBackend):
+    def _get_permissions(self, user_obj, obj, from_name):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        return _cached(user_obj, f'{from_name}_perm',
+                       lambda: super(CachedModelBackend, self)._get_permissions(user_obj, obj, from_name))
+
+
+def permissions_changed(sender, instance, action, **kwargs):
+    """m2m_changed for user.groups, user.user_permissions and group.permissions."""
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, Group) or isinstance(instance, Permission):
+        versions.bump(GLOBAL)
+    else:
+        versions.bump(user_scope(instance.pk))
+
+
+def group_changed(sender, **kwargs):
+    versions.bump(GLOBAL)
@@ -1,6 +1,9 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+STAFF_GROUP = 'StaffEditors'
+
+
 class User(AbstractUser):
     class Roles(models.TextChoices):
         REGULAR = 'regular', 'Regular'
@@ -10,4 +13,6 @@ class User(AbstractUser):
     bio = models.CharField(max_length=300, blank=True)
 
     def is_staffish(self) -> bool:
-        return self.is_staff or self.role in {self.Roles.STAFF, self.Roles.ADMIN}
+        from .backends import group_names
+        return (self.is_staff or self.role in {self.Roles.STAFF, self.Roles.ADMIN}
+                or STAFF_GROUP in group_names(self))
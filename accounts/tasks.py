@@ -0,0 +1,15 @@
+from django.core.mail import send_mail
+from django.urls import reverse
+
+from tasks.queue import task
+
+from .models import User
+
+
+@task(max_attempts=5, retry_delay=60)
+def send_welcome_email(user_id):
+    user = User.objects.filter(pk=user_id).exclude(email='').first()
+    if user:
+        send_mail("Welcome to EventHub",
+                  f"Hi {user.username}, your account is ready. Find something to do at {reverse('events:list')}.",
+                  None, [user.email])
@@ -1 +1,95 @@
-from django.test import TestCase
+from datetime import timedelta
+
+from django.contrib.auth.models import Group, Permission
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from events.models import Event, Review
+from tasks.models import Task
+from tasks.worker import Worker
+
+from .models import STAFF_GROUP, User
+
+
+class CachedPermissionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.get(name=STAFF_GROUP)  # created by post_migrate
+        cls.editor = User.objects.create_user('editor', password='pw')
+        cls.editor.groups.add(cls.group)
+        cls.owner = User.objects.create_user('owner', password='pw')
+        cls.event = Event.objects.create(owner=cls.owner, title='Owned', description='d', location='Sofia',
+                                         starts_at=timezone.now() + timedelta(days=3), capacity=5)
+        cls.review = Review.objects.create(user=cls.owner, event=cls.event, rating=3, comment='Ok.')
+
+    def setUp(self):
+        cache.clear()
+
+    def fresh(self, user):
+        return User.objects.get(pk=user.pk)  # a new request's user object
+
+    def test_permissions_and_groups_are_cached_across_requests(self):
+        user = self.fresh(self.editor)
+        self.assertTrue(user.has_perm('events.change_event'))
+        self.assertTrue(user.is_staffish())
+        user = self.fresh(self.editor)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm('events.change_event'))
+            self.assertFalse(user.has_perm('events.delete_event'))
+            self.assertTrue(user.is_staffish())
+
+    @override_settings(PERMISSION_CACHE_TIMEOUT=0)
+    def test_entries_expire_after_the_timeout(self):
+        self.assertTrue(self.fresh(self.editor).has_perm('events.change_event'))
+        user = self.fresh(self.editor)
+        with self.assertNumQueries(2):  # user and group permissions, loaded again
+            self.assertTrue(user.has_perm('events.change_event'))
+
+    def test_group_permission_change_invalidates(self):
+        self.assertTrue(self.fresh(self.editor).has_perm('events.change_event'))
+        self.group.permissions.remove(Permission.objects.get(codename='change_event'))
+        self.assertFalse(self.fresh(self.editor).has_perm('events.change_event'))
+
+    def test_membership_change_invalidates_only_that_user(self):
+        self.assertFalse(self.fresh(self.owner).is_staffish())
+        self.assertTrue(self.fresh(self.editor).is_staffish())
+        self.owner.groups.add(self.group)
+        self.editor.groups.clear()
+        self.assertTrue(self.fresh(self.owner).has_perm('events.change_event'))
+        self.assertFalse(self.fresh(self.editor).is_staffish())
+
+    def test_model_permissions_dont_open_other_peoples_objects(self):
+        self.client.force_login(self.editor)
+        for name, arg in [('events:edit', self.event.slug), ('events:delete', self.event.slug),
+                          ('events:review_edit', self.review.pk), ('events:review_delete', self.review.pk)]:
+            self.assertEqual(self.client.get(reverse(name, args=[arg])).status_code, 403, name)
+
+    def test_guarded_views_fetch_the_object_once(self):
+        self.client.force_login(self.owner)
+        # session, user, the object (with its event, for reviews)
+        with self.assertNumQueries(3):
+            self.client.get(reverse('events:delete', args=[self.event.slug]))
+        with self.assertNumQueries(3):
+            self.client.get(reverse('events:review_edit', args=[self.review.pk]))
+        other = User.objects.create_user('other', password='pw')
+        self.client.force_login(other)
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get(reverse('events:delete', args=[self.event.slug])).status_code, 403)
+
+
+class RegistrationTests(TestCase):
+    def test_welcome_email_is_sent_in_the_background(self):
+        response = self.client.post(reverse('accounts:register'), {
+            'username': 'newbie', 'email': 'Newbie@Example.com', 'bio': '',
+            'password1': 'a-long-Passw0rd', 'password2': 'a-long-Passw0rd',
+        })
+        self.assertRedirects(response, reverse('dashboard:home'), fetch_redirect_response=False)
+        self.assertEqual(mail.outbox, [])
+        user = User.objects.get(username='newbie')
+        self.assertEqual(Task.objects.get().kwargs, {'user_id': user.pk})
+        Worker(threads=0).run(once=True)
+        self.assertEqual([m.to for m in mail.outbox], [['newbie@example.com']])
+
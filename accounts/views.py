@@ -7,6 +7,7 @@ from django.views.generic import FormView
 
 
 from .forms import RegisterForm, LoginForm, ProfileUpdateForm
+from .tasks import send_welcome_email
 from django.contrib.auth.decorators import login_required
 
 
@@ -17,6 +18,7 @@ class RegisterView(FormView):
 
     def form_valid(self, form):
         user = form.save()
+        send_welcome_email.enqueue(user_id=user.pk)
         messages.success(self.request, "Welcome to EventHub, your account was created!")
         login(self.request, user)
         return super().form_valid(form)
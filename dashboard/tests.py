@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+
+from events.models import Event, Favorite, Review, Ticket
+
+User = get_user_model()
+
+
+def add_activity(user, n, prefix):
+    """n events owned by user, plus a ticket, review and favorite on each."""
+    starts_at = timezone.now() + timedelta(days=1)
+    Event.objects.bulk_create([
+        Event(owner=user, title=f'{prefix} {i}', description='d', location='Sofia',
+              starts_at=starts_at + timedelta(hours=i), capacity=5)
+        for i in range(n)
+    ])
+    events = Event.objects.filter(title__startswith=prefix)
+    Ticket.objects.bulk_create([Ticket(user=user, event=e) for e in events])
+    Review.objects.bulk_create([Review(user=user, event=e, rating=4, comment='Fine.') for e in events])
+    Favorite.objects.bulk_create([Favorite(user=user, event=e) for e in events])
+
+
+@override_settings(DASHBOARD_PAGE_SIZE=3)
+class DashboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('busy', password='pw')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('dashboard:home'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_data(self):
+        _, empty = self.get()
+        add_activity(self.user, 2, 'Small')
+        _, few = self.get()
+        add_activity(self.user, 40, 'Large')
+        response, many = self.get()
+        self.assertEqual(empty, few)
+        self.assertEqual(few, many)
+        self.assertEqual(response.context['counts'], {'events': 42, 'tickets': 42, 'reviews': 42, 'favorites': 42})
+        self.assertEqual(len(response.context['my_tickets']), 3)
+
+    def test_panels_page_through_everything(self):
+        add_activity(self.user, 8, 'Gig')
+        response, _ = self.get()
+        self.assertContains(response, 'Show more', count=4)
+        seen = [e['title'] for e in response.context['my_events']]
+        cursor = response.context['my_events'].next_cursor
+        while cursor:
+            response = self.client.get(reverse('dashboard:panel', args=['events']), {'cursor': cursor})
+            page = response.context['my_events']
+            seen += [e['title'] for e in page]
+            cursor = page.next_cursor
+        self.assertEqual(seen, [f'Gig {i}' for i in range(8)])
+
+    def test_panels_are_private(self):
+        other = User.objects.create_user('other', password='pw')
+        add_activity(other, 2, 'Theirs')
+        response, _ = self.get()
+        self.assertNotContains(response, 'Theirs')
+        self.assertEqual(response.context['counts']['events'], 0)
+        self.assertEqual(self.client.get(reverse('dashboard:panel', args=['secrets'])).status_code, 404)
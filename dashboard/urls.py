@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import dashboard_view
+from .views import dashboard_view, panel_view
 
 app_name = 'dashboard'
 
 urlpatterns = [
     path('', dashboard_view, name='home'),
+    path('<slug:name>/', panel_view, name='panel'),
 ]
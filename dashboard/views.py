@@ -1,13 +1,63 @@
+"""The user's dashboard: four panels of their own events, tickets, reviews and favorites.
+
+Each panel shows one cursor page of just the columns it renders (values(),
+no model instances), and "Show more" fetches the next page as a fragment.
+The per-panel totals come from one query, so the page costs the same number
+of queries however much the user has.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.http import Http404
 from django.shortcuts import render
 
+from events.models import Event, Favorite, Review, Ticket
+from events.pagination import CursorPaginator
+
+# panel name (also the related name on User) -> (model, owner field, ordering, columns)
+PANELS = {
+    'events': (Event, 'owner', ('starts_at', 'id'), ('id', 'slug', 'title', 'starts_at', 'status')),
+    'tickets': (Ticket, 'user', ('-booked_at', '-id'),
+                ('id', 'booked_at', 'seat_type', 'event__slug', 'event__title')),
+    'reviews': (Review, 'user', ('-created_at', '-id'),
+                ('id', 'created_at', 'rating', 'comment', 'event__slug', 'event__title')),
+    'favorites': (Favorite, 'user', ('-created_at', '-id'), ('id', 'created_at', 'event__slug', 'event__title')),
+}
+
+
+def panel_page(user, name, cursor=None):
+    model, owner, ordering, columns = PANELS[name]
+    queryset = model.objects.filter(**{owner: user}).values(*columns)
+    return CursorPaginator(queryset, ordering, settings.DASHBOARD_PAGE_SIZE).page(cursor)
+
+
+def panel_counts(user):
+    """{panel name: total rows} in a single query."""
+    def count(model, owner):
+        rows = model.objects.filter(**{owner: OuterRef('pk')}).order_by().values(owner).annotate(n=Count('*'))
+        return Coalesce(Subquery(rows.values('n'), output_field=IntegerField()), 0)
+
+    # aliased: the panel names are also the reverse relations on User
+    counts = {f'{name}_count': count(model, owner) for name, (model, owner, _, _) in PANELS.items()}
+    row = get_user_model().objects.filter(pk=user.pk).values(**counts).get()
+    return {name: row[f'{name}_count'] for name in PANELS}
+
+
 @login_required
 def dashboard_view(request):
     user = request.user
-    context = {
-        'my_events': user.events.select_related('category').all(),
-        'my_tickets': user.tickets.select_related('event').all(),
-        'my_reviews': user.reviews.select_related('event').all(),
-        'my_favorites': user.favorites.select_related('event').all(),
-    }
+    counts = panel_counts(user)
+    context = {f'my_{name}': panel_page(user, name) for name in PANELS}
+    context['counts'] = counts
     return render(request, 'dashboard/dashboard.html', context)
+
+
+@login_required
+def panel_view(request, name):
+    """Next page of one panel as an HTML fragment (see dashboard/_<name>.html)."""
+    if name not in PANELS:
+        raise Http404("No such panel")
+    page = panel_page(request.user, name, request.GET.get('cursor'))
+    return render(request, f'dashboard/_{name}.html', {f'my_{name}': page})
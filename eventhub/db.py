@@ -0,0 +1,34 @@
+"""SQLite connection tuning and lock handling.
+
+A database entry may carry a PRAGMAS dict (see SQLITE_PRODUCTION_PROFILE in
+settings); apply_pragmas runs them on every new connection through the
+connection_created signal. journal_mode is stored in the database file; the
+rest only last as long as the connection, hence once per connection.
+"""
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    pragmas = connection.settings_dict.get('PRAGMAS')
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def retry_on_lock(func, *args, attempts=None, base_delay=None, **kwargs):
+    """Call func, retrying with jittered backoff while SQLite reports a lock."""
+    attempts = attempts or getattr(settings, 'BOOKING_LOCK_RETRIES', 8)
+    base_delay = base_delay or getattr(settings, 'BOOKING_LOCK_BACKOFF', 0.005)
+    for attempt in range(attempts):
+        try:
+            return func(*args, **kwargs)
+        except OperationalError as exc:
+            if 'locked' not in str(exc) or attempt == attempts - 1:
+                raise
+            time.sleep(min(base_delay * 2 ** attempt, 0.25) * (1 + random.random()))
@@ -0,0 +1,145 @@
+"""Per-request SQL accounting: query budgets per URL name and N+1 detection.
+
+Every statement is recorded through connection.execute_wrapper. Statements
+are grouped by their SQL template (parameters are already separate, so the
+same query for different rows shares a template); a template repeated
+QUERY_NPLUSONE_THRESHOLD times in one request is reported as an N+1.
+"""
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('eventhub.queries')
+
+_IN_LIST = re.compile(r'\((?:%s, )+%s\)')
+
+
+def normalize(sql):
+    # IN (%s, %s, %s) -> IN (...), so batches of different sizes group together
+    return _IN_LIST.sub('(...)', sql)
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = []
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.duration += elapsed
+            self.queries.append((sql, elapsed))
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def repeated(self, threshold=None):
+        """SQL templates executed at least `threshold` times, most frequent first."""
+        threshold = threshold or settings.QUERY_NPLUSONE_THRESHOLD
+        counts = Counter(normalize(sql) for sql, _ in self.queries)
+        return [(sql, n) for sql, n in counts.most_common() if n >= threshold]
+
+
+def budget_for(view_name):
+    return settings.QUERY_BUDGETS.get(view_name, settings.QUERY_BUDGET_DEFAULT)
+
+
+@contextmanager
+def query_budget(limit, nplusone_threshold=None):
+    """Test helper: fail if the block runs more than `limit` queries or an N+1."""
+    recorder = QueryRecorder()
+    with recorder.record():
+        yield recorder
+    problems = []
+    if limit is not None and recorder.count > limit:
+        problems.append(f"{recorder.count} queries, budget is {limit}")
+    for sql, n in recorder.repeated(nplusone_threshold):
+        problems.append(f"N+1: {n}x {sql}")
+    if problems:
+        raise AssertionError("\n".join(problems))
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including the fields passed via `extra`."""
+    fields = ('view_name', 'path', 'query_count', 'query_time_ms', 'query_budget', 'n_plus_one')
+
+    def format(self, record):
+        payload = {'level': record.levelname, 'logger': record.name, 'message': record.getMessage()}
+        payload.update({f: getattr(record, f) for f in self.fields if hasattr(record, f)})
+        return json.dumps(payload)
+
+
+class QueryBudgetMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+        return self.report(request, response, recorder)
+
+    async def __acall__(self, request):
+        # the async ORM runs queries on the request's sync thread, whose
+        # connections are not the event loop's; install the wrapper there
+        recorder, stack = QueryRecorder(), ExitStack()
+        await sync_to_async(stack.enter_context)(recorder.record())
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.report(request, response, recorder)
+
+    def report(self, request, response, recorder):
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else None
+        budget = budget_for(view_name)
+        repeated = recorder.repeated()
+        over = budget is not None and recorder.count > budget
+
+        if settings.QUERY_BUDGET_HEADERS:
+            response['X-Query-Count'] = str(recorder.count)
+            response['X-Query-Time-Ms'] = f"{recorder.duration * 1000:.1f}"
+            if budget is not None:
+                response['X-Query-Budget'] = str(budget)
+            if repeated:
+                response['X-Query-N-Plus-One'] = str(len(repeated))
+        if over or repeated:
+            logger.warning(
+                "query budget: %s ran %d queries (budget %s, %d repeated)",
+                view_name or request.path, recorder.count, budget, len(repeated),
+                extra={
+                    'view_name': view_name,
+                    'path': request.path,
+                    'query_count': recorder.count,
+                    'query_time_ms': round(recorder.duration * 1000, 1),
+                    'query_budget': budget,
+                    'n_plus_one': [{'sql': sql, 'count': n} for sql, n in repeated],
+                },
+            )
+        return response
@@ -0,0 +1,129 @@
+"""Read replicas: reads go to a replica, writes and anything after them to the primary.
+
+Replicas are the database aliases listed in DATABASE_REPLICAS. A replica is
+only used while it is fresh: whatever keeps it in sync (`manage.py
+sync_replicas` for file-copied SQLite replicas) calls mark_synced() after each
+pass, and a replica that hasn't reported within REPLICA_MAX_LAG seconds is
+skipped. The sync times live in the default cache, so with several processes
+that has to be a shared cache (EVENTHUB_CACHE_DIR).
+
+Only requests (through ReplicaMiddleware) read from replicas. Tasks,
+management commands and the shell read from the primary: they often read
+right after writing, with nothing to pin them.
+
+Read-your-writes: once a request writes, the rest of it reads from the
+primary, and ReplicaMiddleware sets a cookie that pins the same client to the
+primary for REPLICA_PIN_SECONDS (e.g. the redirect after booking a ticket).
+Keep REPLICA_PIN_SECONDS above REPLICA_MAX_LAG; then any replica a pinned
+client is released to already has its writes.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'primary_pin'
+
+_request = ContextVar('replica_request_state', default=None)
+
+
+class RequestState:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+        self.replica = None
+
+
+def _synced_key(alias):
+    return f'replica:{alias}:synced_at'
+
+
+def mark_synced(alias, at=None):
+    """Record that alias has everything the primary committed up to `at` (default: now)."""
+    cache.set(_synced_key(alias), time.time() if at is None else at, timeout=None)
+
+
+def replica_lag(alias):
+    """Seconds since the replica last caught up, or None if it never reported."""
+    synced_at = cache.get(_synced_key(alias))
+    return None if synced_at is None else max(0.0, time.time() - synced_at)
+
+
+def fresh_replicas():
+    fresh = []
+    for alias in settings.DATABASE_REPLICAS:
+        lag = replica_lag(alias)
+        if lag is not None and lag <= settings.REPLICA_MAX_LAG:
+            fresh.append(alias)
+    return fresh
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        state = _request.get()
+        if state is None or state.pinned:
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            # one replica per request, so its reads see one consistent snapshot
+            replicas = fresh_replicas()
+            state.replica = random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _request.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # replicas hold the same rows as the primary
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaMiddleware:
+    """Scope replica choice to the request and pin clients to the primary after they write."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+        return self.finish(response, state)
+
+    async def __acall__(self, request):
+        # sync_to_async copies the context, so the ORM's threads see the state
+        state, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request.reset(token)
+        return self.finish(response, state)
+
+    def start(self, request):
+        pinned = request.method not in ('GET', 'HEAD', 'OPTIONS') or PIN_COOKIE in request.COOKIES
+        state = RequestState(pinned=pinned)
+        return state, _request.set(state)
+
+    def finish(self, response, state):
+        if state.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True,
+                                samesite='Lax')
+        return response
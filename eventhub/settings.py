@@ -18,9 +18,12 @@ INSTALLED_APPS = [
     'accounts',
     'events',
     'dashboard',
+    'tasks',
 ]
 
 MIDDLEWARE = [
+    'eventhub.querybudget.QueryBudgetMiddleware',
+    'eventhub.routers.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,7 +65,43 @@ DATABASES = {
     }
 }
 
+# EVENTHUB_DB_PROFILE=production: WAL so readers never block the writer,
+# PRAGMAs applied to every new connection (see eventhub/db.py), persistent
+# connections, and BEGIN IMMEDIATE so a transaction takes the write lock up
+# front and waits on busy_timeout instead of failing when it upgrades.
+SQLITE_PRODUCTION_PROFILE = {
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 5},
+    'PRAGMAS': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # KiB
+        'temp_store': 'MEMORY',
+    },
+}
+if os.environ.get('EVENTHUB_DB_PROFILE') == 'production':
+    DATABASES['default'].update(SQLITE_PRODUCTION_PROFILE)
+
+# Read replicas (eventhub.routers): EVENTHUB_REPLICAS=/srv/replica1.sqlite3,... adds
+# file-copied SQLite replicas kept fresh by `manage.py sync_replicas --interval 1`.
+for i, path in enumerate(filter(None, os.environ.get('EVENTHUB_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{i}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'CONN_MAX_AGE': DATABASES['default'].get('CONN_MAX_AGE', 0),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['eventhub.routers.ReplicaRouter']
+REPLICA_MAX_LAG = 5  # seconds; a replica that hasn't synced for longer is skipped
+REPLICA_PIN_SECONDS = 10  # reads go to the primary this long after a client writes
+
 AUTH_USER_MODEL = 'accounts.User'
+# ModelBackend with permission and group sets cached across requests
+AUTHENTICATION_BACKENDS = ['accounts.backends.CachedModelBackend']
 
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -86,6 +125,115 @@ LOGOUT_REDIRECT_URL = 'index'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+REVIEWS_PAGE_SIZE = 10
+DASHBOARD_PAGE_SIZE = 10
+API_PAGE_SIZE = 50
+# how far ahead series occurrences exist (EventSeries.materialize, materialize_series)
+EVENT_SERIES_WINDOW_DAYS = 90
+# admin changelists count exactly up to this many rows, then estimate (events.pagination)
+ADMIN_EXACT_COUNT_LIMIT = 10_000
+
+# moderation notices and other mail sent by background tasks (events.tasks)
+DEFAULT_FROM_EMAIL = os.environ.get('EVENTHUB_FROM_EMAIL', 'EventHub <noreply@eventhub.local>')
+EMAIL_BACKEND = os.environ.get('EVENTHUB_EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+
+# Caching (events.cache): versioned page and fragment caches. Local memory is per
+# process; point EVENTHUB_CACHE_DIR at a shared directory when running several workers.
+if os.environ.get('EVENTHUB_CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['EVENTHUB_CACHE_DIR'],
+        }
+    }
+    PERMISSION_CACHE_TIMEOUT = 3600
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'eventhub',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+    # a revoked permission must not outlive a few seconds in the other workers,
+    # whose caches never see the invalidation (accounts.backends)
+    PERMISSION_CACHE_TIMEOUT = 10
+PAGE_CACHE_ENABLED = True
+PAGE_CACHE_TIMEOUT = 300  # anonymous full-page responses
+
+# Serve the public read views (event list/detail, favorites) from events.async_views.
+# Only worth it under ASGI; under WSGI each async view costs an event loop hop.
+EVENTS_ASYNC_VIEWS = os.environ.get('EVENTHUB_ASYNC_VIEWS') == '1'
+
+# Ticket booking (events.booking): retries while SQLite reports "database is locked"
+BOOKING_LOCK_RETRIES = 8
+BOOKING_LOCK_BACKOFF = 0.005
+
+# Flash-sale mode (events.booking_queue): queue bookings and commit them in batches
+BOOKING_QUEUE_ENABLED = os.environ.get('EVENTHUB_BOOKING_QUEUE') == '1'
+BOOKING_QUEUE_BATCH_SIZE = 200
+BOOKING_QUEUE_MAX_WAIT = 0.02  # seconds the writer waits to fill a batch
+BOOKING_QUEUE_MAX_PENDING = 20000
+BOOKING_QUEUE_RESULT_TTL = 600
+
+# Waitlists (events.waitlist): freed seats are handed out by the events.promote_waitlist
+# task; the promote_waitlists command (and periodic task) is the sweep.
+WAITLIST_BATCH_SIZE = 100  # events per promotion transaction
+
+# Background tasks (tasks app): queued in the database, run by `manage.py run_tasks`
+TASKS_THREADS = 4
+TASKS_POLL_INTERVAL = 1.0  # seconds between polls of an empty queue
+TASKS_LOCK_TIMEOUT = 600  # a task running longer than this is presumed dead and retried
+TASKS_KEEP_DAYS = 7  # finished tasks are pruned after this
+TASKS_PERIODIC = {  # task name -> seconds between runs
+    'events.reconcile_counters': 3600,
+    'events.materialize_series': 24 * 3600,
+    'events.promote_waitlists': 600,
+    'tasks.prune': 24 * 3600,
+}
+if os.environ.get('EVENTHUB_CACHE_DIR'):  # warming a per-process cache only warms the worker
+    TASKS_PERIODIC['events.warm_cache'] = 60
+CACHE_WARM_EVENT_PAGES = 20  # busiest event pages events.warm_cache renders
+EXPORT_ROOT = Path(os.environ.get('EVENTHUB_EXPORT_ROOT', BASE_DIR / 'exports'))
+
+# Per-request SQL budgets by URL name (eventhub.querybudget). Over-budget requests and
+# N+1 patterns are logged to 'eventhub.queries'; DEBUG also adds X-Query-* headers.
+QUERY_BUDGETS = {
+    'index': 2,
+    'about': 2,
+    'events:list': 3,
+    'events:favorites': 3,
+    'events:detail': 4,
+    'events:reviews': 3,
+    'dashboard:home': 7,
+    'dashboard:panel': 3,
+    # event endpoints: one validator query (all a 304 costs), then the body's
+    'api:events': 2,
+    'api:event': 2,
+    'api:event_reviews': 3,
+    'api:event_availability': 3,
+    'api:availability': 2,
+    'api:categories': 1,
+}
+QUERY_BUDGET_DEFAULT = None
+QUERY_NPLUSONE_THRESHOLD = 5
+QUERY_BUDGET_HEADERS = DEBUG
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'eventhub.querybudget.JsonFormatter'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+        'json_console': {'class': 'logging.StreamHandler', 'formatter': 'json'},
+    },
+    'loggers': {
+        'eventhub.queries': {'handlers': ['console' if DEBUG else 'json_console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
 
 from django.contrib.admin import AdminSite
 AdminSite.site_header = "EventHub Admin"
@@ -2,15 +2,18 @@ from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import TemplateView
 
+from events.cache import cache_anonymous
+
 from django.conf.urls import handler404, handler500
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('', TemplateView.as_view(template_name='index.html'), name='index'),
-    path('about/', TemplateView.as_view(template_name='about.html'), name='about'),
+    path('', cache_anonymous(TemplateView.as_view(template_name='index.html'), scope=None), name='index'),
+    path('about/', cache_anonymous(TemplateView.as_view(template_name='about.html'), scope=None), name='about'),
     path('accounts/', include(('accounts.urls', 'accounts'), namespace='accounts')),
     path('events/', include(('events.urls', 'events'), namespace='events')),
     path('dashboard/', include(('dashboard.urls', 'dashboard'), namespace='dashboard')),
+    path('api/', include(('events.api_urls', 'api'), namespace='api')),
 ]
 
 handler404 = 'events.views.custom_404'
@@ -1,5 +1,52 @@
-from django.contrib import admin
-from .models import Category, Event, Ticket, Review, Favorite
+import io
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ORDER_VAR
+from django.contrib.auth import get_permission_codename, get_user_model
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.db.models import Q
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from . import bulk_io, search, waitlist
+from .booking import SoldOut, move_seat
+from .models import Category, Event, EventSeries, SeatPool, Ticket, Review, Favorite, WaitlistEntry
+from .pagination import EstimatedCountPaginator
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelists that don't COUNT(*) the whole table: see EstimatedCountPaginator."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+class UserEventAdmin(LargeTableAdmin):
+    """Tickets, reviews and favorites: rows keyed by (user, event), by far the biggest tables.
+
+    Both related columns are joined up front, the form picks them with
+    autocomplete instead of rendering every user and event into a <select>,
+    and search only uses indexes: an exact username, or words from the event
+    through the full-text index.
+    """
+    list_select_related = ('user', 'event')
+    # newest first; the pk follows booked_at/created_at (auto_now_add) and, unlike them, needs no sort
+    ordering = ('-pk',)
+    autocomplete_fields = ('user', 'event')
+    search_fields = ('=user__username', 'event__title')  # fallback without FTS
+    search_help_text = "An exact username, or words from the event."
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not search.is_available():
+            return super().get_search_results(request, queryset, search_term)
+        term = search_term.strip()
+        matches = Q(user__in=get_user_model().objects.filter(username=term).values('pk'))
+        event_ids = search.matching_ids(term)
+        if event_ids is not None:
+            matches |= Q(event_id__in=event_ids)
+        return queryset.filter(matches), False
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -8,37 +55,209 @@ class CategoryAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
     ordering = ('name',)
 
+class SeatPoolInline(admin.TabularInline):
+    model = SeatPool
+    extra = 0
+    readonly_fields = ('booked',)
+
+class ImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV or JSON Lines (.jsonl)")
+    kind = forms.ChoiceField(choices=[(k, k.title()) for k in bulk_io.IMPORTERS], initial='events')
+    dry_run = forms.BooleanField(required=False, help_text="Only validate; nothing is saved.")
+
+    def __init__(self, *args, user, **kwargs):
+        super().__init__(*args, **kwargs)
+        # only what the user may add
+        self.fields['kind'].choices = [
+            (kind, kind.title()) for kind, importer in bulk_io.IMPORTERS.items()
+            if user.has_perm(f'events.{get_permission_codename("add", importer.model._meta)}')]
+
 @admin.register(Event)
-class EventAdmin(admin.ModelAdmin):
-    list_display = ('title', 'category', 'owner', 'starts_at', 'capacity', 'tickets_count')
-    list_filter = ('category', 'starts_at')
+class EventAdmin(LargeTableAdmin):
+    change_list_template = 'admin/events/event/change_list.html'
+    inlines = [SeatPoolInline]
+    list_display = ('title', 'category', 'owner', 'status', 'starts_at', 'capacity', 'tickets_booked', 'rating_avg',
+                    'reviews_count')
+    # category is nullable, so the automatic select_related() would skip it and query it per row
+    list_select_related = ('category', 'owner')
+    autocomplete_fields = ('owner',)
+    list_filter = ('status', 'category', 'starts_at')
     search_fields = ('title', 'description', 'location')
     ordering = ('starts_at',)
-    date_hierarchy = 'starts_at'
-    readonly_fields = ('created_at', 'slug')
+    readonly_fields = ('created_at', 'slug', 'status', 'moderated_at', 'moderated_by', 'tickets_booked', 'reviews_count',
+                       'rating_avg')
 
-    @admin.action(description="Approve selected events")
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not search.is_available():
+            return super().get_search_results(request, queryset, search_term)
+        queryset = search.annotate_matches(queryset, search_term)
+        if ORDER_VAR not in request.GET:
+            # best matches first unless the user sorted by a column
+            queryset = queryset.order_by('search_rank', '-pk')
+        return queryset, False
+
+    def get_list_display(self, request):
+        list_display = super().get_list_display(request)
+        if request.GET.get('q') and search.is_available():
+            return (*list_display, 'search_match')
+        return list_display
+
+    @admin.display(description="Match")
+    def search_match(self, obj):
+        return mark_safe(search.render_highlight(getattr(obj, 'search_snippet', '') or ''))
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if change:
+            # capacity or seat pools may have grown
+            waitlist.schedule(form.instance.pk)
+
+    def has_approve_permission(self, request):
+        return request.user.has_perm('events.approve_event')
+
+    @admin.action(description="Approve selected events", permissions=['approve'])
     def approve_events(self, request, queryset):
-        self.message_user(request, f"Approved {queryset.count()} event(s).")
+        changed = queryset.moderate(Event.Status.APPROVED, request.user)
+        self.message_user(request, f"Approved {len(changed)} event(s).")
+
+    @admin.action(description="Reject selected events", permissions=['approve'])
+    def reject_events(self, request, queryset):
+        changed = queryset.moderate(Event.Status.REJECTED, request.user)
+        self.message_user(request, f"Rejected {len(changed)} event(s).")
+
+    @admin.action(description="Export selected events as CSV")
+    def export_csv(self, request, queryset):
+        return bulk_io.streaming_csv('events', queryset, 'events.csv')
+
+    @admin.action(description="Export attendees of selected events as CSV")
+    def export_attendees(self, request, queryset):
+        tickets = Ticket.objects.filter(event__in=queryset.values('pk'))
+        return bulk_io.streaming_csv('attendees', tickets, 'attendees.csv')
 
-    actions = ['approve_events']
+    actions = ['approve_events', 'reject_events', 'export_csv', 'export_attendees']
+
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='events_event_import'),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = ImportForm(request.POST or None, request.FILES or None, user=request.user)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            kwargs = {'dry_run': form.cleaned_data['dry_run']}
+            if form.cleaned_data['kind'] == 'events':
+                kwargs['owner'] = request.user.pk
+            importer = bulk_io.IMPORTERS[form.cleaned_data['kind']](**kwargs)
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8', newline='')
+            result = importer.run(bulk_io.read_rows(stream, bulk_io.guess_format(upload.name)))
+            for line_no, message in result.errors[:20]:
+                self.message_user(request, f"Line {line_no}: {message}", messages.WARNING)
+            self.message_user(request, f"{'Checked' if kwargs['dry_run'] else 'Imported'}: {result}")
+            return redirect('admin:events_event_changelist')
+        context = {**self.admin_site.each_context(request), 'opts': self.model._meta, 'form': form,
+                   'title': "Import events"}
+        return TemplateResponse(request, 'admin/events/event/import.html', context)
+
+@admin.register(EventSeries)
+class EventSeriesAdmin(admin.ModelAdmin):
+    list_display = ('title', 'owner', 'frequency', 'interval', 'starts_at', 'until', 'status', 'materialized_until')
+    list_filter = ('frequency', 'status')
+    list_select_related = ('owner',)
+    search_fields = ('title',)
+    autocomplete_fields = ('owner',)
+    readonly_fields = ('status', 'materialized_until', 'created_at')
+    actions = ['approve_series', 'reject_series']
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change:
+            EventSeries.materialize(EventSeries.objects.filter(pk=obj.pk))
+            return
+        if any(name in form.changed_data for name in EventSeries.RULE_FIELDS):
+            obj.reschedule()
+        obj.update_occurrences()
+
+    def has_approve_permission(self, request):
+        return request.user.has_perm('events.approve_event')
+
+    def moderate(self, request, queryset, status):
+        queryset.update(status=status)  # future occurrences inherit it
+        upcoming = Event.objects.filter(series__in=queryset.values('pk'), starts_at__gte=timezone.now())
+        return len(upcoming.moderate(status, request.user))
+
+    @admin.action(description="Approve selected series and their upcoming events", permissions=['approve'])
+    def approve_series(self, request, queryset):
+        self.message_user(request, f"Approved {self.moderate(request, queryset, Event.Status.APPROVED)} event(s).")
+
+    @admin.action(description="Reject selected series and their upcoming events", permissions=['approve'])
+    def reject_series(self, request, queryset):
+        self.message_user(request, f"Rejected {self.moderate(request, queryset, Event.Status.REJECTED)} event(s).")
+
+class TicketAdminForm(forms.ModelForm):
+    class Meta:
+        model = Ticket
+        fields = '__all__'
+
+    def booked_seat(self):
+        if self.instance.pk:
+            return Ticket.objects.filter(pk=self.instance.pk).values_list('event_id', 'seat_type').first()
+
+    def clean(self):
+        cleaned = super().clean()
+        if cleaned.get('event') and cleaned.get('seat_type'):
+            # try the move and roll it back; save_model makes it for real
+            try:
+                with transaction.atomic():
+                    move_seat(self.booked_seat(), cleaned['event'].pk, cleaned['seat_type'])
+                    transaction.set_rollback(True)
+            except SoldOut as exc:
+                raise forms.ValidationError(str(exc))
+        return cleaned
 
 @admin.register(Ticket)
-class TicketAdmin(admin.ModelAdmin):
+class TicketAdmin(UserEventAdmin):
+    form = TicketAdminForm
     list_display = ('user', 'event', 'seat_type', 'booked_at')
     list_filter = ('seat_type', 'booked_at')
-    search_fields = ('user__username', 'event__title')
-    ordering = ('-booked_at',)
+    actions = ['export_attendees']
+
+    def save_model(self, request, obj, form, change):
+        # through the counters like any other booking (events.booking)
+        old = form.booked_seat()
+        move_seat(old, obj.event_id, obj.seat_type)
+        obj._counter_reserved = True
+        super().save_model(request, obj, form, change)
+        if old and old != (obj.event_id, obj.seat_type):
+            waitlist.schedule(old[0])
+
+    @admin.action(description="Export selected tickets as CSV")
+    def export_attendees(self, request, queryset):
+        return bulk_io.streaming_csv('attendees', queryset, 'attendees.csv')
+
+class RatingFilter(admin.SimpleListFilter):
+    """Fixed 1-5 choices; the default filter would SELECT DISTINCT rating over every review."""
+    title = "rating"
+    parameter_name = 'rating'
+
+    def lookups(self, request, model_admin):
+        return [(str(i), str(i)) for i in range(1, 6)]
+
+    def queryset(self, request, queryset):
+        return queryset.filter(rating=self.value()) if self.value() else queryset
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(UserEventAdmin):
     list_display = ('event', 'user', 'rating', 'created_at')
-    list_filter = ('rating', 'created_at')
-    search_fields = ('event__title', 'user__username', 'comment')
-    ordering = ('-created_at',)
+    list_filter = (RatingFilter, 'created_at')
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(UserEventAdmin):
     list_display = ('user', 'event', 'created_at')
-    search_fields = ('user__username', 'event__title')
-    ordering = ('-created_at',)
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(UserEventAdmin):
+    list_display = ('user', 'event', 'seat_type', 'created_at')
+    list_filter = ('seat_type',)
@@ -0,0 +1,204 @@
+"""Read-only JSON API for events, categories, reviews and seat availability.
+
+Rows come straight from values() and are never turned into model instances.
+Event responses carry a strong ETag and Last-Modified derived from the events
+they are built from: how many there are and their newest Event.updated_at,
+which every save and queryset update of an event moves (bookings, reviews,
+moderation, counter repairs). A client revalidating with If-None-Match or
+If-Modified-Since costs one indexed aggregate, answered before the view runs;
+the availability endpoints polled by kiosks mostly end there with an empty
+304. Renaming an organizer doesn't touch their events, so it shows up with
+the events' next change. The category list has no such column and is ETagged
+from its (small) body instead.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.http import Http404, JsonResponse
+from django.utils.cache import get_conditional_response, set_response_etag
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_safe
+
+from .models import Category, Event, Review, SeatPool
+from .pagination import CursorPaginator
+
+# API field -> ORM lookup
+EVENT_FIELDS = {
+    'id': 'id',
+    'slug': 'slug',
+    'title': 'title',
+    'description': 'description',
+    'location': 'location',
+    'starts_at': 'starts_at',
+    'category': 'category__slug',
+    'organizer': 'owner__username',
+    'capacity': 'capacity',
+    'tickets_booked': 'tickets_booked',
+    'rating_avg': 'rating_avg',
+    'reviews_count': 'reviews_count',
+}
+DEFAULT_EVENT_FIELDS = ('id', 'slug', 'title', 'location', 'starts_at', 'category', 'capacity', 'tickets_booked')
+REVIEW_FIELDS = {'id': 'id', 'user': 'user__username', 'rating': 'rating', 'comment': 'comment',
+                 'created_at': 'created_at'}
+SORTS = {
+    'date': ('starts_at', 'id'),
+    'rating': ('-rating_avg', '-id'),
+    'reviews': ('-reviews_count', '-id'),
+}
+MAX_AVAILABILITY_IDS = 100
+
+
+def _availability_ids(request):
+    try:
+        ids = sorted({int(i) for i in request.GET.get('ids', '').split(',') if i})
+    except ValueError:
+        return None
+    return ids if 0 < len(ids) <= MAX_AVAILABILITY_IDS else None
+
+
+def _validators(events):
+    """ETag and Last-Modified callbacks for condition(); events(request, ...) returns the events a response shows."""
+    def state(request, *args, **kwargs):
+        # one query for both callbacks
+        if not hasattr(request, '_api_state'):
+            request._api_state = events(request, *args, **kwargs).aggregate(count=Count('pk'),
+                                                                             updated=Max('updated_at'))
+        return request._api_state
+
+    def etag(request, *args, **kwargs):
+        found = state(request, *args, **kwargs)
+        return f"{found['count']}-{found['updated'].timestamp():.6f}" if found['count'] else None
+
+    def last_modified(request, *args, **kwargs):
+        return state(request, *args, **kwargs)['updated']
+
+    return etag, last_modified
+
+
+def api_view(view=None, *, events=None):
+    """GET/HEAD only and always revalidated by clients.
+
+    Validators come from events(request, *args, **kwargs), the events the
+    response shows; without it the ETag is a hash of the body.
+    """
+    def decorator(view):
+        if events is not None:
+            etag, last_modified = _validators(events)
+            conditional = condition(etag_func=etag, last_modified_func=last_modified)(view)
+        else:
+            @wraps(view)
+            def conditional(request, *args, **kwargs):
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                set_response_etag(response)
+                return get_conditional_response(request, etag=response['ETag'], response=response)
+        return require_safe(cache_control(max_age=0, must_revalidate=True)(conditional))
+    return decorator(view) if view else decorator
+
+
+def _bad_request(message):
+    return JsonResponse({'error': message}, status=400)
+
+
+def _fields(request, allowed, default):
+    """The ?fields= selection (comma separated), or None if it names an unknown field."""
+    names = [f for f in request.GET.get('fields', '').split(',') if f] or list(default)
+    return names if all(f in allowed for f in names) else None
+
+
+def _rows(queryset, names, mapping, ordering):
+    """values() over the selected fields plus the ordering columns the cursor needs."""
+    lookups = list(dict.fromkeys([mapping[f] for f in names] + [f.lstrip('-') for f in ordering]))
+    return queryset.values(*lookups)
+
+
+def _serialize(rows, names, mapping):
+    return [{name: row[mapping[name]] for name in names} for row in rows]
+
+
+def _page_payload(page, items):
+    return {'results': items, 'next': page.next_cursor, 'previous': page.previous_cursor}
+
+
+def _listed(request):
+    queryset = Event.objects.approved()
+    if request.GET.get('category'):
+        queryset = queryset.filter(category__slug=request.GET['category'])
+    return queryset
+
+
+def _one(request, pk):
+    return Event.objects.approved().filter(pk=pk)
+
+
+def _requested(request):
+    ids = _availability_ids(request)
+    return Event.objects.none() if ids is None else Event.objects.approved().filter(pk__in=ids)
+
+
+@api_view(events=_listed)
+def event_list(request):
+    names = _fields(request, EVENT_FIELDS, DEFAULT_EVENT_FIELDS)
+    if names is None:
+        return _bad_request(f"fields must be among: {', '.join(EVENT_FIELDS)}")
+    ordering = SORTS.get(request.GET.get('sort'), SORTS['date'])
+    paginator = CursorPaginator(_rows(_listed(request), names, EVENT_FIELDS, ordering), ordering,
+                                settings.API_PAGE_SIZE)
+    page = paginator.page(request.GET.get('cursor'))
+    return JsonResponse(_page_payload(page, _serialize(page, names, EVENT_FIELDS)))
+
+
+@api_view(events=_one)
+def event_detail(request, pk):
+    names = _fields(request, EVENT_FIELDS, EVENT_FIELDS)
+    if names is None:
+        return _bad_request(f"fields must be among: {', '.join(EVENT_FIELDS)}")
+    row = _one(request, pk).values(*(EVENT_FIELDS[f] for f in names)).first()
+    if row is None:
+        raise Http404("No such event.")
+    return JsonResponse(_serialize([row], names, EVENT_FIELDS)[0])
+
+
+@api_view(events=_one)
+def event_reviews(request, pk):
+    if not _one(request, pk).exists():
+        raise Http404("No such event.")
+    names = list(REVIEW_FIELDS)
+    ordering = ('-created_at', '-id')
+    queryset = Review.objects.filter(event_id=pk)
+    paginator = CursorPaginator(_rows(queryset, names, REVIEW_FIELDS, ordering), ordering, settings.API_PAGE_SIZE)
+    page = paginator.page(request.GET.get('cursor'))
+    return JsonResponse(_page_payload(page, _serialize(page, names, REVIEW_FIELDS)))
+
+
+@api_view(events=_one)
+def event_availability(request, pk):
+    row = _one(request, pk).values('capacity', 'tickets_booked').first()
+    if row is None:
+        raise Http404("No such event.")
+    pools = SeatPool.objects.filter(event_id=pk).values_list('seat_type', 'capacity', 'booked')
+    return JsonResponse({
+        'id': pk,
+        'capacity': row['capacity'],
+        'available': max(row['capacity'] - row['tickets_booked'], 0),
+        'seat_types': {seat_type: max(capacity - booked, 0) for seat_type, capacity, booked in pools},
+    })
+
+
+@api_view(events=_requested)
+def availability(request):
+    """Seats left for up to MAX_AVAILABILITY_IDS events: ?ids=1,2,3 -> {"1": 12, "2": 0, ...}."""
+    ids = _availability_ids(request)
+    if ids is None:
+        return _bad_request(f"ids must be 1 to {MAX_AVAILABILITY_IDS} comma-separated event ids")
+    rows = _requested(request).values_list('pk', 'capacity', 'tickets_booked')
+    return JsonResponse({str(pk): max(capacity - booked, 0) for pk, capacity, booked in rows})
+
+
+@api_view
+def category_list(request):
+    approved = Q(events__status=Event.Status.APPROVED)
+    rows = Category.objects.annotate(events_count=Count('events', filter=approved)).values('name', 'slug', 'events_count')
+    return JsonResponse({'results': list(rows)})
@@ -0,0 +1,14 @@
+from django.urls import path
+
+from . import api
+
+app_name = 'api'
+
+urlpatterns = [
+    path('events/', api.event_list, name='events'),
+    path('events/<int:pk>/', api.event_detail, name='event'),
+    path('events/<int:pk>/reviews/', api.event_reviews, name='event_reviews'),
+    path('events/<int:pk>/availability/', api.event_availability, name='event_availability'),
+    path('availability/', api.availability, name='availability'),
+    path('categories/', api.category_list, name='categories'),
+]
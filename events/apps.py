@@ -1,7 +1,12 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class EventsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'events'
 
+    def ready(self):
+        from eventhub import db
+        from . import signals  # noqa: F401
+        connection_created.connect(db.apply_pragmas)
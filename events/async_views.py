@@ -0,0 +1,76 @@
+"""Native async versions of the public read views, for ASGI deployments.
+
+They render the same templates with the same context as their sync
+counterparts in events.views and replace them when EVENTS_ASYNC_VIEWS is on.
+Templates render on the event loop, where a database query raises
+SynchronousOnlyOperation, so everything a template could load lazily (the
+user, the session, related rows) is fetched up front with the async ORM.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404
+from django.shortcuts import render
+
+from . import cache
+from .models import Event, Favorite
+from .pagination import CursorPaginator
+from .views import (EventListView, FavoriteListView, event_detail_context, event_detail_queryset,
+                    event_list_queryset, review_paginator, search_page)
+
+
+async def _load_user(request):
+    request.user = await request.auser()
+    # {% if messages %} reads the session while rendering; load it now
+    await request.session.aitems()
+    return request.user
+
+
+async def event_list(request):
+    await _load_user(request)
+    view = EventListView
+    query = request.GET.get('q', '').strip()
+    if query:
+        page = await sync_to_async(search_page)(request, query, view.paginate_by, view.cursor_param)
+        paginator = None
+    else:
+        ordering = view.sort_orderings.get(request.GET.get('sort'), view.cursor_ordering)
+        paginator = CursorPaginator(event_list_queryset(request), ordering, view.paginate_by)
+        page = await paginator.apage(request.GET.get(view.cursor_param))
+    events = page.object_list
+    cache.depends_on(request, *(cache.event_scope(e.pk) for e in events))
+    return render(request, view.template_name, {
+        'paginator': paginator, 'page_obj': page, 'is_paginated': page.has_other_pages(),
+        'object_list': events, 'events': events,
+    })
+
+
+async def event_detail(request, slug):
+    user = await _load_user(request)
+    # the moderation filter may need the user's permissions, a sync lookup
+    queryset = await sync_to_async(event_detail_queryset)(user)
+    try:
+        event = await queryset.aget(slug=slug)
+    except Event.DoesNotExist:
+        raise Http404("No event found matching the query")
+    cache.depends_on(request, cache.event_scope(event.pk))
+    # fetched even if the template ends up using its cached fragment: a lazy
+    # fetch at render time can't run on the event loop
+    reviews = await review_paginator(event.reviews.all()).apage()
+    context = {'object': event, 'event': event, **event_detail_context(event, user, reviews)}
+    return render(request, 'events/event_detail.html', context)
+
+
+async def favorite_list(request):
+    user = await _load_user(request)
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+    view = FavoriteListView
+    paginator = CursorPaginator(Favorite.objects.filter(user=user).select_related('event'),
+                                view.cursor_ordering, view.paginate_by)
+    page = await paginator.apage(request.GET.get(view.cursor_param))
+    favorites = page.object_list
+    return render(request, view.template_name, {
+        'paginator': paginator, 'page_obj': page, 'is_paginated': page.has_other_pages(),
+        'object_list': favorites, 'favorites': favorites,
+    })
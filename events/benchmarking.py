@@ -0,0 +1,74 @@
+"""Helpers shared by the bench_* management commands."""
+import importlib
+import os
+import statistics
+import sys
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from django.urls import clear_url_caches
+
+
+@contextmanager
+def scratch_database():
+    """Run against a throwaway, fully migrated copy of the schema instead of real data.
+
+    SQLite scratch databases live in a temp file rather than in memory so that
+    locking behaves like the real file-backed database.
+    """
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    saved_name = test_settings.get('NAME')
+    tmpdir = None
+    if connection.vendor == 'sqlite' and not saved_name:
+        tmpdir = tempfile.mkdtemp(prefix='eventhub-bench-')
+        test_settings['NAME'] = os.path.join(tmpdir, 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = saved_name
+        if tmpdir:
+            os.rmdir(tmpdir)
+
+
+def _reload_urlconf():
+    for name in ('events.urls', settings.ROOT_URLCONF):
+        if name in sys.modules:
+            importlib.reload(sys.modules[name])
+    clear_url_caches()
+
+
+@contextmanager
+def async_views(enabled=True):
+    """Serve the public pages from events.async_views (or not) for the duration."""
+    try:
+        with override_settings(EVENTS_ASYNC_VIEWS=enabled):
+            _reload_urlconf()
+            yield
+    finally:
+        _reload_urlconf()
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(samples):
+    """Latency samples in seconds -> dict of milliseconds."""
+    return {
+        'count': len(samples),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3) if samples else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'max_ms': round(max(samples) * 1000, 3) if samples else 0.0,
+    }
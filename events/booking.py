@@ -0,0 +1,77 @@
+"""Ticket booking service.
+
+Capacity is reserved with conditional UPDATEs on the denormalized counters
+(Event.tickets_booked and SeatPool.booked), so two requests can never both take
+the last seat. Views and any other entry point should book through here.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from eventhub.db import retry_on_lock
+
+from .models import Event, SeatPool, Ticket
+
+
+class BookingError(Exception):
+    pass
+
+
+class SoldOut(BookingError):
+    pass
+
+
+class AlreadyBooked(BookingError):
+    pass
+
+
+def reserve_seats(event_id, seat_type, count=1, has_pools=None):
+    """Take `count` seats or raise SoldOut. Must run inside a transaction.
+
+    Pass has_pools when the caller already knows whether the event sells per
+    seat type; it saves a query.
+    """
+    taken = (Event.objects.filter(pk=event_id, tickets_booked__lte=F('capacity') - count)
+             .update(tickets_booked=F('tickets_booked') + count))
+    if not taken:
+        raise SoldOut("This event is sold out.")
+    if has_pools is False:
+        return
+    pools = SeatPool.objects.filter(event_id=event_id)
+    taken = (pools.filter(seat_type=seat_type, booked__lte=F('capacity') - count)
+             .update(booked=F('booked') + count))
+    if not taken and (has_pools or pools.exists()):
+        # the event sells per seat type and this one is full (or not offered)
+        raise SoldOut(f"No {Ticket.Seat(seat_type).label} seats left.")
+
+
+def move_seat(old, event_id, seat_type):
+    """Take a seat of seat_type at event_id, giving back old ((event_id, seat_type), or None).
+
+    For tickets written outside book_ticket, such as in the admin. Must run
+    inside a transaction; on SoldOut the counters are left as they were.
+    """
+    if old == (event_id, seat_type):
+        return
+    with transaction.atomic():
+        if old:
+            Event.adjust_booked(old[0], -1)
+            SeatPool.adjust_booked(*old, -1)
+        reserve_seats(event_id, seat_type)
+
+
+def _book(user, event_id, seat_type):
+    try:
+        with transaction.atomic():
+            reserve_seats(event_id, seat_type)
+            ticket = Ticket(user=user, event_id=event_id, seat_type=seat_type)
+            ticket._counter_reserved = True
+            ticket.save(force_insert=True)
+    except IntegrityError:
+        raise AlreadyBooked("You already have a ticket for this event.")
+    return ticket
+
+
+def book_ticket(user, event, seat_type=Ticket.Seat.STANDARD):
+    """Atomically reserve a seat and create the ticket. Raises BookingError subclasses."""
+    event_id = event.pk if isinstance(event, Event) else event
+    return retry_on_lock(_book, user, event_id, seat_type)
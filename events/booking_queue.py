@@ -0,0 +1,209 @@
+"""Admission queue for flash-sale bookings.
+
+With BOOKING_QUEUE_ENABLED, TicketCreateView hands requests to an in-process
+queue and returns right away with a position. A single writer thread drains
+the queue and commits whole batches (one transaction, one bulk_create), so the
+SQLite writer lock is taken once per batch instead of once per request.
+
+The queue and its results live in the process that took the request. Run
+flash-sale mode with one web process (or sticky sessions): ticket_status in
+another process only finds out about a request once its ticket is committed.
+"""
+import collections
+import itertools
+import logging
+import queue
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+
+from eventhub.db import retry_on_lock
+
+from .booking import SoldOut, reserve_seats
+from .models import SeatPool, Ticket
+from .tasks import send_ticket_confirmations
+
+logger = logging.getLogger(__name__)
+
+PENDING, BOOKED, SOLD_OUT, DUPLICATE, FAILED = 'pending', 'booked', 'sold_out', 'duplicate', 'failed'
+
+MESSAGES = {
+    BOOKED: "Ticket booked. See you there!",
+    SOLD_OUT: "This event is sold out.",
+    DUPLICATE: "You already have a ticket for this event.",
+    FAILED: "We couldn't process your booking, please try again.",
+}
+
+
+class QueueFull(Exception):
+    pass
+
+
+@dataclass
+class BookingRequest:
+    user_id: int
+    event_id: int
+    seat_type: str
+    seq: int
+    token: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = PENDING
+    ticket_id: int = None
+    done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def message(self):
+        return MESSAGES.get(self.status, "")
+
+
+class BookingQueue:
+    def __init__(self, batch_size=None, max_wait=None, max_pending=None):
+        self.batch_size = batch_size or settings.BOOKING_QUEUE_BATCH_SIZE
+        self.max_wait = max_wait if max_wait is not None else settings.BOOKING_QUEUE_MAX_WAIT
+        self._queue = queue.Queue(maxsize=max_pending or settings.BOOKING_QUEUE_MAX_PENDING)
+        self._requests = {}
+        self._seq = itertools.count(1)
+        self._processed = 0
+        self._finished = collections.deque()
+        self.result_ttl = settings.BOOKING_QUEUE_RESULT_TTL
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, user, event, seat_type):
+        """Enqueue a booking; returns the request (token + position)."""
+        self.start()
+        with self._lock:
+            req = BookingRequest(user.pk, event.pk, seat_type, next(self._seq))
+            try:
+                self._queue.put_nowait(req)
+            except queue.Full:
+                raise QueueFull("Too many people are booking right now, please try again.")
+            self._requests[req.token] = req
+        return req
+
+    def get(self, token):
+        return self._requests.get(token)
+
+    def position(self, req):
+        return max(req.seq - self._processed, 0) if req.status == PENDING else 0
+
+    def wait(self, token, timeout=None):
+        req = self._requests[token]
+        req.done.wait(timeout)
+        return req
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='booking-writer', daemon=True)
+                    self._thread.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            close_old_connections()
+            try:
+                retry_on_lock(self.process_batch, batch)
+            except Exception:
+                logger.exception("booking batch of %d failed", len(batch))
+                for req in batch:
+                    req.status = FAILED
+            finally:
+                self._finish(batch)
+
+    def _finish(self, batch):
+        now = time.monotonic()
+        with self._lock:
+            self._processed = max(self._processed, max(req.seq for req in batch))
+            self._finished.extend((now, req.token) for req in batch)
+            # forget results nobody came back for
+            while self._finished and self._finished[0][0] < now - self.result_ttl:
+                self._requests.pop(self._finished.popleft()[1], None)
+        for req in batch:
+            req.done.set()
+
+    def process_batch(self, batch):
+        """Commit a batch of requests in one transaction. Sets each request's status.
+
+        A batch that won't commit (say a ticket booked outside the queue since
+        the duplicate check) is retried one request at a time, so only the
+        conflicting request fails.
+        """
+        try:
+            return self._commit(batch)
+        except IntegrityError:
+            if len(batch) > 1:
+                for req in batch:
+                    retry_on_lock(self.process_batch, [req])
+                return batch
+            req = batch[0]
+            logger.warning("booking request %s didn't commit", req.token, exc_info=True)
+            booked = Ticket.objects.filter(user_id=req.user_id, event_id=req.event_id).exists()
+            req.status = DUPLICATE if booked else FAILED
+            return batch
+
+    def _commit(self, batch):
+        outcomes = {}
+        event_ids = {r.event_id for r in batch}
+        with transaction.atomic():
+            existing = set(Ticket.objects.filter(
+                event_id__in=event_ids,
+                user_id__in={r.user_id for r in batch},
+            ).values_list('user_id', 'event_id'))
+            pooled = set(SeatPool.objects.filter(event_id__in=event_ids).values_list('event_id', flat=True))
+            tickets = []
+            for req in batch:
+                key = (req.user_id, req.event_id)
+                if key in existing:
+                    outcomes[req.token] = DUPLICATE
+                    continue
+                try:
+                    with transaction.atomic():
+                        reserve_seats(req.event_id, req.seat_type, has_pools=req.event_id in pooled)
+                except SoldOut:
+                    outcomes[req.token] = SOLD_OUT
+                    continue
+                existing.add(key)
+                ticket = Ticket(user_id=req.user_id, event_id=req.event_id, seat_type=req.seat_type)
+                ticket._counter_reserved = True
+                tickets.append((req, ticket))
+            Ticket.objects.bulk_create([t for _, t in tickets])
+            if tickets:
+                send_ticket_confirmations.enqueue(ticket_ids=[t.pk for _, t in tickets])
+        for req in batch:
+            req.status = outcomes.get(req.token, BOOKED)
+        for req, ticket in tickets:
+            req.ticket_id = ticket.pk
+        return batch
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = BookingQueue()
+    return _queue
+
+
+def is_enabled():
+    return getattr(settings, 'BOOKING_QUEUE_ENABLED', False)
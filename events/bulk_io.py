@@ -0,0 +1,313 @@
+"""Bulk import and export of categories, events and tickets as CSV or JSON Lines.
+
+Imports read rows lazily, validate each one with the same rules as the web
+forms, and write valid rows with bulk_create, one transaction per batch.
+Foreign keys are given by natural key (category slug, username, event slug)
+and resolved through per-run lookup maps, so a batch costs a handful of
+queries however many rows share an owner or category. Invalid rows are
+reported and skipped; they never abort the batch.
+
+Exports stream rows from values_list().iterator(), so memory stays flat.
+"""
+import csv
+import io
+import json
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils.text import slugify
+
+from . import cache
+from .booking import SoldOut, reserve_seats
+from .forms import CategoryForm, EventForm
+from .models import Category, Event, Ticket
+
+FORMATS = ('csv', 'jsonl')
+
+
+def guess_format(path, default='csv'):
+    for fmt in FORMATS:
+        if str(path).endswith(f'.{fmt}'):
+            return fmt
+    return default
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, dict) from a text stream."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, {k.strip(): (v or '').strip() for k, v in row.items() if k}
+    else:
+        for line_no, line in enumerate(stream, 1):
+            if line.strip():
+                yield line_no, json.loads(line)
+
+
+def write_rows(rows, fields, fmt):
+    """Yield text chunks (one per row, header first for CSV) for rows of values."""
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in ([fields], rows):
+            for values in row:
+                writer.writerow(values)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    else:
+        for values in rows:
+            yield json.dumps(dict(zip(fields, values)), default=str) + '\n'
+
+
+class KeyMap:
+    """Natural key -> pk, filled with one query per batch of unseen keys."""
+
+    def __init__(self, queryset, field):
+        self.queryset = queryset
+        self.field = field
+        self.cache = {}
+
+    def preload(self):
+        self.cache.update(self.queryset.values_list(self.field, 'pk'))
+        return self
+
+    def resolve(self, keys):
+        missing = {k for k in keys if k and k not in self.cache}
+        if missing:
+            found = dict(self.queryset.filter(**{f'{self.field}__in': missing}).values_list(self.field, 'pk'))
+            self.cache.update({k: found.get(k) for k in missing})
+
+    def get(self, key):
+        return self.cache.get(key)
+
+
+class ImportEventForm(EventForm):
+    """EventForm without the category select; the importer resolves categories by slug."""
+
+    class Meta(EventForm.Meta):
+        fields = ('title', 'description', 'location', 'starts_at', 'capacity')
+
+
+class ImportCategoryForm(CategoryForm):
+    def validate_unique(self):
+        pass  # the importer checks names against the set it loaded, not with a query per row
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def error(self, line_no, message):
+        self.errors.append((line_no, message))
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (f"{self.rows} rows, {self.created} created, {len(self.errors)} rejected "
+                f"in {self.elapsed:.2f}s ({self.rows_per_second:.0f} rows/s)")
+
+
+class Importer:
+    """Imports rows in batches; subclasses set model and turn a batch into unsaved objects in build()."""
+    model = None
+    fields = ()
+
+    def __init__(self, batch_size=1000, dry_run=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+
+    def run(self, rows, progress=None):
+        result = ImportResult()
+        rows = iter(rows)
+        while batch := list(islice(rows, self.batch_size)):
+            with transaction.atomic():
+                objs = self.build(batch, result)
+                if objs and not self.dry_run:
+                    self.write(objs)
+                if self.dry_run:
+                    transaction.set_rollback(True)
+            result.rows += len(batch)
+            result.created += len(objs)
+            result.elapsed = time.perf_counter() - result.started
+            if progress:
+                progress(result)
+        result.elapsed = time.perf_counter() - result.started
+        return result
+
+    def write(self, objs):
+        self.model.objects.bulk_create(objs)
+
+
+class CategoryImporter(Importer):
+    model = Category
+    fields = ('name', 'slug')
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        existing = list(Category.objects.values_list('name', 'slug'))
+        self.names = {name for name, _ in existing}
+        self.slugs = {slug for _, slug in existing}
+
+    def build(self, batch, result):
+        objs = []
+        for line_no, row in batch:
+            name = (row.get('name') or '').strip()
+            if name in self.names:
+                continue  # already there; re-running an import is harmless
+            form = ImportCategoryForm(data={'name': name})
+            if not form.is_valid():
+                result.error(line_no, _form_errors(form))
+                continue
+            slug = row.get('slug') or slugify(name)[:100]
+            if slug in self.slugs:  # another category, or an earlier row that slugifies the same
+                result.error(line_no, f"slug {slug!r} is already taken")
+                continue
+            self.names.add(name)
+            self.slugs.add(slug)
+            objs.append(Category(name=name, slug=slug))
+        return objs
+
+    def write(self, objs):
+        Category.objects.bulk_create(objs)
+        cache.bump()
+
+
+class EventImporter(Importer):
+    model = Event
+    fields = ('slug', 'title', 'owner', 'category', 'description', 'location', 'starts_at', 'capacity')
+
+    def __init__(self, owner=None, **kwargs):
+        super().__init__(**kwargs)
+        self.default_owner = owner
+        self.categories = KeyMap(Category.objects.all(), 'slug').preload()
+        self.users = KeyMap(get_user_model().objects.all(), 'username')
+        self.slugs = set()  # explicit slugs seen in this run
+
+    def build(self, batch, result):
+        self.users.resolve(row.get('owner') for _, row in batch)
+        slugs = {row['slug'] for _, row in batch if row.get('slug')} - self.slugs
+        taken = set(Event.objects.filter(slug__in=slugs).values_list('slug', flat=True)) if slugs else set()
+        objs = []
+        for line_no, row in batch:
+            owner_id = self.users.get(row.get('owner')) if row.get('owner') else self.default_owner
+            category_id = self.categories.get(row.get('category')) if row.get('category') else None
+            if row.get('slug') in self.slugs:
+                result.error(line_no, f"slug {row['slug']!r} is already used earlier in the file")
+                continue
+            if row.get('slug') in taken:
+                continue  # imported before
+            if owner_id is None:
+                result.error(line_no, f"unknown owner {row.get('owner')!r}")
+                continue
+            if row.get('category') and category_id is None:
+                result.error(line_no, f"unknown category {row['category']!r}")
+                continue
+            form = ImportEventForm(data=row)
+            if not form.is_valid():
+                result.error(line_no, _form_errors(form))
+                continue
+            event = form.save(commit=False)
+            event.owner_id, event.category_id = owner_id, category_id
+            if row.get('slug'):
+                event.slug = row['slug']
+                self.slugs.add(event.slug)
+            objs.append(event)
+        return objs
+
+
+class TicketImporter(Importer):
+    """Seats are reserved like any other booking, so imports can't oversell."""
+    model = Ticket
+    fields = ('event', 'user', 'seat_type')
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.events = KeyMap(Event.objects.all(), 'slug')
+        self.users = KeyMap(get_user_model().objects.all(), 'username')
+        self.seat_types = set(Ticket.Seat.values)
+
+    def build(self, batch, result):
+        self.events.resolve(row.get('event') for _, row in batch)
+        self.users.resolve(row.get('user') for _, row in batch)
+        wanted = {}
+        for line_no, row in batch:
+            event_id, user_id = self.events.get(row.get('event')), self.users.get(row.get('user'))
+            seat_type = row.get('seat_type') or Ticket.Seat.STANDARD
+            if event_id is None or user_id is None:
+                result.error(line_no, f"unknown {'event' if event_id is None else 'user'}")
+            elif seat_type not in self.seat_types:
+                result.error(line_no, f"invalid seat type {seat_type!r}")
+            elif (event_id, user_id) in wanted:
+                result.error(line_no, "duplicate ticket in file")
+            else:
+                wanted[event_id, user_id] = (line_no, seat_type)
+        existing = set(Ticket.objects.filter(event_id__in={e for e, _ in wanted}, user_id__in={u for _, u in wanted})
+                       .values_list('event_id', 'user_id'))
+        groups = {}
+        for (event_id, user_id), (line_no, seat_type) in wanted.items():
+            if (event_id, user_id) in existing:
+                continue
+            groups.setdefault((event_id, seat_type), []).append(Ticket(event_id=event_id, user_id=user_id,
+                                                                       seat_type=seat_type))
+        objs = []
+        for (event_id, seat_type), tickets in groups.items():
+            try:
+                with transaction.atomic():
+                    reserve_seats(event_id, seat_type, len(tickets))
+            except SoldOut as exc:
+                for ticket in tickets:
+                    result.error(wanted[ticket.event_id, ticket.user_id][0], str(exc))
+                continue
+            for ticket in tickets:
+                ticket._counter_reserved = True
+            objs += tickets
+        return objs
+
+
+IMPORTERS = {
+    'categories': CategoryImporter,
+    'events': EventImporter,
+    'tickets': TicketImporter,
+}
+
+EXPORTS = {
+    'categories': (Category, ('name', 'slug'), ('name', 'slug')),
+    'events': (Event, EventImporter.fields,
+               ('slug', 'title', 'owner__username', 'category__slug', 'description', 'location',
+                'starts_at', 'capacity')),
+    'tickets': (Ticket, TicketImporter.fields + ('booked_at',),
+                ('event__slug', 'user__username', 'seat_type', 'booked_at')),
+    'attendees': (Ticket, ('event', 'user', 'email', 'seat_type', 'booked_at'),
+                  ('event__slug', 'user__username', 'user__email', 'seat_type', 'booked_at')),
+}
+
+
+def export_rows(kind, queryset=None, chunk_size=2000):
+    """(fields, row iterator) for an export; rows come from the database in chunks."""
+    model, fields, columns = EXPORTS[kind]
+    queryset = model.objects.all() if queryset is None else queryset
+    # pk order keeps the export cheap and stable; skip Meta.ordering joins and sorts
+    rows = queryset.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size)
+    return fields, (tuple(v.isoformat() if hasattr(v, 'isoformat') else v for v in row) for row in rows)
+
+
+def streaming_csv(kind, queryset, filename, chunk_size=2000):
+    """Download response that sends the header row before the query even runs."""
+    fields, rows = export_rows(kind, queryset, chunk_size)
+    response = StreamingHttpResponse(write_rows(rows, fields, 'csv'), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _form_errors(form):
+    return '; '.join(f"{field}: {' '.join(errors)}" for field, errors in form.errors.items())
@@ -0,0 +1,186 @@
+"""Page and fragment caching with versioned keys.
+
+Nothing is deleted on invalidation: every cache key embeds a version number
+and writes bump the version, so stale entries just stop being read and age
+out. There are two kinds of version:
+
+* 'events' covers anything that lists events (list pages, review fragments,
+  detail pages) and is bumped by any change to an event, its reviews or
+  category.
+* 'event:<pk>' covers one event's card and review fragments, so re-rendering a
+  list after one event changed reuses the cached cards of all the others.
+
+Cached full pages are keyed on a scope (usually 'events') and also remember
+the versions of the 'event:<pk>' scopes the view declared with depends_on();
+a page is only served while none of those moved. Tickets only bump their
+event's scope, so during a sale a booking re-renders just the pages that show
+that event (reusing every other cached card) instead of emptying the cache.
+
+Versions start at the current time in microseconds rather than 1, so an
+evicted version key can never bring back entries cached under an old one.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+GLOBAL = 'events'
+# bumps of more scopes than this (bulk moderation) are batched, see _bump_many
+INCR_LIMIT = 20
+
+
+def _version_key(scope):
+    return f'version:{scope}'
+
+
+def event_scope(pk):
+    return f'event:{pk}'
+
+
+def version(scope=GLOBAL):
+    key = _version_key(scope)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, time.time_ns() // 1000, timeout=None)
+        value = cache.get(key)
+    return value
+
+
+def versions(*scopes):
+    """[version(scope) for scope in scopes], in one cache round trip when they are all set."""
+    keys = [_version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    return [found[key] if key in found else version(scope) for scope, key in zip(scopes, keys)]
+
+
+def _bump(scopes):
+    if len(scopes) > INCR_LIMIT:
+        return _bump_many(scopes)
+    for scope in scopes:
+        try:
+            cache.incr(_version_key(scope))
+        except ValueError:
+            version(scope)
+
+
+def _bump_many(scopes):
+    # two round trips instead of one incr per scope; the current time is past any
+    # version version() handed out, and old + 1 keeps it moving if the clock doesn't
+    keys = [_version_key(scope) for scope in scopes]
+    now = time.time_ns() // 1000
+    found = cache.get_many(keys)
+    cache.set_many({key: max(found.get(key, 0) + 1, now) for key in keys}, timeout=None)
+
+
+def bump(*scopes):
+    """Invalidate everything cached under these scopes.
+
+    Bumps now, so later reads in this transaction see a fresh version, and
+    again on commit, so pages rendered from pre-commit data are dropped too.
+    """
+    scopes = scopes or (GLOBAL,)
+    _bump(scopes)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(scopes))
+
+
+def bump_events(*event_ids):
+    bump(GLOBAL, *{event_scope(pk) for pk in event_ids})
+
+
+def depends_on(request, *scopes):
+    """Serve request's cached page only while these scopes keep their versions.
+
+    Call after reading the data they cover: the versions are read when the page
+    is stored, and bump() bumps again on commit, so a write that raced the read
+    still invalidates the page.
+    """
+    request._cache_scopes = getattr(request, '_cache_scopes', ()) + scopes
+
+
+def _page_key(request, scope):
+    url = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f"page:{version(scope) if scope else 0}:{url}"
+
+
+def _cached(key):
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    scopes, seen, response = entry
+    if scopes and versions(*scopes) != seen:
+        return None
+    response['X-Cache'] = 'hit'
+    return response
+
+
+def _store_later(request, key, response, timeout):
+    response['X-Cache'] = 'miss'
+
+    def store(response):
+        if (response.status_code == 200 and not response.cookies
+                and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')):
+            scopes = getattr(request, '_cache_scopes', ())
+            cache.set(key, (scopes, versions(*scopes) if scopes else [], response),
+                      settings.PAGE_CACHE_TIMEOUT if timeout is None else timeout)
+
+    if hasattr(response, 'render') and not response.is_rendered:
+        response.add_post_render_callback(store)
+    else:
+        store(response)
+    return response
+
+
+def _cacheable(request):
+    if not settings.PAGE_CACHE_ENABLED or request.method not in ('GET', 'HEAD'):
+        return False
+    if request.user.is_authenticated:
+        return False
+    # pending flash messages would be baked into the page
+    return not (request.COOKIES.get('messages') or request.session.get('_messages'))
+
+
+async def _acacheable(request):
+    if not settings.PAGE_CACHE_ENABLED or request.method not in ('GET', 'HEAD'):
+        return False
+    if (await request.auser()).is_authenticated:
+        return False
+    return not (request.COOKIES.get('messages') or await request.session.aget('_messages'))
+
+
+def cache_anonymous(view=None, *, scope=GLOBAL, timeout=None):
+    """Cache a view's full response for anonymous GETs, keyed on the URL and scope version.
+
+    The view can add per-event scopes with depends_on().
+
+    Responses that set cookies or need a CSRF token are never stored. Works on
+    sync and async views.
+    """
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def wrapper(request, *args, **kwargs):
+                if not await _acacheable(request):
+                    return await view_func(request, *args, **kwargs)
+                key = _page_key(request, scope)
+                response = _cached(key)
+                if response is None:
+                    response = _store_later(request, key, await view_func(request, *args, **kwargs), timeout)
+                return response
+        else:
+            @wraps(view_func)
+            def wrapper(request, *args, **kwargs):
+                if not _cacheable(request):
+                    return view_func(request, *args, **kwargs)
+                key = _page_key(request, scope)
+                response = _cached(key)
+                if response is None:
+                    response = _store_later(request, key, view_func(request, *args, **kwargs), timeout)
+                return response
+        return wrapper
+    return decorator(view) if view else decorator
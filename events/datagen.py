@@ -0,0 +1,123 @@
+"""Seeded fake data for benchmarks and local testing.
+
+Popularity is Zipf-distributed: a few events get most of the tickets,
+reviews and favorites, and a few users organize most of the events, which is
+what makes list pages, dashboards and admin changelists slow in practice.
+Everything goes through bulk_create, so slugs and the denormalized counters
+are maintained exactly as in production.
+"""
+import itertools
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Category, Event, Favorite, Review, Ticket
+
+PASSWORD = 'bench-password'
+
+WORDS = ('jazz', 'python', 'marathon', 'sofia', 'night', 'market', 'summit', 'workshop', 'film', 'festival',
+         'startup', 'yoga', 'chess', 'wine', 'tasting', 'open', 'air', 'concert', 'meetup', 'design',
+         'data', 'vinyl', 'poetry', 'climbing', 'board', 'games', 'photo', 'walk', 'retro', 'coding')
+LOCATIONS = ('Sofia', 'Plovdiv', 'Varna', 'Burgas', 'Ruse', 'Online')
+RATINGS = (1, 2, 3, 4, 5)
+RATING_WEIGHTS = (5, 7, 18, 35, 35)
+
+
+def zipf_weights(n, s):
+    return list(itertools.accumulate(1 / (rank ** s) for rank in range(1, n + 1)))
+
+
+class Generator:
+    def __init__(self, users=1000, categories=20, events=2000, tickets=20_000, reviews=5000, favorites=10_000,
+                 zipf=1.1, seed=42, prefix='seed', batch_size=2000):
+        self.sizes = {'users': users, 'categories': categories, 'events': events,
+                      'tickets': tickets, 'reviews': reviews, 'favorites': favorites}
+        self.zipf = zipf
+        self.rng = random.Random(seed)
+        self.prefix = prefix
+        self.batch_size = batch_size
+
+    def text(self, n):
+        return ' '.join(self.rng.choices(WORDS, k=n))
+
+    def run(self, progress=None):
+        created = {}
+        for step in ('users', 'categories', 'events', 'tickets', 'reviews', 'favorites'):
+            with transaction.atomic():
+                created[step] = getattr(self, f'make_{step}')(self.sizes[step])
+            if progress:
+                progress(step, created[step])
+        return created
+
+    def make_users(self, n):
+        User = get_user_model()
+        password = make_password(PASSWORD)  # hashing once, not n times
+        users = User.objects.bulk_create([
+            User(username=f'{self.prefix}{i}', email=f'{self.prefix}{i}@example.com', password=password)
+            for i in range(n)
+        ], batch_size=self.batch_size)
+        self.user_ids = [u.pk for u in users]
+        return len(users)
+
+    def make_categories(self, n):
+        categories = Category.objects.bulk_create([
+            Category(name=f'{self.prefix.title()} {word.title()} {i}', slug=f'{self.prefix}-{word}-{i}')
+            for i, word in zip(range(n), itertools.cycle(WORDS))
+        ])
+        self.category_ids = [c.pk for c in categories]
+        return len(categories)
+
+    def make_events(self, n):
+        rng, now = self.rng, timezone.now()
+        organizers = zipf_weights(len(self.user_ids), self.zipf)
+        owners = rng.choices(self.user_ids, cum_weights=organizers, k=n)
+        events = [
+            Event(owner_id=owner, category_id=rng.choice(self.category_ids + [None]),
+                  title=self.text(rng.randint(2, 4)).title(), description=self.text(rng.randint(20, 60)),
+                  location=rng.choice(LOCATIONS), capacity=rng.choice((20, 50, 100, 250, 1000)),
+                  status=Event.Status.APPROVED,
+                  starts_at=now + timedelta(minutes=rng.randint(60, 365 * 24 * 60)))
+            for owner in owners
+        ]
+        for offset in range(0, n, self.batch_size):
+            Event.objects.bulk_create(events[offset:offset + self.batch_size])
+        # rank 1 is the most popular event; shuffle so popularity isn't tied to creation order
+        self.events = [(e.pk, e.capacity) for e in events]
+        rng.shuffle(self.events)
+        self.popularity = zipf_weights(len(self.events), self.zipf)
+        return len(self.events)
+
+    def pairs(self, n, limit=None):
+        """Up to n distinct (user_id, event_id), events by popularity, optionally capped per event."""
+        rng, seen, taken = self.rng, set(), {}
+        events = rng.choices(self.events, cum_weights=self.popularity, k=n)
+        for event_id, capacity in events:
+            user_id = rng.choice(self.user_ids)
+            if (user_id, event_id) in seen or (limit and taken.get(event_id, 0) >= capacity):
+                continue
+            seen.add((user_id, event_id))
+            taken[event_id] = taken.get(event_id, 0) + 1
+            yield user_id, event_id
+
+    def make_tickets(self, n):
+        tickets = [Ticket(user_id=u, event_id=e) for u, e in self.pairs(n, limit=True)]
+        for offset in range(0, len(tickets), self.batch_size):
+            Ticket.objects.bulk_create(tickets[offset:offset + self.batch_size])
+        return len(tickets)
+
+    def make_reviews(self, n):
+        reviews = [Review(user_id=u, event_id=e, rating=self.rng.choices(RATINGS, RATING_WEIGHTS)[0],
+                          comment=self.text(self.rng.randint(3, 25)).capitalize() + '.')
+                   for u, e in self.pairs(n)]
+        for offset in range(0, len(reviews), self.batch_size):
+            Review.objects.bulk_create(reviews[offset:offset + self.batch_size])
+        return len(reviews)
+
+    def make_favorites(self, n):
+        favorites = [Favorite(user_id=u, event_id=e) for u, e in self.pairs(n)]
+        Favorite.objects.bulk_create(favorites, batch_size=self.batch_size)
+        return len(favorites)
@@ -1,6 +1,8 @@
+from datetime import date
+
 from django import forms
 from django.utils import timezone
-from .models import Event, Ticket, Review, Category
+from .models import Event, EventSeries, Ticket, Review, Category
 
 
 class EventForm(forms.ModelForm):
@@ -28,6 +30,33 @@ class EventForm(forms.ModelForm):
         return starts_at
 
 
+class EventSeriesForm(EventForm):
+    skip_dates = forms.CharField(required=False, help_text="Dates without an occurrence, e.g. 2026-12-24, 2026-12-31.")
+
+    class Meta(EventForm.Meta):
+        model = EventSeries
+        fields = ('category', 'title', 'description', 'location', 'starts_at', 'capacity',
+                  'frequency', 'interval', 'until', 'skip_dates')
+        widgets = {**EventForm.Meta.widgets, 'until': forms.DateInput(attrs={'type': 'date'})}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.initial['skip_dates'] = ', '.join(self.instance.skip_dates)
+
+    def clean_starts_at(self):
+        starts_at = self.cleaned_data['starts_at']
+        if self.instance.pk and starts_at == self.instance.starts_at:
+            return starts_at  # an old series keeps its first date
+        return super().clean_starts_at()
+
+    def clean_skip_dates(self):
+        try:
+            days = {date.fromisoformat(d) for d in self.cleaned_data['skip_dates'].replace(',', ' ').split()}
+        except ValueError:
+            raise forms.ValidationError("Use YYYY-MM-DD dates separated by commas.")
+        return [d.isoformat() for d in sorted(days)]
+
+
 class TicketForm(forms.ModelForm):
     class Meta:
         model = Ticket
@@ -0,0 +1,72 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from events.benchmarking import scratch_database, summarize
+from events.booking import BookingError, book_ticket
+from events.booking_queue import BookingQueue
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = "Compare per-request booking with the batched booking queue on a scratch database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        n = options['requests']
+        with scratch_database():
+            User = get_user_model()
+            User.objects.bulk_create([User(username=f'bench{i}') for i in range(n)])
+            users = list(User.objects.filter(username__startswith='bench').order_by('pk'))
+            owner = users[0]
+
+            def new_event(title):
+                return Event.objects.create(owner=owner, title=title, description='bench', location='bench',
+                                            starts_at=timezone.now() + timedelta(days=30), capacity=n)
+
+            event = new_event('direct')
+
+            def direct(user):
+                started = time.perf_counter()
+                try:
+                    book_ticket(user, event)
+                except BookingError:
+                    pass
+                finally:
+                    connection.close()
+                return time.perf_counter() - started
+
+            self.report('direct', n, *self.run(direct, users, options['threads']))
+
+            event = new_event('queued')
+            bq = BookingQueue(batch_size=options['batch_size'])
+
+            def queued(user):
+                started = time.perf_counter()
+                req = bq.submit(user, event, 'standard')
+                bq.wait(req.token, timeout=60)
+                return time.perf_counter() - started
+
+            self.report('queued', n, *self.run(queued, users, options['threads']))
+
+    def run(self, func, users, threads):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            samples = list(pool.map(func, users))
+        return samples, time.perf_counter() - started
+
+    def report(self, label, n, samples, elapsed):
+        stats = summarize(samples)
+        self.stdout.write(
+            f"{label:>7}: {n / elapsed:8.1f} bookings/s  p50 {stats['p50_ms']:.1f}ms  "
+            f"p99 {stats['p99_ms']:.1f}ms  max {stats['max_ms']:.1f}ms"
+        )
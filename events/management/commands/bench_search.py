@@ -0,0 +1,78 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from events import search
+from events.benchmarking import scratch_database, summarize
+from events.models import Category, Event
+
+
+class Command(BaseCommand):
+    help = "Compare FTS5 search with the old icontains filter on a scratch database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError("FTS5 search needs SQLite.")
+        rng = random.Random(options['seed'])
+        syllables = ['ka', 'lo', 'mi', 'ra', 'te', 'su', 'no', 'vi', 'de', 'pa', 'zo', 'ri']
+        vocab = [''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(5000)]
+        terms = ['jazz', 'python', 'marathon', 'sofia']
+
+        with scratch_database():
+            owner = get_user_model().objects.create(username='bench')
+            categories = Category.objects.bulk_create([Category(name=f'Category {i}', slug=f'cat-{i}') for i in range(20)])
+            start = timezone.now() + timedelta(days=1)
+
+            def text(n):
+                words = rng.choices(vocab, k=n)
+                if rng.random() < 0.01:
+                    words[rng.randrange(n)] = rng.choice(terms)
+                return ' '.join(words)
+
+            started = time.perf_counter()
+            batch = []
+            for i in range(options['events']):
+                batch.append(Event(owner=owner, category=rng.choice(categories), slug=f'bench-{i}',
+                                   title=text(4).title(), description=text(60), location=text(2),
+                                   starts_at=start + timedelta(minutes=i), capacity=100,
+                                   status=Event.Status.APPROVED))
+                if len(batch) == 5000:
+                    Event.objects.bulk_create(batch)
+                    batch = []
+            Event.objects.bulk_create(batch)
+            self.stdout.write(f"loaded {options['events']} events in {time.perf_counter() - started:.1f}s")
+
+            # the admin changelist counts matches too, and a term nobody uses
+            # forces icontains through every row
+            for term in terms + ['nomatch']:
+                like_qs = Event.objects.filter(search.icontains_filter(term))
+                fts_qs = search.annotate_matches(Event.objects.all(), term)
+                for label, like, fts in [
+                    ('first page', lambda: list(like_qs.order_by('starts_at')[:10]),
+                     lambda: search.search_events(term, limit=10)),
+                    ('count', like_qs.count, fts_qs.count),
+                ]:
+                    like_stats = self.time(options['repeat'], like)
+                    fts_stats = self.time(options['repeat'], fts)
+                    self.stdout.write(
+                        f"{term:>9} {label:>10}: icontains p50 {like_stats['p50_ms']:8.2f}ms "
+                        f"p99 {like_stats['p99_ms']:8.2f}ms | fts5 p50 {fts_stats['p50_ms']:6.2f}ms "
+                        f"p99 {fts_stats['p99_ms']:6.2f}ms"
+                    )
+
+    def time(self, repeat, func):
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - started)
+        return summarize(samples)
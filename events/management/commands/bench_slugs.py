@@ -0,0 +1,69 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.text import slugify
+
+from eventhub.querybudget import QueryRecorder
+from events.benchmarking import scratch_database, summarize
+from events.models import Event
+
+
+def legacy_slug(title):
+    # the probe loop Event.save used before events.slugs
+    base = slugify(title)[:130]
+    maybe, i = base, 1
+    while Event.objects.filter(slug=maybe).exists():
+        i += 1
+        maybe = f"{base}-{i}"
+    return maybe
+
+
+class Command(BaseCommand):
+    help = "Create many same-titled events on a scratch database and time slug allocation."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=10_000)
+        parser.add_argument('--legacy', type=int, default=300,
+                            help="Events to create with the old probe loop (it is quadratic).")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            owner = get_user_model().objects.create(username='bench')
+            starts_at = timezone.now() + timedelta(days=1)
+
+            def event(title, **kwargs):
+                return Event(owner=owner, title=title, description='Bench.', location='Sofia',
+                             starts_at=starts_at, capacity=10, **kwargs)
+
+            if options['legacy']:
+                self.run('legacy save()', options['legacy'],
+                         lambda: event('Legacy Meetup', slug=legacy_slug('Legacy Meetup')).save())
+            self.run('save()', options['events'], lambda: event('Meetup').save())
+
+            n, size = options['events'], options['batch_size']
+            recorder = QueryRecorder()
+            started = time.perf_counter()
+            with recorder.record():
+                for offset in range(0, n, size):
+                    Event.objects.bulk_create([event('Weekly Meetup') for _ in range(min(size, n - offset))])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{'bulk_create()':>14}: {n} events in {elapsed:.2f}s "
+                              f"({n / elapsed:.0f}/s), {recorder.count} queries")
+
+            last = Event.objects.filter(title='Meetup').order_by('-pk').values_list('slug', flat=True).first()
+            self.stdout.write(f"last slug: {last}")
+
+    def run(self, label, n, create):
+        recorder, samples = QueryRecorder(), []
+        with recorder.record():
+            for _ in range(n):
+                started = time.perf_counter()
+                create()
+                samples.append(time.perf_counter() - started)
+        stats = summarize(samples)
+        self.stdout.write(f"{label:>14}: {n} events in {sum(samples):.2f}s, p50 {stats['p50_ms']:.2f}ms "
+                          f"p99 {stats['p99_ms']:.2f}ms, {recorder.count / n:.1f} queries/event")
@@ -0,0 +1,108 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection
+from django.utils import timezone
+
+from events.benchmarking import scratch_database, summarize
+from events.booking import BookingError, book_ticket
+from events.models import Event, Favorite
+
+# what the settings entry looks like without EVENTHUB_DB_PROFILE; journal_mode
+# is stored in the file, so switch it back explicitly
+DEFAULT_PROFILE = {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {},
+                   'PRAGMAS': {'journal_mode': 'DELETE'}}
+
+
+@contextmanager
+def database_profile(profile):
+    """Apply a profile to the default database entry (shared by every thread's connection)."""
+    settings_dict = connection.settings_dict
+    saved = {key: settings_dict.get(key) for key in profile}
+    connection.close()
+    settings_dict.update(profile)
+    try:
+        yield
+    finally:
+        connection.close()
+        settings_dict.update(saved)
+
+
+class Command(BaseCommand):
+    help = "Mixed read/write throughput on a scratch SQLite file, with and without the production profile."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operations', type=int, default=4000)
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--write-ratio', type=float, default=0.2)
+        parser.add_argument('--events', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("This benchmark is for SQLite.")
+        for label, profile in [('default', DEFAULT_PROFILE), ('production', settings.SQLITE_PRODUCTION_PROFILE)]:
+            with scratch_database(), database_profile(profile):
+                users, events = self.seed(options['operations'], options['events'])
+                self.report(label, options['operations'], *self.run(users, events, options))
+
+    def seed(self, n_users, n_events):
+        User = get_user_model()
+        User.objects.bulk_create([User(username=f'bench{i}') for i in range(n_users)])
+        users = list(User.objects.filter(username__startswith='bench').order_by('pk'))
+        starts_at = timezone.now() + timedelta(days=1)
+        Event.objects.bulk_create([
+            Event(owner=users[0], title=f'Bench {i}', description='bench', location='Sofia',
+                  starts_at=starts_at + timedelta(hours=i), capacity=n_users)
+            for i in range(n_events)
+        ])
+        return users, list(Event.objects.values_list('pk', flat=True))
+
+    def run(self, users, events, options):
+        rng = random.Random(options['seed'])
+        # one operation per user, so bookings never collide on (user, event)
+        plan = [(user, rng.choice(events), rng.random() < options['write_ratio']) for user in users]
+
+        def request(user, event_id, write):
+            started = time.perf_counter()
+            try:
+                if write:
+                    with_favorite = rng.random() < 0.5
+                    book_ticket(user, event_id)
+                    if with_favorite:
+                        Favorite.objects.get_or_create(user=user, event_id=event_id)
+                else:
+                    list(Event.objects.select_related('category', 'owner').order_by('starts_at', 'id')[:10])
+                    Event.objects.get(pk=event_id)
+                ok = True
+            except (OperationalError, BookingError):
+                ok = False
+            finally:
+                close_old_connections()  # the request boundary; keeps CONN_MAX_AGE connections
+            return time.perf_counter() - started, ok
+
+        def worker(chunk):
+            try:
+                return [request(*op) for op in chunk]
+            finally:
+                connection.close()
+
+        threads = options['threads']
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = [r for chunk in pool.map(worker, [plan[i::threads] for i in range(threads)]) for r in chunk]
+        return results, time.perf_counter() - started
+
+    def report(self, label, n, results, elapsed):
+        stats = summarize([t for t, _ in results])
+        errors = sum(1 for _, ok in results if not ok)
+        self.stdout.write(
+            f"{label:>10}: {n / elapsed:8.1f} ops/s  p50 {stats['p50_ms']:.1f}ms  "
+            f"p99 {stats['p99_ms']:.1f}ms  max {stats['max_ms']:.1f}ms  {errors} failed"
+        )
@@ -0,0 +1,166 @@
+import json
+import logging
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import timedelta
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from eventhub.querybudget import QueryRecorder
+from events.benchmarking import scratch_database, summarize
+from events.datagen import Generator
+from events.models import Event
+
+SCALES = {
+    'small': {'users': 300, 'events': 500, 'tickets': 5000, 'reviews': 2000, 'favorites': 3000},
+    'medium': {'users': 2000, 'events': 5000, 'tickets': 50_000, 'reviews': 20_000, 'favorites': 30_000},
+    'large': {'users': 10_000, 'events': 50_000, 'tickets': 300_000, 'reviews': 100_000, 'favorites': 200_000},
+}
+
+
+def client():
+    return Client(SERVER_NAME='localhost')  # ALLOWED_HOSTS has no 'testserver' outside tests
+
+
+def succeeded(status):
+    return 200 <= status < 400
+
+
+class Command(BaseCommand):
+    help = ("Seed a scratch database and time the key pages: latency percentiles, queries per request and "
+            "peak memory. --json writes results that --compare can diff against a later run.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=list(SCALES), default='small')
+        parser.add_argument('--requests', type=int, default=50, help="Timed requests per target.")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--target', action='append', help="Only these targets (repeatable).")
+        parser.add_argument('--page-cache', action='store_true', help="Leave the anonymous page cache on.")
+        parser.add_argument('--json', metavar='PATH', help="Write the results as JSON.")
+        parser.add_argument('--compare', metavar='PATH', help="Show the change against an earlier --json file.")
+
+    def handle(self, *args, **options):
+        # the runner reports queries itself; don't log every over-budget admin page
+        logging.getLogger('eventhub.queries').setLevel(logging.ERROR)
+        with scratch_database(), override_settings(PAGE_CACHE_ENABLED=options['page_cache']):
+            started = time.perf_counter()
+            Generator(seed=options['seed'], **SCALES[options['scale']]).run()
+            self.stdout.write(f"seeded {options['scale']} data set in {time.perf_counter() - started:.1f}s")
+            targets = self.targets()
+            results = {}
+            for name, make_request in targets.items():
+                if options['target'] and name not in options['target']:
+                    continue
+                results[name] = self.measure(make_request, options['requests'])
+                self.report(name, results[name])
+
+        payload = {'meta': self.meta(options), 'results': results}
+        if options['json']:
+            with open(options['json'], 'w') as f:
+                json.dump(payload, f, indent=2)
+        if options['compare']:
+            with open(options['compare']) as f:
+                self.compare(json.load(f), payload)
+        failed = [name for name, r in results.items() if not r['ok']]
+        if failed:
+            raise CommandError(f"Error responses from {', '.join(failed)}: those timings measure an error page.")
+
+    def targets(self):
+        """{name: callable(i) -> response}; each call is one request, setup done outside the timing."""
+        User = get_user_model()
+        admin = User.objects.create_superuser('bench-admin', 'admin@example.com', 'pw')
+        organizer = User.objects.annotate(n=Count('events')).order_by('-n').first()
+        popular = Event.objects.order_by('-tickets_booked').first()
+        # the booking target needs a fresh seat and a user without a ticket per request
+        booking = Event.objects.create(owner=organizer, title='Bench booking', description='d', location='Sofia',
+                                       starts_at=timezone.now() + timedelta(days=30), capacity=100_000,
+                                       status=Event.Status.APPROVED)
+        bookers = User.objects.exclude(tickets__event=booking).order_by('pk')
+
+        anonymous, organizer_client, admin_client = client(), client(), client()
+        organizer_client.force_login(organizer)
+        admin_client.force_login(admin)
+        booker_clients = []
+
+        def book(i):
+            url = reverse('events:ticket_create', kwargs={'slug': booking.slug})
+            return booker_clients[i].post(url, {'seat_type': 'standard'})
+
+        def prepare_bookers(n):
+            for user in bookers[len(booker_clients):n]:
+                booker = client()
+                booker.force_login(user)
+                booker_clients.append(booker)
+
+        detail = reverse('events:detail', kwargs={'slug': popular.slug})
+        targets = {
+            'events:list': lambda i: anonymous.get(reverse('events:list')),
+            'events:list?sort=rating': lambda i: anonymous.get(reverse('events:list'), {'sort': 'rating'}),
+            'events:list?q=': lambda i: anonymous.get(reverse('events:list'), {'q': 'jazz night'}),
+            'events:detail': lambda i: anonymous.get(detail),
+            'events:detail (logged in)': lambda i: organizer_client.get(detail),
+            'events:ticket_create': book,
+            'dashboard:home': lambda i: organizer_client.get(reverse('dashboard:home')),
+        }
+        for model in ('event', 'ticket', 'review', 'favorite'):
+            url = reverse(f'admin:events_{model}_changelist')
+            targets[f'admin:events_{model}_changelist'] = lambda i, url=url: admin_client.get(url)
+        book.prepare = prepare_bookers
+        return targets
+
+    def measure(self, make_request, n):
+        if hasattr(make_request, 'prepare'):
+            make_request.prepare(n + 2)
+        warm_up = make_request(0)  # template loading, first-use imports
+        samples, queries, statuses = [], [], {warm_up.status_code}
+        for i in range(1, n + 1):
+            recorder = QueryRecorder()
+            started = time.perf_counter()
+            with recorder.record():
+                response = make_request(i)
+            samples.append(time.perf_counter() - started)
+            queries.append(recorder.count)
+            statuses.add(response.status_code)
+        # a separate traced request: tracemalloc slows everything down too much to time with it on
+        tracemalloc.start()
+        try:
+            statuses.add(make_request(n + 1).status_code)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return {**summarize(samples), 'queries': max(queries), 'peak_kb': round(peak / 1024, 1),
+                'status': sorted(statuses), 'ok': all(succeeded(status) for status in statuses)}
+
+    def report(self, name, r):
+        self.stdout.write(f"{name:<32} p50 {r['p50_ms']:7.2f}ms  p95 {r['p95_ms']:7.2f}ms  p99 {r['p99_ms']:7.2f}ms  "
+                          f"{r['queries']:3d} queries  {r['peak_kb']:8.1f}KB peak  {r['status']}"
+                          f"{'' if r['ok'] else '  ERROR RESPONSES'}")
+
+    def meta(self, options):
+        try:
+            commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                    check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {'commit': commit, 'scale': options['scale'], 'requests': options['requests'], 'seed': options['seed'],
+                'page_cache': options['page_cache'], 'python': platform.python_version(),
+                'django': django.get_version(), 'when': timezone.now().isoformat()}
+
+    def compare(self, before, after):
+        self.stdout.write(f"\nvs {before['meta'].get('commit')} ({before['meta'].get('scale')}):")
+        for name, new in after['results'].items():
+            old = before['results'].get(name)
+            if not old or not old.get('ok', True) or not new['ok']:
+                continue
+            change = (new['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100 if old['p50_ms'] else 0.0
+            self.stdout.write(f"{name:<32} p50 {old['p50_ms']:7.2f} -> {new['p50_ms']:7.2f}ms ({change:+.0f}%)  "
+                              f"queries {old['queries']} -> {new['queries']}  "
+                              f"peak {old['peak_kb']:.0f} -> {new['peak_kb']:.0f}KB")
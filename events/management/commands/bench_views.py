@@ -0,0 +1,156 @@
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from events.benchmarking import async_views, scratch_database, summarize
+from events.models import Category, Event, Review
+
+MODES = {
+    # label: (handler, serve the async views)
+    'wsgi': ('wsgi', False),
+    'asgi-sync': ('asgi', False),
+    'asgi': ('asgi', True),
+}
+HOST = 'localhost'
+
+
+class Command(BaseCommand):
+    help = ("Load-test the public event pages on a scratch database, under WSGI with a thread pool "
+            "and under ASGI with the sync and the native async views.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=64)
+        parser.add_argument('--events', type=int, default=500)
+        parser.add_argument('--mode', action='append', choices=list(MODES),
+                            help="Repeatable; default is all modes.")
+        parser.add_argument('--login', action='store_true', help="Send a session cookie (logged-in pages).")
+        parser.add_argument('--page-cache', action='store_true',
+                            help="Leave the anonymous page cache on (it hides the views' own cost).")
+
+    def handle(self, *args, **options):
+        with scratch_database(), override_settings(PAGE_CACHE_ENABLED=options['page_cache']):
+            paths, cookie = self.seed(options['events'], options['login'])
+            n, concurrency = options['requests'], options['concurrency']
+            for label in options['mode'] or list(MODES):
+                handler, use_async = MODES[label]
+                with async_views(use_async):
+                    if handler == 'wsgi':
+                        samples, elapsed, errors = self.run_wsgi(paths, cookie, n, concurrency)
+                    else:
+                        samples, elapsed, errors = asyncio.run(self.run_asgi(paths, cookie, n, concurrency))
+                stats = summarize(samples)
+                self.stdout.write(
+                    f"{label:>9}: {n / elapsed:8.1f} req/s  p50 {stats['p50_ms']:.1f}ms  "
+                    f"p99 {stats['p99_ms']:.1f}ms  max {stats['max_ms']:.1f}ms  {errors} errors"
+                )
+
+    def seed(self, n, login):
+        User = get_user_model()
+        owner = User.objects.create_user('bench', password='bench')
+        User.objects.bulk_create([User(username=f'reviewer{i}') for i in range(20)])
+        reviewers = list(User.objects.filter(username__startswith='reviewer'))
+        categories = Category.objects.bulk_create([Category(name=f'Category {i}', slug=f'category-{i}')
+                                                   for i in range(5)])
+        starts_at = timezone.now() + timedelta(days=1)
+        Event.objects.bulk_create([
+            Event(owner=owner, category=categories[i % 5], title=f'Bench meetup {i}', description='Talks and pizza.',
+                  location='Sofia', starts_at=starts_at + timedelta(hours=i), capacity=100,
+                  status=Event.Status.APPROVED)
+            for i in range(n)
+        ])
+        events = list(Event.objects.order_by('starts_at')[:20])
+        Review.objects.bulk_create([Review(event=e, user=u, rating=1 + i % 5, comment='Good.')
+                                    for e in events for i, u in enumerate(reviewers)])
+        cookie = ''
+        if login:
+            client = Client()
+            client.force_login(owner)
+            cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+        paths = [reverse('events:list'), f"{reverse('events:list')}?q=meetup",
+                 f"{reverse('events:list')}?category={categories[0].slug}"]
+        paths += [reverse('events:detail', kwargs={'slug': e.slug}) for e in events[:5]]
+        if login:
+            paths.append(reverse('events:favorites'))
+        return paths, cookie
+
+    def run_wsgi(self, paths, cookie, n, concurrency):
+        app = WSGIHandler()
+
+        def get(i):
+            path, _, query = paths[i % len(paths)].partition('?')
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+                'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'HTTP_HOST': HOST, 'HTTP_COOKIE': cookie,
+                'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http', 'wsgi.errors': io.StringIO(),
+            }
+            status = []
+            started = time.perf_counter()
+            body = app(environ, lambda s, headers, exc_info=None: status.append(s))
+            for _ in body:
+                pass
+            body.close()
+            return time.perf_counter() - started, status[0].startswith('200')
+
+        def worker(indexes):
+            try:
+                return [get(i) for i in indexes]
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = [r for chunk in pool.map(worker, [range(w, n, concurrency) for w in range(concurrency)])
+                       for r in chunk]
+        return self.split(results, time.perf_counter() - started)
+
+    async def run_asgi(self, paths, cookie, n, concurrency):
+        app = ASGIHandler()
+        slots = asyncio.Semaphore(concurrency)
+
+        async def get(i):
+            url = urlsplit(paths[i % len(paths)])
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': url.path, 'raw_path': url.path.encode(), 'root_path': '',
+                'query_string': url.query.encode(), 'server': (HOST, 80), 'client': ('127.0.0.1', 0),
+                'headers': [(b'host', HOST.encode())] + ([(b'cookie', cookie.encode())] if cookie else []),
+            }
+            done, status = asyncio.Event(), []
+            request = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+            async def receive():
+                if request:
+                    return request.pop()
+                await done.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            async with slots:
+                started = time.perf_counter()
+                await app(scope, receive, send)
+                done.set()
+                return time.perf_counter() - started, status[0] == 200
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(get(i) for i in range(n)))
+        return self.split(results, time.perf_counter() - started)
+
+    def split(self, results, elapsed):
+        return [t for t, _ in results], elapsed, sum(1 for _, ok in results if not ok)
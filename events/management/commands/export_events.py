@@ -0,0 +1,48 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from events import bulk_io, tasks
+
+
+class Command(BaseCommand):
+    help = "Stream categories, events or tickets to CSV or JSON Lines (stdout unless --output)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=sorted(bulk_io.EXPORTS), default='events')
+        parser.add_argument('--format', choices=bulk_io.FORMATS, help="Default: from --output, else csv.")
+        parser.add_argument('--output', '-o')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--background', action='store_true',
+                            help="Queue the export for `run_tasks`; it writes a file under EXPORT_ROOT.")
+
+    def handle(self, *args, kind, output, chunk_size, **options):
+        fmt = options['format'] or bulk_io.guess_format(output or '')
+        if options['background']:
+            queued = tasks.export.enqueue(kind=kind, fmt=fmt)
+            self.stderr.write(f"Queued as task #{queued.pk}; the file goes to {settings.EXPORT_ROOT}")
+            return
+        fields, rows = bulk_io.export_rows(kind, chunk_size=chunk_size)
+        count = 0
+
+        def counted(rows):
+            nonlocal count
+            for row in rows:
+                count += 1
+                yield row
+
+        started = time.perf_counter()
+        stream = open(output, 'w', newline='', encoding='utf-8') if output else None
+        try:
+            for chunk in bulk_io.write_rows(counted(rows), fields, fmt):
+                if stream:
+                    stream.write(chunk)
+                else:
+                    self.stdout.write(chunk, ending='')
+        finally:
+            if stream:
+                stream.close()
+        elapsed = time.perf_counter() - started
+        # keep stdout clean for the data itself
+        self.stderr.write(f"Exported {count} {kind} in {elapsed:.2f}s ({count / elapsed if elapsed else 0:.0f} rows/s)")
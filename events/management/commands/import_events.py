@@ -0,0 +1,44 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from events import bulk_io
+
+
+class Command(BaseCommand):
+    help = "Import categories, events or tickets from a CSV or JSON Lines file ('-' for stdin)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--kind', choices=sorted(bulk_io.IMPORTERS), default='events')
+        parser.add_argument('--format', choices=bulk_io.FORMATS, help="Default: from the file extension, else csv.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--owner', help="Username owning events whose row has no owner column.")
+        parser.add_argument('--dry-run', action='store_true', help="Validate only; roll every batch back.")
+
+    def handle(self, *args, path, kind, batch_size, dry_run, **options):
+        fmt = options['format'] or bulk_io.guess_format(path)
+        kwargs = {'batch_size': batch_size, 'dry_run': dry_run}
+        if kind == 'events' and options['owner']:
+            owner = get_user_model().objects.filter(username=options['owner']).values_list('pk', flat=True).first()
+            if owner is None:
+                raise CommandError(f"No user {options['owner']!r}.")
+            kwargs['owner'] = owner
+        importer = bulk_io.IMPORTERS[kind](**kwargs)
+
+        def progress(result):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  {result}")
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            result = importer.run(bulk_io.read_rows(stream, fmt), progress)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        for line_no, message in result.errors[:50]:
+            self.stderr.write(f"line {line_no}: {message}")
+        if len(result.errors) > 50:
+            self.stderr.write(f"... and {len(result.errors) - 50} more")
+        self.stdout.write(self.style.SUCCESS(f"{'Checked' if dry_run else 'Imported'} {kind}: {result}"))
@@ -0,0 +1,22 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from events.models import EventSeries
+
+
+class Command(BaseCommand):
+    help = ("Create the upcoming occurrences of every event series (run daily to keep the window rolling). "
+            "Series already filled up to the horizon are skipped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.EVENT_SERIES_WINDOW_DAYS,
+                            help="How far ahead occurrences should exist.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        created = EventSeries.materialize(horizon=timezone.now() + timedelta(days=options['days']))
+        self.stdout.write(f"{created} occurrence(s) created in {time.perf_counter() - started:.2f}s")
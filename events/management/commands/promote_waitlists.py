@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from events import waitlist
+
+
+class Command(BaseCommand):
+    help = ("Promote waitlisted users on every event with free seats. Cancellations promote on their own; "
+            "run this periodically to catch anything a failed promotion left behind.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        promoted = waitlist.promote_all()
+        self.stdout.write(f"{promoted} waitlisted user(s) promoted in {time.perf_counter() - started:.2f}s")
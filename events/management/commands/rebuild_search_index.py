@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from events import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the FTS5 event search index from the events table."
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError("Full-text search needs SQLite FTS5; this database uses the icontains fallback.")
+        with transaction.atomic():
+            indexed = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} event(s)."))
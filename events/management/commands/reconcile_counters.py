@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from events import cache
+from events.models import Event, Review, SeatPool, Ticket
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized counters (tickets booked, seat pools, rating summaries) and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report drifted rows.")
+
+    def handle(self, *args, **options):
+        events = list(Event.objects.annotate(actual=Count('tickets'))
+                      .exclude(tickets_booked=F('actual'))
+                      .values_list('pk', 'slug', 'tickets_booked', 'actual'))
+        for pk, slug, stored, actual in events:
+            self.stdout.write(f"{slug}: tickets_booked {stored} -> {actual}")
+
+        pool_actual = (Ticket.objects.filter(event=OuterRef('event'), seat_type=OuterRef('seat_type'))
+                       .order_by().values('event').annotate(n=Count('pk')).values('n'))
+        pools = list(SeatPool.objects.annotate(actual=Coalesce(Subquery(pool_actual), 0))
+                     .exclude(booked=F('actual'))
+                     .values_list('pk', 'event__slug', 'seat_type', 'booked', 'actual'))
+        for pk, slug, seat_type, stored, actual in pools:
+            self.stdout.write(f"{slug}/{seat_type}: booked {stored} -> {actual}")
+
+        reviews = Review.objects.filter(event=OuterRef('pk')).order_by().values('event')
+        stars = {f'actual_{n}': Coalesce(Subquery(reviews.filter(rating=n).annotate(v=Count('pk')).values('v')), 0)
+                 for n in range(1, 6)}
+        ratings = list(Event.objects.annotate(
+            actual_count=Coalesce(Subquery(reviews.annotate(v=Count('pk')).values('v')), 0),
+            actual_sum=Coalesce(Subquery(reviews.annotate(v=Sum('rating')).values('v')), 0),
+            **stars,
+        ).filter(
+            ~Q(reviews_count=F('actual_count')) | ~Q(rating_sum=F('actual_sum'))
+            | Q(*[~Q(**{f'stars_{n}': F(f'actual_{n}')}) for n in range(1, 6)], _connector=Q.OR)
+        ).values_list('pk', 'slug', 'reviews_count', 'actual_count'))
+        for pk, slug, stored, actual in ratings:
+            self.stdout.write(f"{slug}: rating summary ({stored} reviews counted, {actual} actual)")
+
+        if not options['dry_run']:
+            with transaction.atomic():
+                if events:
+                    Event.recount_booked(Event.objects.filter(pk__in=[r[0] for r in events]))
+                if pools:
+                    SeatPool.recount_booked(SeatPool.objects.filter(pk__in=[r[0] for r in pools]))
+                if ratings:
+                    Event.recount_ratings(Event.objects.filter(pk__in=[r[0] for r in ratings]))
+                cache.bump_events(*{r[0] for r in events + ratings})
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(events)} booking counter(s), {len(pools)} seat pool(s) and "
+            f"{len(ratings)} rating summar{'y' if len(ratings) == 1 else 'ies'} drifted."
+        ))
@@ -0,0 +1,34 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from events.datagen import PASSWORD, Generator
+
+
+class Command(BaseCommand):
+    help = "Fill the database with seeded fake users, events, tickets, reviews and favorites (Zipf popularity)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--events', type=int, default=2000)
+        parser.add_argument('--tickets', type=int, default=20_000)
+        parser.add_argument('--reviews', type=int, default=5000)
+        parser.add_argument('--favorites', type=int, default=10_000)
+        parser.add_argument('--zipf', type=float, default=1.1, help="Popularity skew; higher is more skewed.")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='seed', help="Username and category slug prefix.")
+
+    def handle(self, *args, **options):
+        if get_user_model().objects.filter(username=f"{options['prefix']}0").exists():
+            raise CommandError(f"Users prefixed {options['prefix']!r} already exist; pick another --prefix.")
+        generator = Generator(**{k: options[k] for k in ('users', 'categories', 'events', 'tickets', 'reviews',
+                                                          'favorites', 'zipf', 'seed', 'prefix')})
+        started = time.perf_counter()
+
+        def progress(step, n):
+            self.stdout.write(f"{step:>10}: {n} ({time.perf_counter() - started:.1f}s)")
+
+        generator.run(progress)
+        self.stdout.write(f"Users log in as {options['prefix']}0.. with password {PASSWORD!r}.")
@@ -0,0 +1,44 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from eventhub.routers import mark_synced
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database to each file replica in DATABASE_REPLICAS."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help="Keep syncing every N seconds (replicas are skipped once REPLICA_MAX_LAG passes).")
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError("sync_replicas copies SQLite files; use the database's own replication elsewhere.")
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError("No replicas configured (EVENTHUB_REPLICAS).")
+        while True:
+            for alias in settings.DATABASE_REPLICAS:
+                started = time.perf_counter()
+                snapshot_at = time.time()  # the copy has at least what was committed by now
+                self.copy(primary, connections[alias])
+                mark_synced(alias, at=snapshot_at)
+                if options['verbosity'] > 1 or not options['interval']:
+                    self.stdout.write(f"{alias}: synced in {(time.perf_counter() - started) * 1000:.0f}ms")
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def copy(self, primary, replica):
+        # online backup: a consistent snapshot, even with writers on the primary
+        replica.close()
+        primary.ensure_connection()
+        target = sqlite3.connect(replica.settings_dict['NAME'])
+        try:
+            primary.connection.backup(target)
+        finally:
+            target.close()
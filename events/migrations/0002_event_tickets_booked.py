@@ -0,0 +1,29 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:56
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_tickets_booked(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    Ticket = apps.get_model('events', 'Ticket')
+    actual = (Ticket.objects.filter(event=OuterRef('pk'))
+              .order_by().values('event').annotate(n=Count('pk')).values('n'))
+    Event.objects.update(tickets_booked=Coalesce(Subquery(actual), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='tickets_booked',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_tickets_booked, migrations.RunPython.noop),
+    ]
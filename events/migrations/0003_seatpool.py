@@ -0,0 +1,29 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:57
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0002_event_tickets_booked'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatPool',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seat_type', models.CharField(choices=[('standard', 'Standard'), ('vip', 'VIP'), ('premium', 'Premium')], max_length=20)),
+                ('capacity', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('booked', models.PositiveIntegerField(default=0, editable=False)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_pools', to='events.event')),
+            ],
+            options={
+                'ordering': ['event', 'seat_type'],
+                'unique_together': {('event', 'seat_type')},
+            },
+        ),
+    ]
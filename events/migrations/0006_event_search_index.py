@@ -0,0 +1,60 @@
+from django.db import migrations
+
+FTS = 'events_event_fts'
+CATEGORY_NAME = "COALESCE((SELECT name FROM events_category WHERE id = new.category_id), '')"
+
+CREATE = [
+    f"""CREATE VIRTUAL TABLE {FTS} USING fts5(
+        title, description, location, category,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    f"INSERT INTO {FTS}({FTS}, rank) VALUES ('rank', 'bm25(10.0, 1.0, 2.0, 3.0)')",
+    f"""CREATE TRIGGER {FTS}_ai AFTER INSERT ON events_event BEGIN
+        INSERT INTO {FTS}(rowid, title, description, location, category)
+        VALUES (new.id, new.title, new.description, new.location, {CATEGORY_NAME});
+    END""",
+    f"""CREATE TRIGGER {FTS}_au AFTER UPDATE OF title, description, location, category_id ON events_event BEGIN
+        DELETE FROM {FTS} WHERE rowid = old.id;
+        INSERT INTO {FTS}(rowid, title, description, location, category)
+        VALUES (new.id, new.title, new.description, new.location, {CATEGORY_NAME});
+    END""",
+    f"""CREATE TRIGGER {FTS}_ad AFTER DELETE ON events_event BEGIN
+        DELETE FROM {FTS} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER {FTS}_category_au AFTER UPDATE OF name ON events_category BEGIN
+        UPDATE {FTS} SET category = new.name
+        WHERE rowid IN (SELECT id FROM events_event WHERE category_id = new.id);
+    END""",
+    f"""INSERT INTO {FTS}(rowid, title, description, location, category)
+        SELECT e.id, e.title, e.description, e.location, COALESCE(c.name, '')
+        FROM events_event e LEFT JOIN events_category c ON c.id = e.category_id""",
+]
+
+DROP = [
+    f"DROP TRIGGER IF EXISTS {FTS}_category_au",
+    f"DROP TRIGGER IF EXISTS {FTS}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS}_au",
+    f"DROP TRIGGER IF EXISTS {FTS}_ai",
+    f"DROP TABLE IF EXISTS {FTS}",
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        # FTS5 is SQLite-only; other backends use the icontains fallback in events.search
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE), run(DROP)),
+    ]
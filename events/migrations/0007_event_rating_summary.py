@@ -0,0 +1,106 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:06
+
+from importlib import import_module
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce
+
+
+def backfill_rating_summary(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    Review = apps.get_model('events', 'Review')
+    reviews = Review.objects.filter(event=OuterRef('pk')).order_by().values('event')
+
+    def total(aggregate, **filters):
+        return Coalesce(Subquery(reviews.filter(**filters).annotate(v=aggregate).values('v')), 0)
+
+    Event.objects.update(
+        reviews_count=total(Count('pk')),
+        rating_sum=total(Sum('rating')),
+        rating_avg=Coalesce(Subquery(reviews.annotate(v=Cast(Sum('rating'), FloatField()) / Count('pk')).values('v')), 0.0),
+        **{f'stars_{n}': total(Count('pk'), rating=n) for n in range(1, 6)},
+    )
+
+
+# Adding columns makes SQLite rebuild events_event, which fails while 0006's
+# search triggers reference it; 0011 recreates them once the rebuilds are done.
+SEARCH_TRIGGERS = ['events_event_fts_ai', 'events_event_fts_au', 'events_event_fts_ad',
+                   'events_event_fts_category_au']
+
+
+def drop_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for name in SEARCH_TRIGGERS:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def restore_search_triggers(apps, schema_editor):
+    # back at 0006: its migration module still has the trigger SQL
+    if schema_editor.connection.vendor == 'sqlite':
+        search_index = import_module('events.migrations.0006_event_search_index')
+        for sql in search_index.CREATE:
+            if sql.startswith('CREATE TRIGGER'):
+                schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_event_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_search_triggers, restore_search_triggers),
+        migrations.AddField(
+            model_name='event',
+            name='rating_avg',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='reviews_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='stars_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='stars_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='stars_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='stars_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='stars_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['rating_avg', 'id'], name='event_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['reviews_count', 'id'], name='event_reviews_count_idx'),
+        ),
+        migrations.RunPython(backfill_rating_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def approve_existing(apps, schema_editor):
+    # events published before moderation existed stay listed
+    Event = apps.get_model('events', 'Event')
+    Event.objects.update(status='approved')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0007_event_rating_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='moderated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='moderated_by',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending approval'), ('approved', 'Approved'), ('rejected', 'Rejected')], default='pending', editable=False, max_length=10),
+        ),
+        migrations.RunPython(approve_existing, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('status', 'approved')), fields=['starts_at', 'id'], name='event_approved_starts_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+from django.db import migrations
+
+FTS = 'events_event_fts'
+CATEGORY_NAME = "COALESCE((SELECT name FROM events_category WHERE id = new.category_id), '')"
+
+# 0006's sync triggers, dropped by 0007 so SQLite could rebuild events_event
+# (0007-0009 add columns). Migrations that rebuild events_event or
+# events_category again must drop and recreate them the same way.
+TRIGGERS = {
+    f'{FTS}_ai': f"""CREATE TRIGGER {FTS}_ai AFTER INSERT ON events_event BEGIN
+        INSERT INTO {FTS}(rowid, title, description, location, category)
+        VALUES (new.id, new.title, new.description, new.location, {CATEGORY_NAME});
+    END""",
+    f'{FTS}_au': f"""CREATE TRIGGER {FTS}_au AFTER UPDATE OF title, description, location, category_id ON events_event BEGIN
+        DELETE FROM {FTS} WHERE rowid = old.id;
+        INSERT INTO {FTS}(rowid, title, description, location, category)
+        VALUES (new.id, new.title, new.description, new.location, {CATEGORY_NAME});
+    END""",
+    f'{FTS}_ad': f"""CREATE TRIGGER {FTS}_ad AFTER DELETE ON events_event BEGIN
+        DELETE FROM {FTS} WHERE rowid = old.id;
+    END""",
+    f'{FTS}_category_au': f"""CREATE TRIGGER {FTS}_category_au AFTER UPDATE OF name ON events_category BEGIN
+        UPDATE {FTS} SET category = new.name
+        WHERE rowid IN (SELECT id FROM events_event WHERE category_id = new.id);
+    END""",
+}
+
+DROP = [f"DROP TRIGGER IF EXISTS {name}" for name in TRIGGERS]
+
+# events written while the triggers were off are missing from the index
+REINDEX = [
+    f"DELETE FROM {FTS}",
+    f"""INSERT INTO {FTS}(rowid, title, description, location, category)
+        SELECT e.id, e.title, e.description, e.location, COALESCE(c.name, '')
+        FROM events_event e LEFT JOIN events_category c ON c.id = e.category_id""",
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0010_waitlistentry'),
+    ]
+
+    operations = [
+        # databases set up before this migration may have them from events.search
+        migrations.RunPython(run(DROP + list(TRIGGERS.values()) + REINDEX), run(DROP)),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:21
+
+from importlib import import_module
+
+from django.conf import settings
+from django.db import migrations, models
+
+# adding the column rebuilds events_event on SQLite, which fails while the
+# search triggers reference it (see 0011)
+search_triggers = import_module('events.migrations.0011_event_search_triggers')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0011_event_search_triggers'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(search_triggers.run(search_triggers.DROP),
+                             search_triggers.run(list(search_triggers.TRIGGERS.values()))),
+        migrations.AddField(
+            model_name='event',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('status', 'approved')), fields=['updated_at'],
+                               name='event_approved_updated_idx'),
+        ),
+        migrations.RunPython(search_triggers.run(list(search_triggers.TRIGGERS.values())),
+                             search_triggers.run(search_triggers.DROP)),
+    ]
@@ -1,8 +1,33 @@
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 
+from .pagination import CursorPaginator
+
 class OwnerRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
     owner_field = 'owner'
 
+    def get_object(self, queryset=None):
+        # test_func and get()/post() both need the object: fetch it once per request
+        if queryset is not None:
+            return super().get_object(queryset)
+        if not hasattr(self, '_object'):
+            self._object = super().get_object()
+        return self._object
+
     def test_func(self):
         obj = self.get_object()
-        return getattr(obj, self.owner_field) == self.request.user or self.request.user.is_staff
+        return getattr(obj, f'{self.owner_field}_id') == self.request.user.pk or self.request.user.is_staff
+
+class CursorPaginationMixin:
+    """Swap ListView's offset Paginator for keyset pagination on `cursor_ordering`."""
+    cursor_ordering = ('id',)
+    cursor_param = 'cursor'
+    cursor_with_count = False
+
+    def get_cursor_ordering(self):
+        return self.cursor_ordering
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(queryset, self.get_cursor_ordering(), page_size,
+                                    with_count=self.cursor_with_count)
+        page = paginator.page(self.request.GET.get(self.cursor_param))
+        return (paginator, page, page.object_list, page.has_other_pages())
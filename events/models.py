@@ -1,10 +1,16 @@
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest
 from django.utils.text import slugify
 from django.utils import timezone
 from django.urls import reverse
 
+from datetime import timedelta
+
+from . import cache, recurrence, slugs
+
 User = settings.AUTH_USER_MODEL
 
 def future_date_validator(value):
@@ -26,7 +32,77 @@ class Category(models.Model):
             self.slug = slugify(self.name)[:100]
         super().save(*args, **kwargs)
 
+class EventQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # counters, moderation and series changes all write through here
+        kwargs.setdefault('updated_at', timezone.now())
+        return super().update(**kwargs)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        pending = {}
+        for event in objs:
+            if not event.slug:
+                pending.setdefault(slugs.base_slug(event.title), []).append(event)
+        for attempt in range(slugs.ATTEMPTS):
+            # one counter bump per distinct title, however many events share it
+            allocated = slugs.allocate(self.model._base_manager.using(self.db),
+                                       {base: len(events) for base, events in pending.items()})
+            for base, events in pending.items():
+                for event, slug in zip(events, allocated[base]):
+                    event.slug = slug
+            try:
+                with transaction.atomic(using=self.db):
+                    created = super().bulk_create(objs, *args, **kwargs)
+                    cache.bump()  # no post_save signals here
+                    return created
+            except IntegrityError as exc:
+                if not pending or not slugs.is_slug_conflict(exc) or attempt == slugs.ATTEMPTS - 1:
+                    raise
+                slugs.resync(pending)
+
+    def approved(self):
+        return self.filter(status=self.model.Status.APPROVED)
+
+    def visible_to(self, user):
+        """Approved events, plus the user's own; moderators see every event."""
+        # moderators work in the admin, so they are staff; checking that first
+        # spares everyone else the permission lookup
+        if user.is_staff and user.has_perm('events.approve_event'):
+            return self
+        if user.is_authenticated:
+            return self.filter(Q(status=self.model.Status.APPROVED) | Q(owner=user))
+        return self.approved()
+
+    def moderate(self, status, moderator):
+        """Set every event's status in a single UPDATE; returns the ids that changed.
+
+        Per-object saves (and post_save) are skipped, so the cache is bumped and
+        events_moderated is sent here, once for the whole batch.
+        """
+        from .signals import events_moderated
+        with transaction.atomic(using=self.db):
+            pending = self.exclude(status=status).order_by()
+            ids = list(pending.select_for_update().values_list('pk', flat=True))
+            if not ids:
+                return ids
+            # by subquery: the admin's search adds an FTS table via extra(), which update() would drop
+            self.model._base_manager.using(self.db).filter(pk__in=pending.values('pk')).update(
+                status=status, moderated_at=timezone.now(), moderated_by=moderator)
+            cache.bump_events(*ids)
+            transaction.on_commit(lambda: events_moderated.send(
+                sender=self.model, status=status, event_ids=ids, moderator=moderator), using=self.db, robust=True)
+        return ids
+
 class Event(models.Model):
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending approval'
+        APPROVED = 'approved', 'Approved'
+        REJECTED = 'rejected', 'Rejected'
+
+    # what moderators approve: an owner changing any of these sends the event back to PENDING
+    MODERATED_FIELDS = ('category', 'title', 'description', 'location')
+
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='events')
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='events')
     title = models.CharField(max_length=120)
@@ -35,10 +111,51 @@ class Event(models.Model):
     location = models.CharField(max_length=140)
     starts_at = models.DateTimeField()
     capacity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    tickets_booked = models.PositiveIntegerField(default=0, editable=False)
+    # rating summary, maintained from Review saves/deletes (see events.signals)
+    reviews_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_avg = models.FloatField(default=0, editable=False)
+    stars_1 = models.PositiveIntegerField(default=0, editable=False)
+    stars_2 = models.PositiveIntegerField(default=0, editable=False)
+    stars_3 = models.PositiveIntegerField(default=0, editable=False)
+    stars_4 = models.PositiveIntegerField(default=0, editable=False)
+    stars_5 = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # moved by every save and queryset update of the row; the API's ETags come from it
+    updated_at = models.DateTimeField(auto_now=True)
+    # only approved events are listed publicly (see EventQuerySet.moderate)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING, editable=False)
+    moderated_at = models.DateTimeField(null=True, blank=True, editable=False)
+    moderated_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+                                     related_name='+')
+    series = models.ForeignKey('EventSeries', on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+                               related_name='occurrences')
+
+    objects = EventQuerySet.as_manager()
 
     class Meta:
         ordering = ['starts_at']
+        indexes = [
+            # keyset pagination on the public list, which only shows approved events
+            models.Index(fields=['starts_at', 'id'], condition=Q(status='approved'),
+                         name='event_approved_starts_idx'),
+            # admin, and the moderation queue
+            models.Index(fields=['starts_at', 'id'], name='event_starts_at_id_idx'),
+            # ?category= filter, same ordering
+            models.Index(fields=['category', 'starts_at', 'id'], name='event_category_starts_idx'),
+            # dashboard "My Events"
+            models.Index(fields=['owner', 'starts_at'], name='event_owner_starts_idx'),
+            # ?sort=rating / ?sort=reviews
+            models.Index(fields=['rating_avg', 'id'], name='event_rating_idx'),
+            models.Index(fields=['reviews_count', 'id'], name='event_reviews_count_idx'),
+            # API validators: MAX(updated_at) over the approved events
+            models.Index(fields=['updated_at'], condition=Q(status='approved'), name='event_approved_updated_idx'),
+        ]
+        constraints = [
+            # one occurrence per slot; also the index behind series.occurrences
+            models.UniqueConstraint(fields=['series', 'starts_at'], name='event_series_starts_uniq'),
+        ]
         permissions = [
             ("approve_event", "Can approve event"),
         ]
@@ -51,20 +168,230 @@ class Event(models.Model):
 
     @property
     def tickets_count(self):
-        return self.tickets.count()
+        return self.tickets_booked
+
+    @property
+    def is_sold_out(self):
+        return self.tickets_booked >= self.capacity
+
+    def seats_left(self, seat_type=None):
+        """Seats still bookable, of seat_type if given; events with seat pools sell only what the pools hold."""
+        left = max(self.capacity - self.tickets_booked, 0)
+        if left:
+            pools = dict(self.seat_pools.values_list('seat_type', F('capacity') - F('booked')))
+            if pools:
+                free = pools.get(seat_type, 0) if seat_type else sum(max(n, 0) for n in pools.values())
+                left = min(left, max(free, 0))
+        return left
+
+    @classmethod
+    def adjust_booked(cls, event_id, delta):
+        # single UPDATE, never drops below zero even if the counter drifted
+        cls.objects.filter(pk=event_id).update(tickets_booked=Greatest(F('tickets_booked') + delta, 0))
+
+    @classmethod
+    def recount_booked(cls, queryset=None):
+        if queryset is None:
+            queryset = cls.objects.all()
+        actual = (Ticket.objects.filter(event=OuterRef('pk'))
+                  .order_by().values('event').annotate(n=Count('pk')).values('n'))
+        updated = queryset.update(tickets_booked=Coalesce(Subquery(actual), 0))
+        SeatPool.recount_booked(SeatPool.objects.filter(event__in=queryset.values('pk')))
+        return updated
+
+    @property
+    def rating_histogram(self):
+        return [(stars, getattr(self, f'stars_{stars}')) for stars in range(5, 0, -1)]
+
+    @classmethod
+    def apply_rating_change(cls, event_id, old=None, new=None):
+        """Move one review's rating from `old` to `new` (None = absent) in a single UPDATE."""
+        dc = (new is not None) - (old is not None)
+        ds = (new or 0) - (old or 0)
+        changes = {}
+        if old != new:
+            if old is not None:
+                changes[f'stars_{old}'] = Greatest(F(f'stars_{old}') - 1, 0)
+            if new is not None:
+                changes[f'stars_{new}'] = F(f'stars_{new}') + 1
+        if dc or ds:
+            # SET expressions see the old row, so compute the average from old + delta
+            changes.update(
+                reviews_count=Greatest(F('reviews_count') + dc, 0),
+                rating_sum=Greatest(F('rating_sum') + ds, 0),
+                rating_avg=Case(
+                    When(Q(reviews_count__gt=-dc),
+                         then=Cast(F('rating_sum') + ds, FloatField()) / (F('reviews_count') + dc)),
+                    default=Value(0.0),
+                ),
+            )
+        # even with no rating change (a comment edit), so updated_at moves
+        cls.objects.filter(pk=event_id).update(**changes)
+
+    @classmethod
+    def recount_ratings(cls, queryset=None):
+        if queryset is None:
+            queryset = cls.objects.all()
+        reviews = Review.objects.filter(event=OuterRef('pk')).order_by().values('event')
+
+        def total(aggregate, **filters):
+            return Coalesce(Subquery(reviews.filter(**filters).annotate(v=aggregate).values('v')), 0)
+
+        return queryset.update(
+            reviews_count=total(Count('pk')),
+            rating_sum=total(Sum('rating')),
+            rating_avg=Coalesce(Subquery(reviews.annotate(v=Cast(Sum('rating'), FloatField()) / Count('pk')).values('v')), 0.0),
+            **{f'stars_{n}': total(Count('pk'), rating=n) for n in range(1, 6)},
+        )
 
     def save(self, *args, **kwargs):
         if self.starts_at < timezone.now():
             raise ValueError("Event date must be in the future.")
-        if not self.slug:
-            base = slugify(self.title)[:130]
-            maybe = base
-            i = 1
-            while Event.objects.filter(slug=maybe).exclude(pk=self.pk).exists():
-                i += 1
-                maybe = f"{base}-{i}"
-            self.slug = maybe
-        super().save(*args, **kwargs)
+        if self.slug:
+            return super().save(*args, **kwargs)
+        base = slugs.base_slug(self.title)
+        for attempt in range(slugs.ATTEMPTS):
+            self.slug = slugs.allocate(Event._base_manager.using(kwargs.get('using')), {base: 1})[base][0]
+            try:
+                with transaction.atomic(using=kwargs.get('using')):
+                    return super().save(*args, **kwargs)
+            except IntegrityError as exc:
+                self.slug = ''
+                if not slugs.is_slug_conflict(exc) or attempt == slugs.ATTEMPTS - 1:
+                    raise
+                slugs.resync([base])
+
+class EventSeries(models.Model):
+    """A recurring event. Occurrences are ordinary Events, created ahead of time.
+
+    materialize() fills a rolling window (EVENT_SERIES_WINDOW_DAYS) for many
+    series at once with a single bulk_create; the materialize_series command
+    keeps it rolling. Edits to the inherited fields go to every upcoming
+    occurrence as one UPDATE (update_occurrences), and rule changes replace
+    the upcoming occurrences nobody has booked yet (reschedule).
+    """
+    INHERITED = ('category_id', 'title', 'description', 'location', 'capacity')
+    RULE_FIELDS = ('starts_at', 'frequency', 'interval', 'until', 'skip_dates')
+
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='event_series')
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='series')
+    title = models.CharField(max_length=120)
+    description = models.TextField(max_length=2000)
+    location = models.CharField(max_length=140)
+    capacity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    # the first occurrence; also sets the time of day for the rest
+    starts_at = models.DateTimeField()
+    frequency = models.CharField(max_length=10, choices=recurrence.CHOICES, default=recurrence.WEEKLY)
+    interval = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)],
+                                                help_text="Every N days, weeks or months.")
+    until = models.DateField(null=True, blank=True, help_text="Last possible date, inclusive.")
+    skip_dates = models.JSONField(default=list, blank=True, help_text="ISO dates without an occurrence.")
+    status = models.CharField(max_length=10, choices=Event.Status.choices, default=Event.Status.PENDING,
+                              editable=False)
+    # occurrences exist for every slot before this
+    materialized_until = models.DateTimeField(null=True, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['starts_at']
+        verbose_name_plural = 'event series'
+
+    def __str__(self):
+        return f"{self.title} ({self.get_frequency_display().lower()})"
+
+    def get_absolute_url(self):
+        return reverse('events:series_edit', kwargs={'pk': self.pk})
+
+    def occurrence_times(self, start, end):
+        return recurrence.occurrences(self.starts_at, self.frequency, self.interval, start, end,
+                                      until=self.until, skip=self.skip_dates)
+
+    def build_occurrence(self, starts_at):
+        return Event(series_id=self.pk, owner_id=self.owner_id, starts_at=starts_at, status=self.status,
+                     **{name: getattr(self, name) for name in self.INHERITED})
+
+    @classmethod
+    def materialize(cls, queryset=None, horizon=None):
+        """Create the missing occurrences of every series up to horizon; returns how many.
+
+        Three queries plus the bulk insert, however many series: the due
+        series, the occurrences they already have, and one UPDATE of their
+        materialized_until.
+        """
+        now = timezone.now()
+        horizon = horizon or now + timedelta(days=settings.EVENT_SERIES_WINDOW_DAYS)
+        queryset = cls.objects.all() if queryset is None else queryset
+        with transaction.atomic():
+            due = list(queryset.filter(Q(materialized_until__isnull=True) | Q(materialized_until__lt=horizon))
+                       .select_for_update())
+            if not due:
+                return 0
+            # slots kept by reschedule() or created by a concurrent run
+            taken = set(Event.objects.filter(series__in=due, starts_at__gte=now)
+                        .values_list('series_id', 'starts_at'))
+            events = [
+                series.build_occurrence(when)
+                for series in due
+                for when in series.occurrence_times(max(series.materialized_until or now, now), horizon)
+                if (series.pk, when) not in taken
+            ]
+            Event.objects.bulk_create(events, batch_size=500)
+            cls.objects.filter(pk__in=[series.pk for series in due]).update(materialized_until=horizon)
+        return len(events)
+
+    def upcoming(self):
+        return self.occurrences.filter(starts_at__gte=timezone.now())
+
+    def update_occurrences(self, status=None):
+        """Copy the inherited fields to every upcoming occurrence in one UPDATE.
+
+        Status is left alone unless given: occurrences are moderated one by
+        one or with Event moderation (see EventSeriesAdmin).
+        """
+        with transaction.atomic():
+            upcoming = self.upcoming()
+            ids = list(upcoming.values_list('pk', flat=True))
+            changes = {name: getattr(self, name) for name in self.INHERITED if name != 'capacity'}
+            if status:
+                changes['status'] = status
+            # never below the seats already sold
+            changes['capacity'] = Greatest(Value(self.capacity), F('tickets_booked'))
+            upcoming.update(**changes)
+            cache.bump_events(*ids)
+        return len(ids)
+
+    def reschedule(self):
+        """After a rule change: drop upcoming occurrences without bookings and refill the window."""
+        with transaction.atomic():
+            self.upcoming().filter(tickets_booked=0).delete()
+            EventSeries.objects.filter(pk=self.pk).update(materialized_until=None)
+            return EventSeries.materialize(EventSeries.objects.filter(pk=self.pk))
+
+class TicketQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            if kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts'):
+                # we can't tell which rows were really inserted, so recount
+                Event.recount_booked(Event.objects.filter(pk__in={t.event_id for t in created}))
+                if created:
+                    cache.bump(*{cache.event_scope(t.event_id) for t in created})
+                return created
+            per_event, per_pool = {}, {}
+            for ticket in created:
+                if getattr(ticket, '_counter_reserved', False):
+                    continue  # seats already taken by events.booking
+                per_event[ticket.event_id] = per_event.get(ticket.event_id, 0) + 1
+                key = (ticket.event_id, ticket.seat_type)
+                per_pool[key] = per_pool.get(key, 0) + 1
+            for event_id, n in per_event.items():
+                Event.adjust_booked(event_id, n)
+            for (event_id, seat_type), n in per_pool.items():
+                SeatPool.adjust_booked(event_id, seat_type, n)
+            if created:  # the events' own scopes only, like the Ticket signals
+                cache.bump(*{cache.event_scope(t.event_id) for t in created})
+        return created
 
 class Ticket(models.Model):
     class Seat(models.TextChoices):
@@ -76,13 +403,87 @@ class Ticket(models.Model):
     seat_type = models.CharField(max_length=20, choices=Seat.choices, default=Seat.STANDARD)
     booked_at = models.DateTimeField(auto_now_add=True)
 
+    objects = TicketQuerySet.as_manager()
+
     class Meta:
         unique_together = ('user', 'event')  # one ticket per user per event
         ordering = ['-booked_at']
+        indexes = [
+            models.Index(fields=['user', 'booked_at'], name='ticket_user_booked_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user} -> {self.event} ({self.seat_type})"
 
+    def save(self, *args, **kwargs):
+        # the counter bump in post_save must commit together with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
+class SeatPool(models.Model):
+    """Optional per-seat-type capacity. Events without pools sell any seat type."""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='seat_pools')
+    seat_type = models.CharField(max_length=20, choices=Ticket.Seat.choices)
+    capacity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    booked = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        unique_together = ('event', 'seat_type')
+        ordering = ['event', 'seat_type']
+
+    def __str__(self):
+        return f"{self.event} / {self.get_seat_type_display()} ({self.booked}/{self.capacity})"
+
+    @classmethod
+    def adjust_booked(cls, event_id, seat_type, delta):
+        cls.objects.filter(event_id=event_id, seat_type=seat_type).update(booked=Greatest(F('booked') + delta, 0))
+
+    @classmethod
+    def recount_booked(cls, queryset=None):
+        if queryset is None:
+            queryset = cls.objects.all()
+        actual = (Ticket.objects.filter(event=OuterRef('event'), seat_type=OuterRef('seat_type'))
+                  .order_by().values('event').annotate(n=Count('pk')).values('n'))
+        return queryset.update(booked=Coalesce(Subquery(actual), 0))
+
+class WaitlistEntry(models.Model):
+    """A user waiting for a seat at a sold-out event; events.waitlist promotes them."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='waitlist_entries')
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='waitlist')
+    seat_type = models.CharField(max_length=20, choices=Ticket.Seat.choices, default=Ticket.Seat.STANDARD)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'event')
+        ordering = ['created_at', 'id']
+        verbose_name_plural = 'waitlist entries'
+        indexes = [
+            # promotion order: first come, first served per event
+            models.Index(fields=['event', 'created_at', 'id'], name='waitlist_event_fifo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} waiting for {self.event} ({self.seat_type})"
+
+    def position(self):
+        """1-based place in the event's queue, counting every seat type."""
+        ahead = WaitlistEntry.objects.filter(event_id=self.event_id).filter(
+            Q(created_at__lt=self.created_at) | Q(created_at=self.created_at, id__lt=self.pk))
+        return ahead.count() + 1
+
+class ReviewQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            event_ids = {r.event_id for r in created}
+            Event.recount_ratings(Event.objects.filter(pk__in=event_ids))
+            cache.bump_events(*event_ids)
+        return created
+
 class Review(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reviews')
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='reviews')
@@ -90,13 +491,27 @@ class Review(models.Model):
     comment = models.TextField(max_length=1000)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ReviewQuerySet.as_manager()
+
     class Meta:
         unique_together = ('user', 'event')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['event', 'created_at'], name='review_event_created_idx'),
+            models.Index(fields=['user', 'created_at'], name='review_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.event} by {self.user} ({self.rating}/5)"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
 class Favorite(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='favorites')
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='favorited_by')
@@ -105,6 +520,9 @@ class Favorite(models.Model):
     class Meta:
         unique_together = ('user', 'event')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='favorite_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user} ❤️ {self.event}"
@@ -0,0 +1,161 @@
+"""Keyset (cursor) pagination, and counts that stay cheap on big tables.
+
+Instead of OFFSET + COUNT(*), each page continues from the last row of the
+previous one: WHERE (starts_at, id) > (last.starts_at, last.id). The cost of a
+page doesn't depend on how deep it is, as long as an index covers the ordering.
+
+Where page numbers are needed anyway (the admin), EstimatedCountPaginator
+avoids the full COUNT(*): whole tables are sized from the database's own
+bookkeeping and filtered counts stop at ADMIN_EXACT_COUNT_LIMIT.
+"""
+import base64
+import json
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+def _json_default(value):
+    # full precision; DjangoJSONEncoder would cut datetimes to milliseconds
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+class CursorPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    def __init__(self, queryset, ordering, per_page, with_count=False):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.with_count = with_count
+        opts = queryset.model._meta
+        self.fields = [f.lstrip('-') for f in self.ordering]
+        self._model_fields = [opts.pk if f in ('pk', 'id') else opts.get_field(f) for f in self.fields]
+
+    @property
+    def count(self):
+        return self.queryset.count() if self.with_count else None
+
+    def encode(self, obj, direction):
+        values = [obj[f] if isinstance(obj, dict) else getattr(obj, f) for f in self.fields]
+        raw = json.dumps([direction, values], default=_json_default, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, values = json.loads(raw)
+            if direction not in ('n', 'p') or len(values) != len(self.fields):
+                raise ValueError
+            return direction, [field.to_python(v) for field, v in zip(self._model_fields, values)]
+        except Exception:
+            return None, None
+
+    def _after(self, values, reverse=False):
+        # (a, b) > (x, y)  ==  a > x OR (a = x AND b > y), per-field direction aware
+        clauses = []
+        for i, name in enumerate(self.ordering):
+            descending = name.startswith('-') != reverse
+            lookup = f"{self.fields[i]}__{'lt' if descending else 'gt'}"
+            equal = {self.fields[j]: values[j] for j in range(i)}
+            clauses.append(Q(**equal, **{lookup: values[i]}))
+        # the redundant bound on the leading column lets SQLite range-scan the index
+        first_desc = self.ordering[0].startswith('-') != reverse
+        bound = Q(**{f"{self.fields[0]}__{'lte' if first_desc else 'gte'}": values[0]})
+        return bound & reduce(or_, clauses)
+
+    def _query(self, cursor):
+        direction, values = self.decode(cursor) if cursor else (None, None)
+        if direction == 'p':
+            flipped = [f[1:] if f.startswith('-') else f'-{f}' for f in self.ordering]
+            qs = self.queryset.filter(self._after(values, reverse=True)).order_by(*flipped)
+        else:
+            qs = self.queryset.order_by(*self.ordering)
+            if direction == 'n':
+                qs = qs.filter(self._after(values))
+        return direction, qs[:self.per_page + 1]
+
+    def _page(self, direction, rows, count):
+        has_more = len(rows) > self.per_page
+        if direction == 'p':
+            rows = rows[:self.per_page][::-1]
+            next_cursor = self.encode(rows[-1], 'n') if rows else None
+            previous_cursor = self.encode(rows[0], 'p') if rows and has_more else None
+        else:
+            rows = rows[:self.per_page]
+            next_cursor = self.encode(rows[-1], 'n') if rows and has_more else None
+            previous_cursor = self.encode(rows[0], 'p') if rows and direction == 'n' else None
+        return CursorPage(rows, next_cursor, previous_cursor, count)
+
+    def page(self, cursor=None):
+        direction, qs = self._query(cursor)
+        return self._page(direction, list(qs), self.count)
+
+    async def apage(self, cursor=None):
+        direction, qs = self._query(cursor)
+        rows = [obj async for obj in qs]
+        return self._page(direction, rows, await self.queryset.acount() if self.with_count else None)
+
+
+def estimated_count(model, using='default'):
+    """Approximate row count of the model's table without scanning it; None if there's no cheap estimate."""
+    connection = connections[using]
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+            row = cursor.fetchone()
+            return row[0] if row and row[0] >= 0 else None  # -1: never analyzed
+        if connection.vendor == 'sqlite':
+            # min/max of the rowid are two index lookups; ids are handed out in order and rarely reused
+            cursor.execute(f"SELECT max(rowid) - min(rowid) + 1 FROM {table}")
+            return cursor.fetchone()[0] or 0
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator whose count never scans more than ADMIN_EXACT_COUNT_LIMIT rows.
+
+    Unfiltered querysets past the limit report estimated_count(); filtered ones
+    are counted exactly up to the limit and capped there, so pages beyond it
+    are only reachable by narrowing the filter.
+    """
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                return estimate
+        # COUNT over a LIMITed subquery: stops reading after limit rows
+        return queryset.order_by()[:limit].count()
@@ -0,0 +1,50 @@
+"""Recurrence rules for event series: daily, weekly or monthly, every N.
+
+Occurrences keep the wall-clock time of the first one in the project time
+zone, so a weekly 19:00 meetup stays at 19:00 across DST changes. Monthly
+rules on the 29th-31st fall on the last day of shorter months. Skipped dates
+and the optional end date are local calendar dates.
+"""
+import calendar
+from datetime import date, datetime, timedelta
+
+from django.utils import timezone
+
+DAILY, WEEKLY, MONTHLY = 'daily', 'weekly', 'monthly'
+CHOICES = [(DAILY, 'Daily'), (WEEKLY, 'Weekly'), (MONTHLY, 'Monthly')]
+
+
+def _add_months(day, months):
+    year, month = divmod(day.month - 1 + months, 12)
+    year, month = day.year + year, month + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def _nth(first_day, frequency, n):
+    if frequency == MONTHLY:
+        return _add_months(first_day, n)
+    return first_day + timedelta(days=n * (7 if frequency == WEEKLY else 1))
+
+
+def _steps_between(first_day, frequency, day):
+    """Whole periods from first_day to day (a lower bound, never past it)."""
+    if frequency == MONTHLY:
+        return (day.year - first_day.year) * 12 + day.month - first_day.month - 1
+    return (day - first_day).days // (7 if frequency == WEEKLY else 1)
+
+
+def occurrences(first, frequency, interval, start, end, until=None, skip=()):
+    """Start times of the series beginning at `first`, in [start, end), oldest first."""
+    local = timezone.localtime(first)
+    skip = {date.fromisoformat(d) if isinstance(d, str) else d for d in skip}
+    k = max(_steps_between(local.date(), frequency, timezone.localtime(start).date()) // interval, 0)
+    while True:
+        day = _nth(local.date(), frequency, k * interval)
+        k += 1
+        if until and day > until:
+            return
+        when = datetime.combine(day, local.timetz())  # the zone's offset on that day
+        if when >= end:
+            return
+        if when >= start and day not in skip:
+            yield when
@@ -0,0 +1,134 @@
+"""Full-text event search on an SQLite FTS5 index.
+
+events_event_fts mirrors Event.title, description, location and the category
+name (rowid = event id). SQL triggers keep it in sync for every write path,
+including bulk_create and queryset.update(). On other database backends
+search falls back to icontains.
+
+The index and its triggers live in migrations (0006, recreated by 0011).
+SQLite rebuilds a table to alter it, which drops the triggers on it and fails
+while other triggers reference it, so a migration that alters events_event or
+events_category has to drop the triggers first and recreate them after, as
+0007 and 0011 do.
+"""
+import re
+
+from django.db import connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+
+from .models import Event
+
+FTS_TABLE = 'events_event_fts'
+
+_HL_OPEN, _HL_CLOSE = '\x02', '\x03'
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+REBUILD_SQL = [
+    f"DELETE FROM {FTS_TABLE}",
+    f"""INSERT INTO {FTS_TABLE}(rowid, title, description, location, category)
+        SELECT e.id, e.title, e.description, e.location, COALESCE(c.name, '')
+        FROM events_event e LEFT JOIN events_category c ON c.id = e.category_id""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')",
+]
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(text):
+    """User input -> safe FTS5 query: every word must match, as a prefix."""
+    tokens = _TOKEN.findall(text or '')
+    return ' '.join(f'"{t}"*' for t in tokens[:16]) or None
+
+
+def render_highlight(text):
+    """Escape FTS output and turn the highlight sentinels into <mark> tags."""
+    return escape(text).replace(_HL_OPEN, '<mark>').replace(_HL_CLOSE, '</mark>')
+
+
+def search(text, limit=10, offset=0, category_slug=None):
+    """Ranked matches among approved events as (event_id, title_html, snippet_html), best first."""
+    expr = match_expression(text)
+    if not expr:
+        return []
+    sql = f"""
+        SELECT f.rowid,
+               highlight({FTS_TABLE}, 0, %s, %s),
+               snippet({FTS_TABLE}, 1, %s, %s, '…', 16)
+        FROM {FTS_TABLE} f
+        JOIN events_event e ON e.id = f.rowid
+        {'JOIN events_category c ON c.id = e.category_id' if category_slug else ''}
+        WHERE {FTS_TABLE} MATCH %s AND e.status = 'approved' {'AND c.slug = %s' if category_slug else ''}
+        ORDER BY f.rank, f.rowid
+        LIMIT %s OFFSET %s
+    """
+    params = [_HL_OPEN, _HL_CLOSE, _HL_OPEN, _HL_CLOSE, expr]
+    if category_slug:
+        params.append(category_slug)
+    params += [limit, offset]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(pk, render_highlight(title), render_highlight(snippet)) for pk, title, snippet in cursor.fetchall()]
+
+
+def search_events(text, limit=10, offset=0, category_slug=None, queryset=None):
+    """Like search(), but returns Event objects carrying search_title / search_snippet."""
+    queryset = queryset if queryset is not None else Event.objects.approved()
+    if not is_available():
+        qs = queryset.filter(icontains_filter(text))
+        if category_slug:
+            qs = qs.filter(category__slug=category_slug)
+        return list(qs.order_by('starts_at', 'id')[offset:offset + limit])
+    hits = search(text, limit, offset, category_slug)
+    events = queryset.in_bulk([pk for pk, _, _ in hits])
+    results = []
+    for pk, title, snippet in hits:
+        event = events.get(pk)
+        if event is not None:
+            event.search_title, event.search_snippet = title, snippet
+            results.append(event)
+    return results
+
+
+def icontains_filter(text):
+    q = Q()
+    for token in _TOKEN.findall(text or ''):
+        q &= (Q(title__icontains=token) | Q(description__icontains=token)
+              | Q(location__icontains=token) | Q(category__name__icontains=token))
+    return q
+
+
+def matching_ids(text):
+    """The matching event ids as a subquery, for filters like event_id__in on other models."""
+    expr = match_expression(text)
+    if not expr:
+        return None
+    return RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [expr])
+
+
+def annotate_matches(queryset, text):
+    """Restrict an Event queryset to FTS matches, with search_rank and search_snippet columns."""
+    expr = match_expression(text)
+    if not expr:
+        return queryset
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = events_event.id', f'{FTS_TABLE} MATCH %s'],
+        params=[expr],
+        select={
+            'search_rank': f'{FTS_TABLE}.rank',
+            'search_snippet': f"snippet({FTS_TABLE}, -1, %s, %s, '…', 12)",
+        },
+        select_params=[_HL_OPEN, _HL_CLOSE],
+    )
+
+
+def rebuild(using='default'):
+    with connections[using].cursor() as cursor:
+        for statement in REBUILD_SQL:
+            cursor.execute(statement)
+        cursor.execute(f"SELECT count(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
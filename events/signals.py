@@ -0,0 +1,95 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from . import cache, waitlist
+from .models import Category, Event, Favorite, Review, SeatPool, Ticket
+from .tasks import send_moderation_notices
+
+
+@receiver(post_save, sender=Ticket)
+def ticket_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and not getattr(instance, '_counter_reserved', False):
+        Event.adjust_booked(instance.event_id, 1)
+        SeatPool.adjust_booked(instance.event_id, instance.seat_type, 1)
+    if not raw:
+        # the event's own scope only: see events.cache on seat counts in full pages
+        cache.bump(cache.event_scope(instance.event_id))
+
+
+@receiver(post_delete, sender=Ticket)
+def ticket_deleted(sender, instance, **kwargs):
+    # also fires for queryset deletes and Event/User cascades
+    Event.adjust_booked(instance.event_id, -1)
+    SeatPool.adjust_booked(instance.event_id, instance.seat_type, -1)
+    cache.bump(cache.event_scope(instance.event_id))
+    waitlist.schedule(instance.event_id)
+
+
+@receiver(post_init, sender=Review)
+def review_loaded(sender, instance, **kwargs):
+    # remember what the summary currently counts for this review; read __dict__
+    # directly so deferred fields (.only()/.defer()) don't trigger a query
+    values = instance.__dict__
+    loaded = instance.pk and values.get('event_id') is not None and values.get('rating') is not None
+    instance._counted = (values['event_id'], values['rating']) if loaded else None
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = None if created else getattr(instance, '_counted', None)
+    new = (instance.event_id, instance.rating)
+    old_event = old[0] if old else None
+    if old and old[0] != new[0]:
+        Event.apply_rating_change(old[0], old=old[1])
+        old = None
+    Event.apply_rating_change(new[0], old=old[1] if old else None, new=new[1])
+    instance._counted = new
+    cache.bump_events(*{old_event, new[0]} - {None})
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    event_id, rating = getattr(instance, '_counted', None) or (instance.event_id, instance.rating)
+    Event.apply_rating_change(event_id, old=rating)
+    cache.bump_events(event_id)
+
+
+# Cache invalidation (see events.cache)
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def event_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        cache.bump_events(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def category_changed(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        return cache.bump()
+    # event cards (and the API) show the category
+    instance.events.update(updated_at=timezone.now())
+    cache.bump_events(*instance.events.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def favorite_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        cache.bump(cache.event_scope(instance.event_id))
+
+
+# Moderation: sent once per EventQuerySet.moderate() batch, after it commits,
+# with status, event_ids and moderator.
+events_moderated = Signal()
+
+
+@receiver(events_moderated)
+def notify_owners(sender, status, event_ids, **kwargs):
+    send_moderation_notices.enqueue(status=status, event_ids=list(event_ids))
@@ -0,0 +1,72 @@
+"""Event slug allocation: "meetup", "meetup-2", "meetup-3", ...
+
+The highest number handed out for each base slug is kept in the cache, so
+allocating is one cache.incr. The database is only consulted (one indexed
+range query per batch) when counters are missing, e.g. after a restart.
+Numbers can be skipped but are never handed out twice by one cache; a slug
+that collides anyway (another process, a hand-written slug) fails on the
+unique constraint, and the caller resyncs and retries.
+"""
+import re
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.text import slugify
+
+MAX_BASE_LENGTH = 130
+ATTEMPTS = 3
+
+
+def base_slug(title):
+    return slugify(title)[:MAX_BASE_LENGTH].strip('-') or 'event'
+
+
+def _key(base):
+    return f'slug:{base}'
+
+
+def highest_used(queryset, bases):
+    """{base: highest number taken in the database}: 0 for none, 1 for the bare base."""
+    found = dict.fromkeys(bases, 0)
+    numbered = re.compile(r'^(.*)-([0-9]+)$')
+    bases = list(found)
+    # 200 ranges per query keeps the OR chain under SQLite's expression depth limit
+    for i in range(0, len(bases), 200):
+        # '.' sorts right after '-', so each range is exactly "base-*" and can use the slug index
+        ranges = Q()
+        for base in bases[i:i + 200]:
+            ranges |= Q(slug=base) | Q(slug__gt=f'{base}-', slug__lt=f'{base}.')
+        for slug in queryset.filter(ranges).values_list('slug', flat=True).iterator():
+            # "meetup-2024" is both "meetup" #2024 and the bare "meetup-2024"
+            if slug in found:
+                found[slug] = max(found[slug], 1)
+            match = numbered.match(slug)
+            if match and match[1] in found:
+                found[match[1]] = max(found[match[1]], int(match[2]))
+    return found
+
+
+def allocate(queryset, counts):
+    """{base: count} -> {base: [count consecutive unused slugs]}."""
+    keys = {base: _key(base) for base in counts}
+    while True:
+        warm = cache.get_many(list(keys.values()))
+        cold = [base for base in counts if keys[base] not in warm]
+        if cold:
+            for base, n in highest_used(queryset, cold).items():
+                cache.add(keys[base], n, timeout=None)
+        try:
+            last = {base: cache.incr(keys[base], n) for base, n in counts.items()}
+            break
+        except ValueError:
+            continue  # evicted between add and incr
+    return {base: [base if n == 1 else f'{base}-{n}' for n in range(last[base] - count + 1, last[base] + 1)]
+            for base, count in counts.items()}
+
+
+def resync(bases):
+    cache.delete_many([_key(base) for base in bases])
+
+
+def is_slug_conflict(exc):
+    return 'slug' in str(exc)
@@ -0,0 +1,108 @@
+"""Background work for events (see tasks.queue); the periodic ones are in TASKS_PERIODIC."""
+import logging
+from datetime import timedelta
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import send_mail, send_mass_mail
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from eventhub.db import retry_on_lock
+from tasks.queue import task
+
+from . import bulk_io, waitlist
+from .models import Event, EventSeries, Ticket
+
+logger = logging.getLogger(__name__)
+
+
+@task(max_attempts=5, retry_delay=60)
+def send_ticket_confirmations(ticket_ids, from_waitlist=False):
+    """One email per ticket, all over a single connection."""
+    tickets = (Ticket.objects.filter(pk__in=ticket_ids).exclude(user__email='')
+               .values_list('user__email', 'seat_type', 'event__title', 'event__starts_at', 'event__location'))
+    intro = "A seat freed up and you're off the waitlist" if from_waitlist else "Your booking is confirmed"
+    send_mass_mail([
+        (f"Your ticket: {title}",
+         f"{intro}: {Ticket.Seat(seat_type).label} seat for {title}, "
+         f"{timezone.localtime(starts_at):%b %d, %Y %H:%M} at {location}.",
+         None, [email])
+        for email, seat_type, title, starts_at, location in tickets
+    ])
+
+
+@task(max_attempts=5, retry_delay=60)
+def send_moderation_notices(status, event_ids):
+    """One email per owner for the whole moderation batch, sent over a single connection."""
+    titles = {}
+    for offset in range(0, len(event_ids), 500):
+        rows = (Event.objects.filter(pk__in=event_ids[offset:offset + 500]).exclude(owner__email='')
+                .values_list('owner__email', 'title'))
+        for email, title in rows:
+            titles.setdefault(email, []).append(title)
+    label = Event.Status(status).label.lower()
+    send_mass_mail([
+        (f"Your event was {label}" if len(events) == 1 else f"{len(events)} of your events were {label}",
+         '\n'.join(f"- {title}" for title in sorted(events)), None, [email])
+        for email, events in titles.items()
+    ])
+
+
+@task
+def export(kind, fmt='csv', notify_user_id=None):
+    """Write a full export under EXPORT_ROOT, optionally emailing the path when done."""
+    settings.EXPORT_ROOT.mkdir(parents=True, exist_ok=True)
+    path = settings.EXPORT_ROOT / f"{kind}-{timezone.now():%Y%m%d-%H%M%S}.{fmt}"
+    fields, rows = bulk_io.export_rows(kind)
+    with open(path, 'w', newline='', encoding='utf-8') as stream:
+        stream.writelines(bulk_io.write_rows(rows, fields, fmt))
+    email = get_user_model().objects.filter(pk=notify_user_id).values_list('email', flat=True).first()
+    if email:
+        send_mail(f"Your {kind} export is ready", f"It was saved to {path}.", None, [email])
+    return str(path)
+
+
+@task
+def reconcile_counters():
+    out = StringIO()
+    call_command('reconcile_counters', stdout=out)
+    logger.info(out.getvalue().strip().splitlines()[-1])
+
+
+@task
+def materialize_series():
+    EventSeries.materialize(horizon=timezone.now() + timedelta(days=settings.EVENT_SERIES_WINDOW_DAYS))
+
+
+@task(max_attempts=5, retry_delay=5)
+def promote_waitlist(event_id):
+    retry_on_lock(waitlist.promote, [event_id])
+
+
+@task
+def promote_waitlists():
+    waitlist.promote_all()
+
+
+@task(max_attempts=1)
+def warm_cache():
+    """Render the event list and the busiest event pages into the anonymous page cache.
+
+    Pages whose cache version hasn't moved are cache hits and cost nothing.
+    Only scheduled when the cache is shared with the web processes
+    (EVENTHUB_CACHE_DIR); a per-process cache only warms the worker.
+    """
+    handler = BaseHandler()
+    handler.load_middleware()  # the full middleware stack, as a visitor sees it
+    busiest = (Event.objects.approved().filter(starts_at__gte=timezone.now())
+               .order_by('-tickets_booked').values_list('slug', flat=True)[:settings.CACHE_WARM_EVENT_PAGES])
+    for url in [reverse('events:list')] + [reverse('events:detail', kwargs={'slug': slug}) for slug in busiest]:
+        handler.get_response(WSGIRequest({
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': url, 'SERVER_NAME': settings.ALLOWED_HOSTS[0],
+            'SERVER_PORT': '80', 'wsgi.url_scheme': 'http', 'wsgi.input': BytesIO(),
+        }))
@@ -0,0 +1,10 @@
+from django import template
+
+from events import cache
+
+register = template.Library()
+
+@register.filter
+def event_version(pk):
+    """Cache version of one event, for {% cache %} vary-on arguments."""
+    return cache.version(cache.event_scope(pk))
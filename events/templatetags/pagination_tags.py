@@ -0,0 +1,10 @@
+from django import template
+
+register = template.Library()
+
+@register.simple_tag(takes_context=True)
+def cursor_url(context, cursor, param='cursor'):
+    """Current query string with the cursor swapped, so filters survive paging."""
+    query = context['request'].GET.copy()
+    query[param] = cursor
+    return f"?{query.urlencode()}"
@@ -1 +1,1581 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.core import mail
+from django.core.cache import cache as django_cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import STAFF_GROUP
+from eventhub import routers
+from eventhub.db import retry_on_lock
+from eventhub.querybudget import query_budget
+from tasks.models import Task
+from tasks.worker import Worker
+
+from . import async_views as async_views_module, booking_queue, bulk_io, cache, recurrence, search, signals, tasks, waitlist
+from .benchmarking import async_views
+from .datagen import Generator
+from .management.commands import bench_urls
+from .booking import AlreadyBooked, SoldOut, book_ticket
+from .models import Category, Event, EventSeries, Favorite, Review, SeatPool, Ticket, WaitlistEntry
+from .pagination import CursorPaginator, EstimatedCountPaginator
+
+User = get_user_model()
+
+
+def make_event(owner, **kwargs):
+    defaults = {
+        'title': 'Launch Party',
+        'description': 'Big one.',
+        'location': 'Sofia',
+        'starts_at': timezone.now() + timedelta(days=7),
+        'capacity': 10,
+        'status': Event.Status.APPROVED,
+    }
+    defaults.update(kwargs)
+    return Event.objects.create(owner=owner, **defaults)
+
+
+class BookingServiceTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', password='pw')
+        self.event = make_event(self.owner, capacity=2)
+
+    def test_books_until_sold_out(self):
+        users = [User.objects.create_user(f'u{i}') for i in range(3)]
+        book_ticket(users[0], self.event)
+        book_ticket(users[1], self.event)
+        with self.assertRaises(SoldOut):
+            book_ticket(users[2], self.event)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.tickets_booked, 2)
+        self.assertEqual(Ticket.objects.filter(event=self.event).count(), 2)
+
+    def test_duplicate_booking_releases_seat(self):
+        user = User.objects.create_user('dup')
+        book_ticket(user, self.event)
+        with self.assertRaises(AlreadyBooked):
+            book_ticket(user, self.event)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.tickets_booked, 1)
+
+    def test_seat_pools(self):
+        SeatPool.objects.create(event=self.event, seat_type=Ticket.Seat.VIP, capacity=1)
+        a, b, c = (User.objects.create_user(n) for n in 'abc')
+        book_ticket(a, self.event, Ticket.Seat.VIP)
+        with self.assertRaises(SoldOut):
+            book_ticket(b, self.event, Ticket.Seat.VIP)
+        with self.assertRaises(SoldOut):
+            book_ticket(c, self.event, Ticket.Seat.STANDARD)  # no standard pool on this event
+        self.assertEqual(SeatPool.objects.get(event=self.event).booked, 1)
+        Ticket.objects.filter(user=a).delete()
+        self.assertEqual(SeatPool.objects.get(event=self.event).booked, 0)
+
+    def test_admin_keeps_the_counters(self):
+        SeatPool.objects.bulk_create([SeatPool(event=self.event, seat_type=Ticket.Seat.STANDARD, capacity=1),
+                                      SeatPool(event=self.event, seat_type=Ticket.Seat.VIP, capacity=1)])
+        other = make_event(self.owner, title='Afterparty', capacity=1)
+        a, b = (User.objects.create_user(n) for n in 'ab')
+        self.client.force_login(User.objects.create_superuser('boss', password='pw'))
+        add = reverse('admin:events_ticket_add')
+
+        def counters():
+            return (list(Event.objects.filter(pk__in=[self.event.pk, other.pk]).order_by('pk')
+                         .values_list('tickets_booked', flat=True)),
+                    dict(SeatPool.objects.filter(event=self.event).values_list('seat_type', 'booked')))
+
+        response = self.client.post(add, {'user': a.pk, 'event': self.event.pk, 'seat_type': 'standard'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(counters(), ([1, 0], {'standard': 1, 'vip': 0}))
+        response = self.client.post(add, {'user': b.pk, 'event': self.event.pk, 'seat_type': 'standard'})
+        self.assertContains(response, "No Standard seats left.")
+        self.assertFalse(Ticket.objects.filter(user=b).exists())
+
+        ticket = Ticket.objects.get(user=a)
+        change = reverse('admin:events_ticket_change', args=[ticket.pk])
+        self.client.post(change, {'user': a.pk, 'event': self.event.pk, 'seat_type': 'vip'})
+        self.assertEqual(counters(), ([1, 0], {'standard': 0, 'vip': 1}))
+        self.client.post(change, {'user': a.pk, 'event': other.pk, 'seat_type': 'vip'})
+        self.assertEqual(counters(), ([0, 1], {'standard': 0, 'vip': 0}))
+        self.client.post(add, {'user': b.pk, 'event': other.pk, 'seat_type': 'standard'})
+        self.assertEqual(counters(), ([0, 1], {'standard': 0, 'vip': 0}))
+        self.assertFalse(Ticket.objects.filter(user=b).exists())
+
+    def test_view_books_through_service(self):
+        user = User.objects.create_user('viewer', password='pw')
+        self.client.force_login(user)
+        url = reverse('events:ticket_create', kwargs={'slug': self.event.slug})
+        response = self.client.post(url, {'seat_type': 'standard'})
+        self.assertRedirects(response, self.event.get_absolute_url())
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.tickets_booked, 1)
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)  # no replicas configured
+        with override_settings(DATABASE_REPLICAS=['replica1']):
+            Ticket.objects.filter(user=user).delete()
+            response = self.client.post(url, {'seat_type': 'standard'})
+        self.assertIn(routers.PIN_COOKIE, response.cookies)  # the redirect target reads the primary
+
+
+class BookingQueueTests(TestCase):
+    def test_batch_commits_in_one_go(self):
+        owner = User.objects.create_user('owner')
+        event = make_event(owner, capacity=2)
+        a, b, c = (User.objects.create_user(n) for n in 'abc')
+        bq = booking_queue.BookingQueue(batch_size=10)
+        batch = [
+            booking_queue.BookingRequest(a.pk, event.pk, 'standard', 1),
+            booking_queue.BookingRequest(a.pk, event.pk, 'standard', 2),
+            booking_queue.BookingRequest(b.pk, event.pk, 'vip', 3),
+            booking_queue.BookingRequest(c.pk, event.pk, 'standard', 4),
+        ]
+        bq.process_batch(batch)
+        self.assertEqual([r.status for r in batch], ['booked', 'duplicate', 'booked', 'sold_out'])
+        event.refresh_from_db()
+        self.assertEqual(event.tickets_booked, 2)
+        self.assertEqual(Ticket.objects.filter(event=event).count(), 2)
+
+    @override_settings(BOOKING_QUEUE_ENABLED=True)
+    def test_view_redirects_to_status(self):
+        owner = User.objects.create_user('owner')
+        event = make_event(owner)
+        user = User.objects.create_user('fan')
+        self.client.force_login(user)
+        with mock.patch.object(booking_queue.BookingQueue, 'start'):
+            response = self.client.post(reverse('events:ticket_create', kwargs={'slug': event.slug}),
+                                        {'seat_type': 'standard'})
+            token = response.url.rstrip('/').rsplit('/', 1)[-1]
+            self.assertContains(self.client.get(response.url), 'position')
+            booking_queue.get_queue().process_batch([booking_queue.get_queue().get(token)])
+            self.assertRedirects(self.client.get(response.url), event.get_absolute_url())
+
+    def test_one_failing_request_doesnt_fail_the_batch(self):
+        event = make_event(User.objects.create_user('owner'), capacity=5)
+        a, b, c = (User.objects.create_user(n) for n in 'abc')
+        bulk_create = Ticket.objects.bulk_create
+
+        def conflict_on_a(tickets, *args, **kwargs):
+            if any(t.user_id == a.pk for t in tickets):
+                raise IntegrityError("UNIQUE constraint failed")
+            return bulk_create(tickets, *args, **kwargs)
+
+        batch = [booking_queue.BookingRequest(u.pk, event.pk, 'standard', i) for i, u in enumerate([a, b, c])]
+        with self.assertLogs('events.booking_queue', 'WARNING'), \
+                mock.patch.object(Ticket.objects, 'bulk_create', side_effect=conflict_on_a):
+            booking_queue.BookingQueue(batch_size=10).process_batch(batch)
+        self.assertEqual([r.status for r in batch], ['failed', 'booked', 'booked'])
+        event.refresh_from_db()
+        self.assertEqual(event.tickets_booked, 2)
+        self.assertEqual(set(Ticket.objects.values_list('user_id', flat=True)), {b.pk, c.pk})
+
+    def test_status_of_a_request_from_another_process(self):
+        event = make_event(User.objects.create_user('owner'))
+        user = User.objects.create_user('fan')
+        self.client.force_login(user)
+        url = reverse('events:ticket_status', kwargs={'slug': event.slug, 'token': 'elsewhere'})
+        self.assertEqual(self.client.get(url).status_code, 404)
+        Ticket.objects.create(user=user, event=event)
+        self.assertRedirects(self.client.get(url), event.get_absolute_url())
+
+
+@override_settings(BOOKING_LOCK_RETRIES=200, BOOKING_LOCK_BACKOFF=0.001)
+class BookingConcurrencyTests(TransactionTestCase):
+    attempts = 300
+    capacity = 120
+
+    def setUp(self):
+        owner = User.objects.create_user('owner')
+        self.event = make_event(owner, capacity=self.capacity)
+        SeatPool.objects.bulk_create([
+            SeatPool(event=self.event, seat_type=Ticket.Seat.STANDARD, capacity=80),
+            SeatPool(event=self.event, seat_type=Ticket.Seat.VIP, capacity=30),
+            SeatPool(event=self.event, seat_type=Ticket.Seat.PREMIUM, capacity=20),
+        ])
+        User.objects.bulk_create([User(username=f'buyer{i}') for i in range(self.attempts)])
+        self.users = list(User.objects.filter(username__startswith='buyer'))
+
+    def test_parallel_bookings_never_oversell(self):
+        seats = [Ticket.Seat.STANDARD, Ticket.Seat.VIP, Ticket.Seat.PREMIUM]
+        results = {'ok': 0, 'sold_out': 0}
+        lock = threading.Lock()
+
+        def attempt(i):
+            try:
+                book_ticket(self.users[i], self.event.pk, seats[i % 3])
+                outcome = 'ok'
+            except SoldOut:
+                outcome = 'sold_out'
+            finally:
+                connection.close()
+            with lock:
+                results[outcome] += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            list(pool.map(attempt, range(self.attempts)))
+        elapsed = time.perf_counter() - started
+
+        self.event.refresh_from_db()
+        booked = Ticket.objects.filter(event=self.event).count()
+        self.assertEqual(results['ok'] + results['sold_out'], self.attempts)
+        self.assertEqual(booked, results['ok'])
+        self.assertEqual(self.event.tickets_booked, booked)
+        self.assertLessEqual(booked, self.capacity)
+        for pool in SeatPool.objects.filter(event=self.event):
+            self.assertEqual(pool.booked, Ticket.objects.filter(event=self.event, seat_type=pool.seat_type).count())
+            self.assertLessEqual(pool.booked, pool.capacity)
+        # pools add up to 130 seats, so the event-wide capacity is what runs out
+        self.assertEqual(booked, self.capacity)
+        self.assertLess(elapsed, 60, f"{self.attempts} bookings took {elapsed:.1f}s")
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        django_cache.clear()
+        self.owner = User.objects.create_user('owner', password='pw')
+        start = timezone.now() + timedelta(days=1)
+        # pairs of events sharing a start time exercise the id tie-breaker
+        for i in range(25):
+            make_event(self.owner, title=f'Event {i}', starts_at=start + timedelta(hours=i // 2))
+
+    def test_walks_forward_and_back(self):
+        paginator = CursorPaginator(Event.objects.all(), ('starts_at', 'id'), 10)
+        expected = list(Event.objects.order_by('starts_at', 'id'))
+        pages, page = [], paginator.page()
+        while True:
+            pages.append(page)
+            if not page.has_next():
+                break
+            page = paginator.page(page.next_cursor)
+        self.assertEqual([len(p) for p in pages], [10, 10, 5])
+        self.assertEqual([e for p in pages for e in p], expected)
+        self.assertFalse(pages[0].has_previous())
+        back = paginator.page(pages[2].previous_cursor)
+        self.assertEqual(back.object_list, pages[1].object_list)
+        self.assertEqual(paginator.page(back.previous_cursor).object_list, pages[0].object_list)
+
+    def test_garbage_cursor_falls_back_to_first_page(self):
+        paginator = CursorPaginator(Event.objects.all(), ('starts_at', 'id'), 10)
+        self.assertEqual(paginator.page('not-a-cursor').object_list, paginator.page().object_list)
+
+    def test_list_view_pages_without_count(self):
+        response = self.client.get(reverse('events:list'))
+        self.assertEqual(len(response.context['events']), 10)
+        self.assertIsNone(response.context['page_obj'].count)
+        response = self.client.get(reverse('events:list'), {'cursor': response.context['page_obj'].next_cursor})
+        self.assertEqual(response.context['events'][0].title, 'Event 10')
+
+    def test_favorites_newest_first(self):
+        self.client.force_login(self.owner)
+        Favorite.objects.bulk_create([Favorite(user=self.owner, event=e) for e in Event.objects.all()])
+        response = self.client.get(reverse('events:favorites'))
+        favorites = response.context['favorites']
+        self.assertEqual(len(favorites), 10)
+        self.assertEqual(list(favorites), list(Favorite.objects.order_by('-created_at', '-id')[:10]))
+
+
+class QueryPlanTests(TestCase):
+    """EXPLAIN QUERY PLAN for every query a hot view runs: no full scans, no temp sorts."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('planner', password='pw')
+        cls.category = Category.objects.create(name='Music')
+        start = timezone.now() + timedelta(days=1)
+        cls.events = [make_event(cls.user, title=f'Gig {i}', category=cls.category,
+                                 starts_at=start + timedelta(hours=i)) for i in range(12)]
+        event = cls.events[0]
+        Ticket.objects.create(user=cls.user, event=event)
+        Review.objects.create(user=cls.user, event=event, rating=4, comment='Loud.')
+        Favorite.objects.create(user=cls.user, event=event)
+
+    def setUp(self):
+        django_cache.clear()
+
+    def plans_for(self, url, data=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        plans = []
+        for query in ctx.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or '"events_' not in sql:
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plans.append((sql, [row[3] for row in cursor.fetchall()]))
+        self.assertTrue(plans, f'{url} ran no events queries')
+        return response, plans
+
+    def assertIndexedPlans(self, url, data=None):
+        response, plans = self.plans_for(url, data)
+        for sql, steps in plans:
+            for step in steps:
+                full_scan = step.startswith('SCAN ') and ' INDEX ' not in step
+                self.assertFalse(full_scan, f'full table scan: {step}\n{sql}')
+                self.assertNotIn('TEMP B-TREE', step, f'unindexed sort: {step}\n{sql}')
+        return response
+
+    def test_event_list(self):
+        response = self.assertIndexedPlans(reverse('events:list'))
+        self.assertIndexedPlans(reverse('events:list'), {'cursor': response.context['page_obj'].next_cursor})
+
+    def test_event_list_by_category(self):
+        response = self.assertIndexedPlans(reverse('events:list'), {'category': 'music'})
+        self.assertIndexedPlans(reverse('events:list'), {
+            'category': 'music', 'cursor': response.context['page_obj'].next_cursor})
+
+    def test_event_detail(self):
+        self.client.force_login(self.user)
+        self.assertIndexedPlans(self.events[0].get_absolute_url())
+
+    def test_event_list_sorted_by_rating(self):
+        response = self.assertIndexedPlans(reverse('events:list'), {'sort': 'rating'})
+        self.assertIndexedPlans(reverse('events:list'), {
+            'sort': 'rating', 'cursor': response.context['page_obj'].next_cursor})
+
+    def test_event_list_uses_the_approved_events_index(self):
+        _, plans = self.plans_for(reverse('events:list'))
+        self.assertIn('event_approved_starts_idx', ' '.join(step for _, steps in plans for step in steps))
+
+    def test_favorites(self):
+        self.client.force_login(self.user)
+        self.assertIndexedPlans(reverse('events:favorites'))
+
+    def test_dashboard(self):
+        self.client.force_login(self.user)
+        self.assertIndexedPlans(reverse('dashboard:home'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_MAX_LAG=5)
+class ReplicaRoutingTests(SimpleTestCase):
+    databases = {'default'}  # no transaction around each test, unlike TestCase
+
+    def setUp(self):
+        django_cache.clear()
+        self.router = routers.ReplicaRouter()
+
+    def serve(self, request):
+        """Run request through ReplicaMiddleware; the view reports where a read would go."""
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(Event))
+            if request.method == 'POST':
+                self.router.db_for_write(Ticket)
+                seen.append(self.router.db_for_read(Event))
+            return HttpResponse()
+
+        return routers.ReplicaMiddleware(view)(request), seen
+
+    def test_reads_use_fresh_replicas_only(self):
+        request = RequestFactory().get('/')
+        self.assertEqual(self.serve(request)[1], ['default'])  # never reported
+        routers.mark_synced('replica1', at=time.time() - 60)
+        self.assertEqual(self.serve(request)[1], ['default'])  # lagging
+        routers.mark_synced('replica1')
+        self.assertEqual(self.serve(request)[1], ['replica1'])
+        self.assertEqual(self.router.db_for_write(Event), 'default')
+
+    def test_reads_outside_requests_use_the_primary(self):
+        routers.mark_synced('replica1')
+        self.assertEqual(self.router.db_for_read(Event), 'default')
+
+    def test_sync_reports_when_the_copy_started(self):
+        copy = mock.patch('events.management.commands.sync_replicas.Command.copy',
+                          side_effect=lambda *args: time.sleep(0.2))
+        with override_settings(DATABASE_REPLICAS=['default']), copy:
+            call_command('sync_replicas', stdout=StringIO())
+            self.assertGreaterEqual(routers.replica_lag('default'), 0.2)  # writes during the copy may be missing
+
+    def test_reads_in_a_transaction_use_the_primary(self):
+        routers.mark_synced('replica1')
+        with transaction.atomic():
+            self.assertEqual(self.router.db_for_read(Event), 'default')
+
+    def test_client_is_pinned_to_primary_after_a_write(self):
+        routers.mark_synced('replica1')
+        factory = RequestFactory()
+        response, seen = self.serve(factory.get('/'))
+        self.assertEqual(seen, ['replica1'])
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+
+        response, seen = self.serve(factory.post('/'))
+        self.assertEqual(seen, ['default', 'default'])
+        self.assertEqual(response.cookies[routers.PIN_COOKIE]['max-age'], settings.REPLICA_PIN_SECONDS)
+
+        request = factory.get('/')
+        request.COOKIES[routers.PIN_COOKIE] = '1'
+        self.assertEqual(self.serve(request)[1], ['default'])
+
+
+class SQLiteProfileTests(TestCase):
+    def test_production_profile_tunes_new_connections(self):
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        conn = DatabaseWrapper({**connection.settings_dict, **settings.SQLITE_PRODUCTION_PROFILE,
+                                'NAME': os.path.join(tmpdir, 'profile.sqlite3')}, 'profile')
+        self.addCleanup(conn.close)
+        with conn.cursor() as cursor:
+            pragmas = {}
+            for name in ('journal_mode', 'synchronous', 'busy_timeout', 'temp_store', 'cache_size'):
+                cursor.execute(f'PRAGMA {name}')
+                pragmas[name] = cursor.fetchone()[0]
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000,
+                                   'temp_store': 2, 'cache_size': -65536})
+        self.assertEqual(conn.transaction_mode, 'IMMEDIATE')
+
+
+@override_settings(QUERY_BUDGET_HEADERS=True)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('budget', password='pw')
+        cls.event = make_event(cls.user, category=Category.objects.create(name='Tech'))
+        for i in range(3):
+            make_event(cls.user, title=f'Other {i}')
+        Favorite.objects.create(user=cls.user, event=cls.event)
+        Review.objects.create(user=cls.user, event=cls.event, rating=5, comment='Great')
+
+    def setUp(self):
+        django_cache.clear()
+
+    def test_hot_views_stay_within_budget(self):
+        self.client.force_login(self.user)
+        for name, kwargs in [('events:list', {}), ('events:favorites', {}), ('dashboard:home', {}),
+                             ('events:detail', {'slug': self.event.slug})]:
+            response = self.client.get(reverse(name, kwargs=kwargs))
+            with self.subTest(name):
+                self.assertLessEqual(int(response['X-Query-Count']), int(response['X-Query-Budget']))
+                self.assertFalse(response.has_header('X-Query-N-Plus-One'))
+
+    @override_settings(QUERY_BUDGETS={'events:list': 0})
+    def test_over_budget_is_logged(self):
+        with self.assertLogs('eventhub.queries', 'WARNING') as logs:
+            self.client.get(reverse('events:list'))
+        self.assertEqual(logs.records[0].view_name, 'events:list')
+        self.assertEqual(logs.records[0].query_budget, 0)
+
+    def test_helper_flags_n_plus_one(self):
+        with self.assertRaisesMessage(AssertionError, 'N+1: 4x'):
+            with query_budget(None, nplusone_threshold=3):
+                for event in Event.objects.all():
+                    Event.objects.get(pk=event.pk)
+        with query_budget(1):
+            list(Event.objects.select_related('category'))
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('searcher', password='pw')
+        music = Category.objects.create(name='Music')
+        cls.jazz = make_event(cls.user, title='Jazz Night', description='Smooth <b>saxophone</b>.', category=music)
+        cls.talk = make_event(cls.user, title='Python Talk', description='We mention jazz once.')
+        make_event(cls.user, title='Cooking Class', description='Pasta.', location='Plovdiv')
+
+    def setUp(self):
+        django_cache.clear()
+
+    def test_ranked_with_highlights(self):
+        events = search.search_events('jazz')
+        self.assertEqual(events, [self.jazz, self.talk])
+        self.assertEqual(events[0].search_title, '<mark>Jazz</mark> Night')
+        self.assertIn('<mark>jazz</mark>', events[1].search_snippet)
+
+    def test_index_follows_writes(self):
+        self.assertEqual(search.search_events('plovdiv')[0].title, 'Cooking Class')
+        Event.objects.filter(pk=self.talk.pk).update(location='Varna')
+        self.assertEqual(search.search_events('varna'), [self.talk])
+        Category.objects.filter(name='Music').update(name='Concerts')
+        self.assertEqual(search.search_events('concert'), [self.jazz])
+        self.jazz.delete()
+        self.assertEqual(search.search_events('jazz'), [self.talk])
+
+    def test_list_page_search_escapes_content(self):
+        response = self.client.get(reverse('events:list'), {'q': 'saxophone'})
+        self.assertEqual(list(response.context['events']), [self.jazz])
+        self.assertContains(response, '&lt;b&gt;<mark>saxophone</mark>&lt;/b&gt;')
+
+    def test_admin_search(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('admin:events_event_changelist'), {'q': 'jazz'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.jazz, self.talk])
+        self.assertContains(response, '<mark>Jazz</mark>')
+
+    def test_rebuild(self):
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(search.search_events('jazz')), 2)
+
+
+class RatingSummaryTests(TestCase):
+    def setUp(self):
+        django_cache.clear()
+        self.owner = User.objects.create_user('owner', password='pw')
+        self.event = make_event(self.owner)
+        self.reviewer = User.objects.create_user('critic', password='pw')
+        self.client.force_login(self.reviewer)
+
+    def summary(self):
+        self.event.refresh_from_db()
+        return (self.event.reviews_count, self.event.rating_sum, self.event.rating_avg,
+                [n for _, n in self.event.rating_histogram])
+
+    def test_views_keep_summary_in_sync(self):
+        Review.objects.create(user=self.owner, event=self.event, rating=5, comment='Mine')
+        self.client.post(reverse('events:review_create', kwargs={'slug': self.event.slug}),
+                         {'rating': 2, 'comment': 'Meh'})
+        self.assertEqual(self.summary(), (2, 7, 3.5, [1, 0, 0, 1, 0]))
+
+        review = Review.objects.get(user=self.reviewer)
+        self.client.post(reverse('events:review_edit', kwargs={'review_id': review.pk}),
+                         {'rating': 4, 'comment': 'Better on reflection'})
+        self.assertEqual(self.summary(), (2, 9, 4.5, [1, 1, 0, 0, 0]))
+
+        self.client.post(reverse('events:review_delete', kwargs={'review_id': review.pk}))
+        self.assertEqual(self.summary(), (1, 5, 5.0, [1, 0, 0, 0, 0]))
+
+        Review.objects.all().delete()
+        self.assertEqual(self.summary(), (0, 0, 0.0, [0, 0, 0, 0, 0]))
+
+    def test_bulk_create_and_reconcile(self):
+        users = [User.objects.create_user(f'r{i}') for i in range(3)]
+        Review.objects.bulk_create([Review(user=u, event=self.event, rating=i + 1, comment='x')
+                                    for i, u in enumerate(users)])
+        self.assertEqual(self.summary(), (3, 6, 2.0, [0, 0, 1, 1, 1]))
+        Event.objects.filter(pk=self.event.pk).update(reviews_count=0, stars_3=9)
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(self.summary(), (3, 6, 2.0, [0, 0, 1, 1, 1]))
+
+    def test_sort_by_rating(self):
+        low = make_event(self.owner, title='Low')
+        Review.objects.create(user=self.reviewer, event=low, rating=1, comment='Bad')
+        Review.objects.create(user=self.reviewer, event=self.event, rating=5, comment='Good')
+        unrated = make_event(self.owner, title='Unrated')
+        response = self.client.get(reverse('events:list'), {'sort': 'rating'})
+        self.assertEqual(list(response.context['events']), [self.event, low, unrated])
+
+
+@override_settings(REVIEWS_PAGE_SIZE=5)
+class ReviewStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('host', password='pw')
+        cls.event = make_event(cls.owner)
+        users = User.objects.bulk_create([User(username=f'fan{i}') for i in range(12)])
+        Review.objects.bulk_create([Review(user=u, event=cls.event, rating=i % 5 + 1, comment=f'Review {i}')
+                                    for i, u in enumerate(users)])
+        cls.me = users[3]
+
+    def setUp(self):
+        django_cache.clear()
+
+    def test_detail_renders_first_page_in_one_query(self):
+        self.client.force_login(self.me)
+        Favorite.objects.create(user=self.me, event=self.event)
+        # session, user, event with the viewer's ticket/favorite/review, reviews page
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('events:detail', kwargs={'slug': self.event.slug}))
+        ctx = response.context
+        self.assertEqual(len(ctx['reviews']), 5)
+        self.assertTrue(ctx['reviews'].has_next())
+        self.assertTrue(ctx['is_favorite'])
+        self.assertFalse(ctx['has_ticket'])
+        self.assertEqual(ctx['my_review'].comment, 'Review 3')
+        self.assertContains(response, reverse('events:reviews', kwargs={'slug': self.event.slug}))
+
+    def test_fragment_pages_through_all_reviews(self):
+        url = reverse('events:reviews', kwargs={'slug': self.event.slug})
+        seen, cursor = [], ''
+        while cursor is not None:
+            with self.assertNumQueries(1):
+                response = self.client.get(url, {'cursor': cursor} if cursor else {})
+            page = response.context['reviews']
+            seen += [r.comment for r in page]
+            cursor = page.next_cursor
+        self.assertEqual(sorted(seen), sorted(f'Review {i}' for i in range(12)))
+        self.assertNotContains(response, 'data-load-more')
+
+
+class CacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('cacher', password='pw')
+        cls.event = make_event(cls.owner)
+        cls.other = make_event(cls.owner, title='Other')
+
+    def setUp(self):
+        django_cache.clear()
+
+    def test_anonymous_pages_are_cached_until_a_write(self):
+        url = reverse('events:list')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'hit')
+
+        Review.objects.create(user=self.owner, event=self.event, rating=4, comment='Good')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'miss')
+
+    def test_bookings_only_invalidate_pages_showing_their_event(self):
+        detail = lambda event: reverse('events:detail', kwargs={'slug': event.slug})
+        urls = [reverse('events:list'), detail(self.event), detail(self.other)]
+        for url in urls:
+            self.client.get(url)
+        before = cache.version()
+        book_ticket(self.owner, self.event)
+        self.assertEqual(cache.version(), before)
+        response = self.client.get(urls[0])
+        self.assertEqual(response['X-Cache'], 'miss')
+        self.assertContains(response, 'Booked: 1')
+        self.assertEqual(self.client.get(urls[1])['X-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(urls[2])['X-Cache'], 'hit')
+
+    def test_ticket_bulk_create_leaves_the_global_version(self):
+        before = cache.version(), cache.version(cache.event_scope(self.event.pk))
+        Ticket.objects.bulk_create([Ticket(user=self.owner, event=self.event)])
+        Ticket.objects.bulk_create([])
+        after = cache.version(), cache.version(cache.event_scope(self.event.pk))
+        self.assertEqual(after[0], before[0])
+        self.assertGreater(after[1], before[1])
+
+    def test_logged_in_users_are_not_cached(self):
+        self.client.force_login(self.owner)
+        url = reverse('events:detail', kwargs={'slug': self.event.slug})
+        self.client.get(url)
+        self.assertFalse(self.client.get(url).has_header('X-Cache'))
+
+    def test_writes_only_invalidate_the_event_they_touch(self):
+        versions = lambda: (cache.version(), cache.version(cache.event_scope(self.event.pk)),
+                            cache.version(cache.event_scope(self.other.pk)))
+        before = versions()
+        Review.objects.create(user=self.owner, event=self.event, rating=3, comment='Fine')
+        after = versions()
+        self.assertGreater(after[0], before[0])
+        self.assertGreater(after[1], before[1])
+        self.assertEqual(after[2], before[2])
+
+    def test_review_fragment_refreshes(self):
+        url = reverse('events:detail', kwargs={'slug': self.event.slug})
+        self.assertContains(self.client.get(url), 'No reviews yet.')
+        Review.objects.create(user=self.owner, event=self.event, rating=5, comment='Superb')
+        self.assertContains(self.client.get(url), 'Superb')
+
+    def test_category_rename_invalidates_cards(self):
+        music = Category.objects.create(name='Music')
+        Event.objects.filter(pk=self.event.pk).update(category=music)
+        cache.bump_events(self.event.pk)
+        self.assertContains(self.client.get(reverse('events:list')), 'Music')
+        music.name = 'Live Music'
+        music.save()
+        self.assertContains(self.client.get(reverse('events:list')), 'Live Music')
+
+
+class SlugTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('slugger')
+
+    def setUp(self):
+        django_cache.clear()
+
+    def test_same_title_gets_numbered(self):
+        slugs = [make_event(self.owner, title='Meetup').slug for _ in range(3)]
+        self.assertEqual(slugs, ['meetup', 'meetup-2', 'meetup-3'])
+
+    def test_counter_resumes_from_database(self):
+        make_event(self.owner, title='Meetup', slug='meetup-41')
+        make_event(self.owner, title='Meetup', slug='meetup-party')
+        with self.assertNumQueries(4):  # counter lookup, savepoint, insert, release
+            self.assertEqual(make_event(self.owner, title='Meetup').slug, 'meetup-42')
+        with self.assertNumQueries(3):
+            self.assertEqual(make_event(self.owner, title='Meetup').slug, 'meetup-43')
+
+    def test_collision_resyncs_and_retries(self):
+        make_event(self.owner, title='Meetup')
+        # written behind the cached counter's back, e.g. by another process
+        Event.objects.bulk_create([Event(owner=self.owner, title='x', slug='meetup-2', description='d',
+                                         location='l', starts_at=timezone.now() + timedelta(days=1), capacity=1)])
+        self.assertEqual(make_event(self.owner, title='Meetup').slug, 'meetup-3')
+
+    def test_bulk_create_assigns_slugs(self):
+        make_event(self.owner, title='Meetup')
+        start = timezone.now() + timedelta(days=1)
+        events = Event.objects.bulk_create([
+            Event(owner=self.owner, title=title, description='d', location='l', starts_at=start, capacity=1)
+            for title in ['Meetup', 'Meetup', 'Other', '!!!']
+        ])
+        self.assertEqual([e.slug for e in events], ['meetup-2', 'meetup-3', 'other', 'event'])
+
+
+class BulkImportExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('importer')
+        cls.fans = User.objects.bulk_create([User(username=f'fan{i}') for i in range(4)])
+        Category.objects.create(name='Music')
+
+    def run_import(self, kind, text, fmt='csv', **options):
+        path = os.path.join(self.tmp, f'in.{fmt}')
+        with open(path, 'w') as f:
+            f.write(text)
+        out, err = StringIO(), StringIO()
+        call_command('import_events', path, kind=kind, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def setUp(self):
+        django_cache.clear()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def test_events_round_trip(self):
+        when = (timezone.now() + timedelta(days=3)).isoformat()
+        rows = ''.join(f'Gig {i},music,Loud,Sofia,{when},{50 + i}\n' for i in range(5))
+        out, err = self.run_import('events', 'title,category,description,location,starts_at,capacity\n' + rows
+                                   + f'Past,music,Old,Sofia,2000-01-01T00:00:00,5\n'
+                                   + f'Nowhere,jazz,?,Sofia,{when},5\n', owner='importer', batch_size=2)
+        self.assertIn('7 rows, 5 created, 2 rejected', out)
+        self.assertIn('line 7: starts_at', err)
+        self.assertIn("line 8: unknown category 'jazz'", err)
+        self.assertEqual(Event.objects.filter(category__slug='music').count(), 5)
+
+        export = StringIO()
+        call_command('export_events', format='jsonl', stdout=export, stderr=StringIO())
+        lines = [json.loads(line) for line in export.getvalue().splitlines()]
+        self.assertEqual([r['slug'] for r in lines], [f'gig-{i}' for i in range(5)])
+        self.assertEqual(lines[0]['owner'], 'importer')
+
+        # re-importing the export is a no-op: rows with known slugs are skipped
+        out, _ = self.run_import('events', export.getvalue(), fmt='jsonl')
+        self.assertIn('5 rows, 0 created, 0 rejected', out)
+
+    def test_slug_collisions_are_rejected_per_row(self):
+        out, err = self.run_import('categories', 'name,slug\nRock & Roll,\nRock Roll,\nJazz,\nTechno,music\n',
+                                   batch_size=10)
+        self.assertIn('4 rows, 2 created, 2 rejected', out)
+        self.assertIn("line 3: slug 'rock-roll' is already taken", err)
+        self.assertIn("line 5: slug 'music' is already taken", err)
+        self.assertEqual(set(Category.objects.values_list('name', flat=True)), {'Music', 'Rock & Roll', 'Jazz'})
+
+        when = (timezone.now() + timedelta(days=3)).isoformat()
+        out, err = self.run_import('events', 'slug,title,description,location,starts_at,capacity\n'
+                                   + f'gig,Gig,Loud,Sofia,{when},5\ngig,Gig again,Loud,Sofia,{when},5\n'
+                                   + f'other,Other,Quiet,Sofia,{when},5\n', owner='importer')
+        self.assertIn('3 rows, 2 created, 1 rejected', out)
+        self.assertIn("line 3: slug 'gig' is already used earlier in the file", err)
+        self.assertEqual(set(Event.objects.values_list('slug', flat=True)), {'gig', 'other'})
+
+    def test_batch_query_count_does_not_grow_with_rows(self):
+        when = (timezone.now() + timedelta(days=3)).isoformat()
+        rows = [(i, {'title': f'Gig {i}', 'owner': 'importer', 'category': 'music', 'description': 'x',
+                     'location': 'y', 'starts_at': when, 'capacity': 5}) for i in range(200)]
+        importer = bulk_io.EventImporter(batch_size=200)
+        with CaptureQueriesContext(connection) as ctx:
+            result = importer.run(rows)
+        self.assertEqual(result.created, 200)
+        # owners and slug counters; the rest are the INSERTs themselves
+        selects = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 2, selects)
+
+    def test_tickets_respect_capacity(self):
+        event = make_event(self.owner, capacity=3)
+        book_ticket(self.fans[0], event)
+        rows = ''.join(f'{event.slug},fan{i},standard\n' for i in range(4))
+        out, err = self.run_import('tickets', 'event,user,seat_type\n' + rows)
+        self.assertIn('0 created, 3 rejected', out)
+        self.assertIn('sold out', err)
+        out, err = self.run_import('tickets', 'event,user,seat_type\n' + rows.split('\n', 2)[2])
+        self.assertIn('2 created', out)
+        event.refresh_from_db()
+        self.assertEqual(event.tickets_booked, 3)
+
+    def test_admin_import_needs_add_permission_for_the_kind(self):
+        editor = User.objects.create_user('editor', password='pw', is_staff=True)
+        editor.user_permissions.add(*Permission.objects.filter(codename__in=['add_event', 'view_event']))
+        self.client.force_login(editor)
+        url = reverse('admin:events_event_import')
+        response = self.client.post(url, {'kind': 'categories', 'file': SimpleUploadedFile('c.csv', b'name\nJazz\n')})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('kind', response.context['form'].errors)
+        self.assertFalse(Category.objects.filter(name='Jazz').exists())
+        self.assertEqual([k for k, _ in response.context['form'].fields['kind'].choices], ['events'])
+
+    def test_admin_export_action(self):
+        admin_user = User.objects.create_superuser('boss', password='pw')
+        event = make_event(self.owner)
+        self.client.force_login(admin_user)
+        response = self.client.post(reverse('admin:events_event_changelist'),
+                                    {'action': 'export_csv', '_selected_action': [event.pk]})
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith('slug,title,owner'))
+        self.assertIn(event.slug, body)
+
+
+class AttendeeExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('organizer', password='pw')
+        cls.event = make_event(cls.owner, capacity=100)
+        fans = User.objects.bulk_create([User(username=f'fan{i}', email=f'fan{i}@example.com') for i in range(30)])
+        Ticket.objects.bulk_create([Ticket(user=u, event=cls.event, seat_type='vip' if i % 3 else 'standard')
+                                    for i, u in enumerate(fans)])
+
+    def test_owner_streams_attendees(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('events:attendees_export', kwargs={'slug': self.event.slug}))
+        self.assertTrue(response.streaming)
+        chunks = iter(response.streaming_content)
+        with self.assertNumQueries(0):  # the header goes out before the query runs
+            self.assertEqual(next(chunks).decode().strip(), 'event,user,email,seat_type,booked_at')
+        with self.assertNumQueries(1):
+            rows = list(csv.reader(b''.join(chunks).decode().splitlines()))
+        self.assertEqual(len(rows), 30)
+        self.assertEqual(rows[0][:4], [self.event.slug, 'fan0', 'fan0@example.com', 'standard'])
+
+    def test_only_owner_or_staff(self):
+        self.client.force_login(User.objects.create_user('nosy'))
+        response = self.client.get(reverse('events:attendees_export', kwargs={'slug': self.event.slug}))
+        self.assertEqual(response.status_code, 403)
+
+    def test_admin_action_across_events(self):
+        other = make_event(self.owner, title='Second')
+        Ticket.objects.create(user=self.owner, event=other)
+        self.client.force_login(User.objects.create_superuser('boss', password='pw'))
+        response = self.client.post(reverse('admin:events_event_changelist'),
+                                    {'action': 'export_attendees', '_selected_action': [self.event.pk, other.pk]})
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(rows), 32)
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.enterClassContext(async_views())
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('asyncer', password='pw')
+        cls.event = make_event(cls.user, category=Category.objects.create(name='Tech'))
+        for i in range(12):
+            make_event(cls.user, title=f'Other {i}', starts_at=timezone.now() + timedelta(days=10, hours=i))
+        Favorite.objects.create(user=cls.user, event=cls.event)
+        Review.objects.create(user=cls.user, event=cls.event, rating=4, comment='Solid')
+
+    def setUp(self):
+        django_cache.clear()
+
+    def test_urls_point_at_async_views(self):
+        from django.urls import resolve
+        self.assertIs(resolve(reverse('events:list')).func.__wrapped__, async_views_module.event_list)
+
+    async def test_list_pages(self):
+        response = await self.async_client.get(reverse('events:list'))
+        self.assertEqual(len(response.context['events']), 10)
+        self.assertEqual(response.context['events'][0], self.event)
+        cursor = response.context['page_obj'].next_cursor
+        response = await self.async_client.get(reverse('events:list'), {'cursor': cursor})
+        self.assertEqual(len(response.context['events']), 3)
+        response = await self.async_client.get(reverse('events:list'), {'q': 'other'})
+        self.assertEqual(len(response.context['events']), 10)
+
+    @override_settings(QUERY_BUDGET_HEADERS=True)
+    async def test_detail_for_owner(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('events:detail', kwargs={'slug': self.event.slug}))
+        self.assertTrue(response.context['is_favorite'])
+        self.assertEqual(response.context['my_review'].comment, 'Solid')
+        self.assertContains(response, 'Solid')
+        self.assertIn(int(response['X-Query-Count']), range(1, int(response['X-Query-Budget']) + 1))
+        missing = await self.async_client.get(reverse('events:detail', kwargs={'slug': 'nope'}))
+        self.assertEqual(missing.status_code, 404)
+
+    async def test_favorites_require_login(self):
+        response = await self.async_client.get(reverse('events:favorites'))
+        self.assertEqual(response.status_code, 302)
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('events:favorites'))
+        self.assertEqual([f.event for f in response.context['favorites']], [self.event])
+
+    async def test_anonymous_pages_are_cached(self):
+        url = reverse('events:list')
+        self.assertEqual((await self.async_client.get(url))['X-Cache'], 'miss')
+        self.assertEqual((await self.async_client.get(url))['X-Cache'], 'hit')
+
+
+class DataGeneratorTests(TestCase):
+    def test_seeded_data_is_skewed_and_counters_agree(self):
+        created = Generator(users=60, categories=3, events=40, tickets=800, reviews=300, favorites=300,
+                            batch_size=100).run()
+        self.assertEqual(created['users'], 60)
+        self.assertEqual(Event.objects.count(), 40)
+        self.assertEqual(Ticket.objects.count(), created['tickets'])
+        counts = sorted(Event.objects.values_list('tickets_booked', flat=True), reverse=True)
+        self.assertEqual(sum(counts), created['tickets'])
+        self.assertGreater(sum(counts[:4]), sum(counts) / 3)  # the top 10% of events sell a third of the seats
+        self.assertFalse(Event.objects.filter(tickets_booked__gt=F('capacity')).exists())
+        out = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=out)
+        self.assertIn('0 booking counter(s), 0 seat pool(s) and 0 rating summaries drifted', out.getvalue())
+
+    def test_same_seed_same_data(self):
+        Generator(users=10, events=10, tickets=50, reviews=10, favorites=10, prefix='a').run()
+        Generator(users=10, events=10, tickets=50, reviews=10, favorites=10, prefix='b').run()
+        titles = list(Event.objects.order_by('pk').values_list('title', flat=True))
+        self.assertEqual(titles[:10], titles[10:])
+
+
+class BenchmarkTargetTests(TestCase):
+    def test_every_bench_urls_target_succeeds(self):
+        Generator(users=20, categories=2, events=10, tickets=40, reviews=20, favorites=20).run()
+        command = bench_urls.Command()
+        for name, make_request in command.targets().items():
+            with self.subTest(name):
+                if hasattr(make_request, 'prepare'):
+                    make_request.prepare(1)
+                status = make_request(0).status_code
+                self.assertTrue(bench_urls.succeeded(status), f"{name} returned {status}")
+        self.assertEqual(Ticket.objects.filter(event__title='Bench booking').count(), 1)
+
+    def test_error_responses_are_flagged(self):
+        result = bench_urls.Command().measure(lambda i: HttpResponse(status=404), 2)
+        self.assertFalse(result['ok'])
+
+
+class EventAPITests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('api', password='pw')
+        cls.category = Category.objects.create(name='Tech')
+        start = timezone.now() + timedelta(days=1)
+        cls.events = [make_event(cls.user, title=f'Talk {i}', category=cls.category, capacity=5,
+                                 starts_at=start + timedelta(hours=i)) for i in range(3)]
+        Review.objects.create(user=cls.user, event=cls.events[0], rating=5, comment='Great')
+
+    def setUp(self):
+        django_cache.clear()
+
+    def test_list_pages_and_selects_fields(self):
+        with self.settings(API_PAGE_SIZE=2), self.assertNumQueries(2):  # validators, page
+            data = self.client.get(reverse('api:events'), {'fields': 'id,title,category'}).json()
+        self.assertEqual(data['results'][0], {'id': self.events[0].pk, 'title': 'Talk 0', 'category': 'tech'})
+        with self.settings(API_PAGE_SIZE=2):
+            rest = self.client.get(reverse('api:events'), {'cursor': data['next']}).json()
+        self.assertEqual([e['title'] for e in rest['results']], ['Talk 2'])
+        self.assertIsNone(rest['next'])
+        self.assertEqual(self.client.get(reverse('api:events'), {'fields': 'password'}).status_code, 400)
+
+    def test_conditional_get_follows_the_database(self):
+        url = reverse('api:event', args=[self.events[0].pk])
+        response = self.client.get(url)
+        self.assertEqual(response.json()['reviews_count'], 1)
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.content), (304, b''))
+        # a booking on another event leaves this one's ETag alone
+        book_ticket(self.user, self.events[1])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # queryset updates move updated_at too (counter repairs, other processes)
+        Event.objects.filter(pk=self.events[0].pk).update(tickets_booked=1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['tickets_booked'], 1)
+        # Last-Modified alone revalidates as well
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        etag = response['ETag']
+        self.category.name = 'Technology'
+        self.category.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        review = Review.objects.get(event=self.events[0])
+        review.comment = 'Great talk'
+        review.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_unapproved_events_are_hidden(self):
+        hidden = make_event(self.user, status=Event.Status.PENDING)
+        for name in ('api:event', 'api:event_reviews', 'api:event_availability'):
+            self.assertEqual(self.client.get(reverse(name, args=[hidden.pk])).status_code, 404, name)
+        data = self.client.get(reverse('api:availability'), {'ids': f'{hidden.pk},{self.events[0].pk}'}).json()
+        self.assertEqual(list(data), [str(self.events[0].pk)])
+
+    def test_availability(self):
+        SeatPool.objects.create(event=self.events[0], seat_type=Ticket.Seat.VIP, capacity=2)
+        book_ticket(self.user, self.events[0], Ticket.Seat.VIP)
+        data = self.client.get(reverse('api:event_availability', args=[self.events[0].pk])).json()
+        self.assertEqual(data, {'id': self.events[0].pk, 'capacity': 5, 'available': 4, 'seat_types': {'vip': 1}})
+        ids = ','.join(str(e.pk) for e in self.events)
+        response = self.client.get(reverse('api:availability'), {'ids': ids})
+        self.assertEqual(response.json(), {str(self.events[0].pk): 4, str(self.events[1].pk): 5,
+                                           str(self.events[2].pk): 5})
+        again = self.client.get(reverse('api:availability'), {'ids': ids}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(self.client.get(reverse('api:availability'), {'ids': 'x'}).status_code, 400)
+
+    def test_reviews_and_categories(self):
+        reviews = self.client.get(reverse('api:event_reviews', args=[self.events[0].pk])).json()
+        self.assertEqual([(r['user'], r['rating']) for r in reviews['results']], [('api', 5)])
+        self.assertEqual(self.client.get(reverse('api:event_reviews', args=[0])).status_code, 404)
+        categories = self.client.get(reverse('api:categories')).json()['results']
+        self.assertEqual(categories, [{'name': 'Tech', 'slug': 'tech', 'events_count': 3}])
+        self.assertEqual(self.client.post(reverse('api:categories')).status_code, 405)
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('boss', password='pw')
+        Generator(users=10, categories=2, events=10, tickets=30, reviews=10, favorites=10).run()
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist_queries(self, model, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f'admin:events_{model}_changelist'), params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries_per_page_do_not_grow_with_rows(self):
+        models = ('event', 'ticket', 'review', 'favorite')
+        before = {model: self.changelist_queries(model) for model in models}
+        Generator(users=40, categories=5, events=80, tickets=400, reviews=150, favorites=150, prefix='more').run()
+        self.assertEqual({model: self.changelist_queries(model) for model in models}, before)
+        self.assertLessEqual(before['event'], 7)  # no per-row category lookups
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=20)
+    def test_counts_are_estimated_or_capped_past_the_limit(self):
+        Ticket.objects.filter(pk=Ticket.objects.order_by('pk')[5].pk).delete()
+        tickets = Ticket.objects.all()
+        estimate = Ticket.objects.order_by('-pk')[0].pk - Ticket.objects.order_by('pk')[0].pk + 1
+        self.assertEqual(EstimatedCountPaginator(tickets, 10).count, estimate)
+        self.assertEqual(EstimatedCountPaginator(tickets.filter(seat_type='standard'), 10).count, 20)
+        with override_settings(ADMIN_EXACT_COUNT_LIMIT=10_000):
+            self.assertEqual(EstimatedCountPaginator(tickets, 10).count, tickets.count())
+
+    def test_search_by_username_and_event_words(self):
+        user, event = User.objects.get(username='seed3'), make_event(self.admin, title='Harpsichord Evening')
+        Ticket.objects.create(user=self.admin, event=event)
+        url = reverse('admin:events_ticket_changelist')
+        results = self.client.get(url, {'q': 'seed3'}).context['cl'].result_list
+        self.assertEqual({t.user_id for t in results}, {user.pk})
+        self.assertEqual(len(results), user.tickets.count())
+        results = self.client.get(url, {'q': 'harpsi'}).context['cl'].result_list
+        self.assertEqual([t.event_id for t in results], [event.pk])
+
+
+class ModerationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.moderator = User.objects.create_user('mod', password='pw', is_staff=True)
+        cls.moderator.groups.add(Group.objects.get(name=STAFF_GROUP))
+        cls.owners = [User.objects.create_user(f'owner{i}', email=f'owner{i}@example.com') for i in range(2)]
+        cls.live = make_event(cls.owners[0], title='Live Jazz')
+        cls.pending = [make_event(cls.owners[i % 2], title=f'Pending jazz {i}', status=Event.Status.PENDING)
+                       for i in range(6)]
+
+    def setUp(self):
+        django_cache.clear()
+
+    def test_only_approved_events_are_listed(self):
+        self.assertEqual(list(self.client.get(reverse('events:list')).context['events']), [self.live])
+        self.assertEqual(list(self.client.get(reverse('events:list'), {'q': 'jazz'}).context['events']), [self.live])
+        self.assertEqual([e['id'] for e in self.client.get(reverse('api:events')).json()['results']], [self.live.pk])
+
+    def test_unapproved_events_are_only_open_to_owner_and_moderators(self):
+        hidden = self.pending[0]
+        visitor = User.objects.create_user('visitor', password='pw')
+        detail = reverse('events:detail', args=[hidden.slug])
+        self.assertEqual(self.client.get(detail).status_code, 404)
+        self.client.force_login(visitor)
+        self.assertEqual(self.client.get(detail).status_code, 404)
+        for name in ('events:ticket_create', 'events:review_create', 'events:favorite_add', 'events:waitlist_join'):
+            self.assertEqual(self.client.post(reverse(name, args=[hidden.slug])).status_code, 404, name)
+        self.assertFalse(hidden.tickets.exists() or hidden.favorited_by.exists() or hidden.waitlist.exists())
+        for user in (self.owners[0], self.moderator):
+            self.client.force_login(user)
+            self.assertEqual(self.client.get(detail).status_code, 200)
+
+    def test_owner_edits_go_back_to_moderation(self):
+        music = Category.objects.create(name='Music')
+        Event.objects.filter(pk=self.live.pk).update(category=music)
+        data = {'title': self.live.title, 'description': self.live.description, 'location': self.live.location,
+                'capacity': 20, 'category': music.pk,
+                'starts_at': timezone.localtime(self.live.starts_at).strftime('%Y-%m-%dT%H:%M')}
+        url = reverse('events:edit', args=[self.live.slug])
+        self.client.force_login(self.owners[0])
+        self.client.post(url, data)  # more seats need no approval
+        self.assertEqual(Event.objects.get(pk=self.live.pk).status, Event.Status.APPROVED)
+        self.client.post(url, {**data, 'title': 'Live Jazz and more'})
+        self.assertEqual(Event.objects.get(pk=self.live.pk).status, Event.Status.PENDING)
+        Event.objects.filter(pk=self.live.pk).update(status=Event.Status.APPROVED)
+        self.client.force_login(self.moderator)
+        self.client.post(url, {**data, 'description': 'Edited by a moderator.'})
+        self.assertEqual(Event.objects.get(pk=self.live.pk).status, Event.Status.APPROVED)
+
+    def test_bulk_approve_is_one_update_with_one_notice_per_owner(self):
+        received = []
+        signals.events_moderated.connect(lambda **kwargs: received.append(kwargs), weak=False, dispatch_uid='t')
+        self.addCleanup(signals.events_moderated.disconnect, dispatch_uid='t')
+        before = cache.version(cache.event_scope(self.pending[0].pk))
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            changed = Event.objects.filter(title__startswith='Pending').moderate(Event.Status.APPROVED, self.moderator)
+        self.assertEqual(sorted(changed), sorted(e.pk for e in self.pending))
+        self.assertEqual(sum(q['sql'].startswith('UPDATE') for q in queries), 1)
+        self.assertEqual(len(received), 1)
+        self.assertEqual(sorted(received[0]['event_ids']), sorted(changed))
+        self.assertEqual(mail.outbox, [])  # sent in the background
+        self.assertEqual(Worker(threads=0).run(once=True), 1)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['owner0@example.com', 'owner1@example.com'])
+        self.assertEqual(mail.outbox[0].subject, '3 of your events were approved')
+        self.assertNotEqual(cache.version(cache.event_scope(self.pending[0].pk)), before)
+        event = Event.objects.get(pk=self.pending[0].pk)
+        self.assertEqual((event.status, event.moderated_by), (Event.Status.APPROVED, self.moderator))
+        self.assertEqual(Event.objects.approved().count(), 7)
+        # already approved: nothing to do, nothing sent
+        self.assertEqual(Event.objects.filter(pk=self.live.pk).moderate(Event.Status.APPROVED, self.moderator), [])
+
+    def test_admin_actions(self):
+        self.client.force_login(self.moderator)
+        url = reverse('admin:events_event_changelist')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url + '?q=pending', {
+                'action': 'reject_events', '_selected_action': [self.pending[0].pk, self.pending[1].pk]})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Event.objects.filter(status=Event.Status.REJECTED).count(), 2)
+        Worker(threads=0).run(once=True)
+        self.assertEqual(mail.outbox[0].subject, 'Your event was rejected')
+
+        regular = User.objects.create_user('regular', password='pw', is_staff=True)
+        regular.user_permissions.add(Permission.objects.get(codename='change_event'))
+        self.client.force_login(regular)
+        actions = [name for name, _ in self.client.get(url).context['action_form'].fields['action'].choices]
+        self.assertIn('export_csv', actions)
+        self.assertNotIn('approve_events', actions)
+
+    def test_created_events_wait_for_approval(self):
+        data = {'title': 'New Thing', 'description': 'd', 'location': 'Sofia', 'capacity': 5,
+                'category': Category.objects.create(name='Misc').pk,
+                'starts_at': (timezone.now() + timedelta(days=3)).strftime('%Y-%m-%dT%H:%M')}
+        self.client.force_login(self.owners[0])
+        self.assertEqual(self.client.post(reverse('events:create'), data).status_code, 302)
+        self.client.force_login(self.moderator)
+        self.client.post(reverse('events:create'), {**data, 'title': 'Staff Thing'})
+        statuses = dict(Event.objects.filter(title__endswith='Thing').values_list('title', 'status'))
+        self.assertEqual(statuses, {'New Thing': Event.Status.PENDING, 'Staff Thing': Event.Status.APPROVED})
+
+
+class RecurrenceTests(SimpleTestCase):
+    def local(self, *args):
+        return timezone.make_aware(datetime(*args))
+
+    def test_weekly_keeps_local_time_across_dst_and_skips_dates(self):
+        first = self.local(2030, 10, 13, 19, 0)  # DST ends on 2030-10-27 in Europe/Bucharest
+        times = list(recurrence.occurrences(first, recurrence.WEEKLY, 1, first, self.local(2031, 1, 1),
+                                            until=date(2030, 11, 17), skip=['2030-11-03']))
+        self.assertEqual([timezone.localtime(t).strftime('%m-%d %H:%M') for t in times],
+                         ['10-13 19:00', '10-20 19:00', '10-27 19:00', '11-10 19:00', '11-17 19:00'])
+
+    def test_monthly_on_the_31st_and_windows(self):
+        first = self.local(2031, 1, 31, 10, 0)
+        times = list(recurrence.occurrences(first, recurrence.MONTHLY, 1, self.local(2031, 2, 1),
+                                            self.local(2031, 5, 1)))
+        self.assertEqual([t.date() for t in times], [date(2031, 2, 28), date(2031, 3, 31), date(2031, 4, 30)])
+        every_other_day = recurrence.occurrences(first, recurrence.DAILY, 2, self.local(2031, 3, 1),
+                                                 self.local(2031, 3, 6))
+        self.assertEqual([t.day for t in every_other_day], [2, 4])
+
+
+class EventSeriesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('organizer', password='pw')
+        cls.category = Category.objects.create(name='Meetups')
+
+    def setUp(self):
+        django_cache.clear()  # permission sets cached for an earlier test's user with the same pk
+
+    def make_series(self, **kwargs):
+        defaults = {'owner': self.owner, 'category': self.category, 'title': 'Python Meetup', 'description': 'Talks.',
+                    'location': 'Sofia', 'capacity': 30, 'frequency': recurrence.WEEKLY,
+                    'starts_at': timezone.now() + timedelta(days=1), 'status': Event.Status.APPROVED}
+        defaults.update(kwargs)
+        return EventSeries.objects.create(**defaults)
+
+    def test_materialize_fills_the_window_once(self):
+        series = [self.make_series(title=f'Meetup {i}') for i in range(3)]
+        series.append(self.make_series(frequency=recurrence.DAILY, skip_dates=[]))
+        horizon = timezone.now() + timedelta(days=28)
+        with CaptureQueriesContext(connection) as queries:
+            created = EventSeries.materialize(horizon=horizon)
+        self.assertEqual(created, 3 * 4 + 27)
+        self.assertLessEqual(sum(q['sql'].startswith('INSERT') for q in queries), 2)
+        event = series[0].occurrences.first()
+        self.assertEqual((event.title, event.category, event.capacity, event.status, event.owner),
+                         ('Meetup 0', self.category, 30, Event.Status.APPROVED, self.owner))
+        self.assertEqual(len({e.slug for e in Event.objects.all()}), created)
+        self.assertEqual(EventSeries.materialize(horizon=horizon), 0)
+        self.assertEqual(EventSeries.materialize(horizon=horizon + timedelta(days=7)), 3 + 7)
+
+    def test_series_wide_edit_is_one_update(self):
+        series = self.make_series()
+        EventSeries.materialize(horizon=timezone.now() + timedelta(days=35))
+        first = series.occurrences.first()
+        Event.objects.filter(pk=first.pk).update(tickets_booked=20)
+        series.title, series.capacity = 'Django Meetup', 10
+        series.save()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(series.update_occurrences(), 5)
+        self.assertEqual(sum(q['sql'].startswith('UPDATE') for q in queries), 1)
+        capacities = dict(series.occurrences.values_list('pk', 'capacity'))
+        self.assertEqual(capacities.pop(first.pk), 20)  # not below the seats sold
+        self.assertEqual(set(capacities.values()), {10})
+        self.assertEqual(set(series.occurrences.values_list('title', flat=True)), {'Django Meetup'})
+
+    def test_views_create_and_reschedule(self):
+        self.client.force_login(self.owner)
+        starts_at = timezone.localtime(timezone.now() + timedelta(days=2)).replace(second=0, microsecond=0)
+        data = {'category': self.category.pk, 'title': 'Weekly Chess', 'description': 'Bring a board.',
+                'location': 'Plovdiv', 'capacity': 12, 'starts_at': starts_at.strftime('%Y-%m-%dT%H:%M'),
+                'frequency': recurrence.WEEKLY, 'interval': 1, 'until': '', 'skip_dates': ''}
+        response = self.client.post(reverse('events:series_create'), data)
+        self.assertRedirects(response, reverse('dashboard:home'))
+        series = EventSeries.objects.get(title='Weekly Chess')
+        window = settings.EVENT_SERIES_WINDOW_DAYS
+        self.assertEqual(series.occurrences.count(), len(range(0, window - 2, 7)))
+        self.assertEqual(series.occurrences.first().status, Event.Status.PENDING)
+
+        booked = series.occurrences.order_by('starts_at')[1]
+        Ticket.objects.create(user=self.owner, event=booked)
+        skipped = timezone.localtime(series.occurrences.order_by('starts_at')[2].starts_at).date()
+        data.update(frequency=recurrence.WEEKLY, interval=2, skip_dates=skipped.isoformat())
+        EventSeries.objects.filter(pk=series.pk).update(status=Event.Status.APPROVED)
+        series.occurrences.update(status=Event.Status.APPROVED)
+        self.client.post(reverse('events:series_edit', kwargs={'pk': series.pk}), data)
+        days = [(timezone.localtime(t).date() - starts_at.date()).days
+                for t in series.occurrences.order_by('starts_at').values_list('starts_at', flat=True)]
+        # every other week from the start, minus the skipped date, plus the booked week-1 event
+        expected = sorted({d for d in range(0, window - 2, 14) if d != 14} | {7})
+        self.assertEqual(days, expected)
+        self.assertEqual(set(series.occurrences.values_list('status', flat=True)), {Event.Status.APPROVED})
+        self.client.post(reverse('events:series_edit', kwargs={'pk': series.pk}), {**data, 'title': 'Chess Night'})
+        self.assertEqual(set(series.occurrences.values_list('status', flat=True)), {Event.Status.PENDING})
+
+
+class WaitlistTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', password='pw')
+        self.event = make_event(self.owner, capacity=2)
+        self.holders = [User.objects.create_user(f'holder{i}', f'holder{i}@example.com') for i in range(2)]
+        for user in self.holders:
+            book_ticket(user, self.event)
+        self.waiters = [User.objects.create_user(f'waiter{i}', f'waiter{i}@example.com', 'pw') for i in range(3)]
+
+    def run_tasks(self):
+        return Worker(threads=0).run(once=True)
+
+    def assertCountersMatch(self, event):
+        event.refresh_from_db()
+        self.assertEqual(event.tickets_booked, Ticket.objects.filter(event=event).count())
+        for pool in SeatPool.objects.filter(event=event):
+            self.assertEqual(pool.booked, Ticket.objects.filter(event=event, seat_type=pool.seat_type).count())
+
+    def test_cancellation_promotes_first_in_line(self):
+        for user in self.waiters:
+            waitlist.join(user, self.event)
+        Ticket.objects.get(user=self.holders[0]).delete()
+        self.assertEqual(Task.objects.get().name, 'events.promote_waitlist')
+        self.assertEqual(self.run_tasks(), 2)  # the promotion, then its confirmation
+        self.assertTrue(Ticket.objects.filter(user=self.waiters[0], event=self.event).exists())
+        self.assertEqual(list(self.event.waitlist.values_list('user', flat=True)),
+                         [self.waiters[1].pk, self.waiters[2].pk])
+        self.assertCountersMatch(self.event)
+        self.assertEqual([m.to for m in mail.outbox], [['waiter0@example.com']])
+
+    def test_free_seat_types_skip_the_queue(self):
+        SeatPool.objects.create(event=self.event, seat_type=Ticket.Seat.STANDARD, capacity=1, booked=1)
+        SeatPool.objects.create(event=self.event, seat_type=Ticket.Seat.VIP, capacity=1, booked=1)
+        Ticket.objects.filter(user=self.holders[1]).update(seat_type=Ticket.Seat.VIP)
+        waitlist.join(self.waiters[0], self.event, Ticket.Seat.VIP)
+        waitlist.join(self.waiters[1], self.event, Ticket.Seat.STANDARD)
+        Ticket.objects.get(user=self.holders[0]).delete()  # a standard seat
+        self.run_tasks()
+        self.assertEqual(list(Ticket.objects.filter(event=self.event).values_list('user', 'seat_type')),
+                         [(self.waiters[1].pk, Ticket.Seat.STANDARD), (self.holders[1].pk, Ticket.Seat.VIP)])
+        self.assertCountersMatch(self.event)
+
+    def test_cascades_and_bulk_deletes_promote_in_one_batch(self):
+        other = make_event(self.owner, title='Other', capacity=1)
+        book_ticket(self.holders[0], other)
+        extra = User.objects.create_user('extra')
+        Event.objects.filter(pk=self.event.pk).update(capacity=3)
+        book_ticket(extra, self.event)
+        # first in line, but has had a ticket since: dropped, not given a second one
+        WaitlistEntry.objects.create(user=self.holders[1], event=self.event)
+        for user in self.waiters[:2]:
+            waitlist.join(user, self.event)
+        waitlist.join(self.waiters[2], other)
+        self.holders[0].delete()  # cascades to both of their tickets
+        Ticket.objects.filter(user=extra).delete()
+        # one promotion per event, however many seats freed up
+        self.assertEqual(Task.objects.filter(name='events.promote_waitlist').count(), 2)
+        with mock.patch('events.tasks.send_mass_mail') as send:
+            self.run_tasks()
+        self.assertEqual(set(Ticket.objects.values_list('user__username', 'event')),
+                         {('holder1', self.event.pk), ('waiter0', self.event.pk), ('waiter1', self.event.pk),
+                          ('waiter2', other.pk)})
+        self.assertFalse(WaitlistEntry.objects.exists())
+        self.assertCountersMatch(self.event)
+        self.assertCountersMatch(other)
+        # one confirmation task per promotion, each sending its emails in one batch
+        confirmations = Task.objects.filter(name='events.send_ticket_confirmations')
+        self.assertEqual(sorted(len(k['ticket_ids']) for k in confirmations.values_list('kwargs', flat=True)),
+                         [1, 2])
+        self.assertEqual(sum(len(c.args[0]) for c in send.call_args_list), 3)
+
+    def test_promotion_queries_do_not_grow_with_the_waitlist(self):
+        def promote(n):
+            Ticket.objects.filter(event=self.event).delete()
+            WaitlistEntry.objects.all().delete()
+            users = User.objects.bulk_create([User(username=f'bulk{n}-{i}') for i in range(n)])
+            WaitlistEntry.objects.bulk_create([WaitlistEntry(user=u, event=self.event) for u in users])
+            Event.objects.filter(pk=self.event.pk).update(capacity=n)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(len(waitlist.promote([self.event.pk])), n)
+            return len(queries)
+
+        self.assertEqual(promote(3), promote(60))
+        self.assertCountersMatch(self.event)
+
+    def test_views(self):
+        self.client.force_login(self.waiters[0])
+        detail = reverse('events:detail', kwargs={'slug': self.event.slug})
+        self.assertContains(self.client.get(detail), 'join waitlist')
+        response = self.client.post(reverse('events:waitlist_join', kwargs={'slug': self.event.slug}),
+                                    {'seat_type': Ticket.Seat.VIP})
+        self.assertRedirects(response, detail, fetch_redirect_response=False)
+        self.assertEqual(WaitlistEntry.objects.get(user=self.waiters[0]).seat_type, Ticket.Seat.VIP)
+        self.assertContains(self.client.get(detail), 'Leave waitlist')
+        self.client.post(reverse('events:waitlist_leave', kwargs={'slug': self.event.slug}))
+        self.assertFalse(WaitlistEntry.objects.exists())
+
+        waitlist.join(self.waiters[0], self.event)
+        self.client.force_login(self.holders[0])
+        self.client.post(reverse('events:ticket_cancel', kwargs={'slug': self.event.slug}))
+        self.run_tasks()
+        self.assertTrue(Ticket.objects.filter(user=self.waiters[0]).exists())
+        # a seat is free now: joining sends you to the booking form
+        Ticket.objects.filter(user=self.holders[1]).delete()
+        self.client.force_login(self.waiters[1])
+        response = self.client.post(reverse('events:waitlist_join', kwargs={'slug': self.event.slug}))
+        self.assertRedirects(response, reverse('events:ticket_create', kwargs={'slug': self.event.slug}))
+
+
+    def test_started_and_unapproved_events_are_not_promoted(self):
+        for user in self.waiters[:2]:
+            waitlist.join(user, self.event)
+        Ticket.objects.filter(user__in=self.holders).delete()
+        Event.objects.filter(pk=self.event.pk).update(starts_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(waitlist.promote([self.event.pk]), [])
+        Event.objects.filter(pk=self.event.pk).update(starts_at=timezone.now() + timedelta(days=1),
+                                                      status=Event.Status.REJECTED)
+        self.assertEqual(waitlist.promote_all(), 0)
+        self.assertEqual(self.event.waitlist.count(), 2)
+        Event.objects.filter(pk=self.event.pk).update(status=Event.Status.APPROVED)
+        self.assertEqual(waitlist.promote_all(), 2)
+
+    def test_full_seat_pool_has_its_own_waitlist(self):
+        event = make_event(self.owner, title='Pooled', capacity=5)
+        SeatPool.objects.create(event=event, seat_type=Ticket.Seat.STANDARD, capacity=4)
+        SeatPool.objects.create(event=event, seat_type=Ticket.Seat.VIP, capacity=1)
+        book_ticket(self.holders[0], event, Ticket.Seat.VIP)
+        self.assertEqual((event.seats_left(), event.seats_left(Ticket.Seat.VIP)), (4, 0))
+        self.client.force_login(self.waiters[0])
+        booking = reverse('events:ticket_create', kwargs={'slug': event.slug})
+        response = self.client.post(booking, {'seat_type': Ticket.Seat.VIP})
+        self.assertRedirects(response, booking)
+        self.assertEqual(self.client.get(booking).context['waitlist_seats'], [('vip', 'VIP')])
+        join = reverse('events:waitlist_join', kwargs={'slug': event.slug})
+        self.assertRedirects(self.client.post(join, {'seat_type': Ticket.Seat.STANDARD}), booking)
+        self.client.post(join, {'seat_type': Ticket.Seat.VIP})
+        self.assertEqual(WaitlistEntry.objects.get(user=self.waiters[0]).seat_type, Ticket.Seat.VIP)
+        Ticket.objects.get(user=self.holders[0], event=event).delete()
+        self.run_tasks()
+        self.assertEqual(Ticket.objects.get(user=self.waiters[0], event=event).seat_type, Ticket.Seat.VIP)
+
+
+def operate_worker(worker):
+    try:
+        worker.run()
+    finally:
+        connection.close()
+
+
+class WaitlistChurnTests(TransactionTestCase):
+    """Cancellations, direct bookings and the background promotion tasks all at once."""
+    operations = 240
+    waiting = 200
+
+    def setUp(self):
+        owner = User.objects.create_user('owner')
+        self.event = make_event(owner, capacity=40)
+        SeatPool.objects.bulk_create([
+            SeatPool(event=self.event, seat_type=Ticket.Seat.STANDARD, capacity=30),
+            SeatPool(event=self.event, seat_type=Ticket.Seat.VIP, capacity=10),
+        ])
+        seats = [Ticket.Seat.STANDARD] * 30 + [Ticket.Seat.VIP] * 10
+        holders = User.objects.bulk_create([User(username=f'holder{i}') for i in range(40)])
+        Ticket.objects.bulk_create([Ticket(user=u, event=self.event, seat_type=s) for u, s in zip(holders, seats)])
+        waiters = User.objects.bulk_create([User(username=f'waiter{i}') for i in range(self.waiting)])
+        WaitlistEntry.objects.bulk_create([
+            WaitlistEntry(user=u, event=self.event, seat_type=Ticket.Seat.VIP if i % 4 == 0 else Ticket.Seat.STANDARD)
+            for i, u in enumerate(waiters)
+        ])
+        self.queue = {seat: list(self.event.waitlist.filter(seat_type=seat).values_list('user', flat=True))
+                      for seat in (Ticket.Seat.STANDARD, Ticket.Seat.VIP)}
+        self.bookers = User.objects.bulk_create([User(username=f'booker{i}') for i in range(self.operations)])
+
+    @override_settings(BOOKING_LOCK_RETRIES=200, BOOKING_LOCK_BACKOFF=0.001)
+    def test_promotion_under_churn(self):
+        promoted, claimed, lock = [], set(), threading.Lock()
+
+        promote = waitlist.promote
+
+        def record(event_ids):
+            tickets = promote(event_ids)
+            with lock:
+                promoted.extend(tickets)
+            return tickets
+
+        def cancel():
+            while True:
+                ticket = Ticket.objects.filter(event=self.event).exclude(pk__in=list(claimed)).order_by('?').first()
+                if ticket is None:
+                    return
+                with lock:
+                    if ticket.pk in claimed:
+                        continue
+                    claimed.add(ticket.pk)  # two threads must not cancel the same ticket
+                retry_on_lock(ticket.delete)
+                return
+
+        def operate(i):
+            try:
+                if i % 3:
+                    retry_on_lock(cancel)
+                else:
+                    try:
+                        book_ticket(self.bookers[i], self.event.pk, Ticket.Seat.STANDARD)
+                    except SoldOut:
+                        pass
+            finally:
+                connection.close()
+
+        promotions = Task.objects.filter(name='events.promote_waitlist')
+
+        def busy():
+            return promotions.filter(status__in=[Task.Status.QUEUED, Task.Status.RUNNING]).exists()
+
+        worker = Worker(threads=2, poll_interval=0.01)
+        runner = threading.Thread(target=operate_worker, args=(worker,))
+        self.enterContext(mock.patch.object(waitlist, 'promote', record))
+        try:
+            started = time.perf_counter()
+            runner.start()
+            with ThreadPoolExecutor(max_workers=32) as pool:
+                list(pool.map(operate, range(self.operations)))
+            while retry_on_lock(busy) and time.perf_counter() - started < 60:
+                time.sleep(0.05)
+            elapsed = time.perf_counter() - started
+        finally:
+            worker.stop()
+            runner.join(60)
+        self.assertFalse(promotions.filter(status=Task.Status.FAILED).exists())
+
+        self.event.refresh_from_db()
+        tickets = Ticket.objects.filter(event=self.event)
+        self.assertEqual(self.event.tickets_booked, tickets.count())
+        self.assertLessEqual(self.event.tickets_booked, self.event.capacity)
+        for pool in SeatPool.objects.filter(event=self.event):
+            self.assertEqual(pool.booked, tickets.filter(seat_type=pool.seat_type).count())
+            self.assertLessEqual(pool.booked, pool.capacity)
+            # nobody waits for a seat type that has free seats
+            if self.event.waitlist.filter(seat_type=pool.seat_type).exists():
+                self.assertEqual(pool.booked, pool.capacity)
+        self.assertFalse(self.event.waitlist.filter(user__tickets__event=self.event).exists())
+        self.assertGreater(len(promoted), 0)
+        for seat, queue in self.queue.items():
+            served = {t.user_id for t in promoted if t.seat_type == seat}
+            self.assertEqual(set(queue[:len(served)]), served, f"{seat} promotions skipped the line")
+        self.assertLess(elapsed, 60, f"{self.operations} operations took {elapsed:.1f}s")
+
+
+class BackgroundTaskTests(TestCase):
+    def setUp(self):
+        django_cache.clear()
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'pw')
+        self.event = make_event(self.owner, title='Jazz Night')
+
+    def test_booking_confirmation_leaves_the_request(self):
+        self.client.force_login(self.owner)
+        self.client.post(reverse('events:ticket_create', kwargs={'slug': self.event.slug}),
+                         {'seat_type': Ticket.Seat.VIP})
+        self.assertEqual(mail.outbox, [])
+        Worker(threads=0).run(once=True)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, "Your ticket: Jazz Night")
+        self.assertIn("VIP seat", mail.outbox[0].body)
+
+    def test_booking_queue_batch_queues_one_confirmation(self):
+        users = User.objects.bulk_create([User(username=f'q{i}', email=f'q{i}@example.com') for i in range(3)])
+        q = booking_queue.BookingQueue(batch_size=10, max_wait=0, max_pending=10)
+        batch = [booking_queue.BookingRequest(u.pk, self.event.pk, Ticket.Seat.STANDARD, i)
+                 for i, u in enumerate(users)]
+        q.process_batch(batch)
+        self.assertEqual(len(Task.objects.get(name='events.send_ticket_confirmations').kwargs['ticket_ids']), 3)
+
+    def test_export_writes_a_file_and_notifies(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        call_command('export_events', kind='tickets', background=True, stderr=StringIO())
+        self.assertEqual(Task.objects.get().kwargs, {'kind': 'tickets', 'fmt': 'csv'})
+        Task.objects.all().delete()
+        tasks.export.enqueue(kind='events', notify_user_id=self.owner.pk)
+        with override_settings(EXPORT_ROOT=Path(root)):
+            Worker(threads=0).run(once=True)
+        [path] = os.listdir(root)
+        with open(os.path.join(root, path)) as f:
+            self.assertIn('Jazz Night', f.read())
+        self.assertEqual(mail.outbox[0].to, ['owner@example.com'])
+
+    def test_warm_cache_fills_the_anonymous_page_cache(self):
+        tasks.warm_cache()
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('events:detail', kwargs={'slug': self.event.slug}))
+        self.assertEqual(response['X-Cache'], 'hit')
+
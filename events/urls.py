@@ -1,23 +1,40 @@
+from django.conf import settings
 from django.urls import path
+
+from . import async_views
+from .cache import cache_anonymous
 from .views import (
-    EventListView, EventDetailView,
-    EventCreateView, EventUpdateView, EventDeleteView,
-    TicketCreateView,
+    EventListView, EventDetailView, event_reviews,
+    EventCreateView, EventUpdateView, EventDeleteView, EventSeriesCreateView, EventSeriesUpdateView,
+    TicketCreateView, ticket_status, ticket_cancel, waitlist_join, waitlist_leave, attendees_export,
     ReviewCreateView, ReviewUpdateView, ReviewDeleteView,
     favorite_add, favorite_remove, FavoriteListView
 )
 
 app_name = 'events'
 
+if settings.EVENTS_ASYNC_VIEWS:
+    event_list, event_detail, favorite_list = async_views.event_list, async_views.event_detail, async_views.favorite_list
+else:
+    event_list, event_detail, favorite_list = EventListView.as_view(), EventDetailView.as_view(), FavoriteListView.as_view()
+
 urlpatterns = [
-    path('', EventListView.as_view(), name='list'),
-    path('favorites/', FavoriteListView.as_view(), name='favorites'),
+    path('', cache_anonymous(event_list), name='list'),
+    path('favorites/', favorite_list, name='favorites'),
     path('create/', EventCreateView.as_view(), name='create'),
-    path('<slug:slug>/', EventDetailView.as_view(), name='detail'),
+    path('series/create/', EventSeriesCreateView.as_view(), name='series_create'),
+    path('series/<int:pk>/edit/', EventSeriesUpdateView.as_view(), name='series_edit'),
+    path('<slug:slug>/', cache_anonymous(event_detail), name='detail'),
+    path('<slug:slug>/reviews/', event_reviews, name='reviews'),
     path('<slug:slug>/edit/', EventUpdateView.as_view(), name='edit'),
     path('<slug:slug>/delete/', EventDeleteView.as_view(), name='delete'),
 
     path('<slug:slug>/ticket/', TicketCreateView.as_view(), name='ticket_create'),
+    path('<slug:slug>/ticket/status/<str:token>/', ticket_status, name='ticket_status'),
+    path('<slug:slug>/ticket/cancel/', ticket_cancel, name='ticket_cancel'),
+    path('<slug:slug>/waitlist/join/', waitlist_join, name='waitlist_join'),
+    path('<slug:slug>/waitlist/leave/', waitlist_leave, name='waitlist_leave'),
+    path('<slug:slug>/attendees.csv', attendees_export, name='attendees_export'),
 
     path('<slug:slug>/review/', ReviewCreateView.as_view(), name='review_create'),
     path('review/<int:review_id>/edit/', ReviewUpdateView.as_view(), name='review_edit'),
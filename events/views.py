@@ -1,28 +1,54 @@
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpResponseForbidden, HttpResponseNotAllowed
+from django.db.models import Exists, F, OuterRef, Subquery
+from django.http import Http404, HttpResponseForbidden, HttpResponseNotAllowed
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 
-from .forms import EventForm, TicketForm, ReviewForm
-from .mixins import OwnerRequiredMixin
-from .models import Event, Ticket, Review, Favorite, Category
+from . import booking_queue, bulk_io, cache, search, waitlist
+from .booking import BookingError, SoldOut, book_ticket
+from .cache import cache_anonymous
+from .forms import EventForm, EventSeriesForm, TicketForm, ReviewForm
+from .mixins import CursorPaginationMixin, OwnerRequiredMixin
+from .models import Event, EventSeries, Ticket, Review, Favorite, Category, SeatPool, WaitlistEntry
+from .pagination import CursorPage, CursorPaginator
+from .tasks import send_ticket_confirmations
 
 # PUBLIC VIEWS
-class EventListView(ListView):
+class EventListView(CursorPaginationMixin, ListView):
     model = Event
     template_name = 'events/event_list.html'
     context_object_name = 'events'
     paginate_by = 10
+    cursor_ordering = ('starts_at', 'id')
+    sort_orderings = {
+        'date': ('starts_at', 'id'),
+        'rating': ('-rating_avg', '-id'),
+        'reviews': ('-reviews_count', '-id'),
+    }
+
+    def get_cursor_ordering(self):
+        return self.sort_orderings.get(self.request.GET.get('sort'), self.cursor_ordering)
 
     def get_queryset(self):
-        qs = Event.objects.select_related('category', 'owner').order_by('starts_at')
-        category_slug = self.request.GET.get('category')
-        if category_slug:
-            qs = qs.filter(category__slug=category_slug)
-        return qs
+        return event_list_queryset(self.request)
+
+    def paginate_queryset(self, queryset, page_size):
+        query = self.request.GET.get('q', '').strip()
+        if not query:
+            return super().paginate_queryset(queryset, page_size)
+        page = search_page(self.request, query, page_size, self.cursor_param)
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        cache.depends_on(self.request, *(cache.event_scope(e.pk) for e in ctx['events']))  # the cards' seat counts
+        return ctx
 
 class EventDetailView(DetailView):
     model = Event
@@ -31,18 +57,89 @@ class EventDetailView(DetailView):
     slug_field = 'slug'
     slug_url_kwarg = 'slug'
 
+    def get_queryset(self):
+        return event_detail_queryset(self.request.user)
+
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        event = self.object
-        ctx['ticket_form'] = TicketForm()
-        ctx['review_form'] = ReviewForm()
-        if self.request.user.is_authenticated:
-            ctx['has_ticket'] = Ticket.objects.filter(user=self.request.user, event=event).exists()
-            ctx['is_favorite'] = Favorite.objects.filter(user=self.request.user, event=event).exists()
-            ctx['my_review'] = Review.objects.filter(user=self.request.user, event=event).first()
+        cache.depends_on(self.request, cache.event_scope(self.object.pk))
+        # only runs when the cached review fragment is missing
+        reviews = SimpleLazyObject(lambda: review_page(self.object.reviews.all(), None))
+        ctx.update(event_detail_context(self.object, self.request.user, reviews))
         return ctx
 
+def search_page(request, query, page_size, cursor_param='cursor'):
+    # ranked search pages by offset; FTS has to rank every match anyway
+    try:
+        offset = max(int(request.GET.get(cursor_param, 0)), 0)
+    except ValueError:
+        offset = 0
+    results = search.search_events(query, page_size + 1, offset,
+                                   category_slug=request.GET.get('category'),
+                                   queryset=Event.objects.approved().select_related('category', 'owner'))
+    has_next = len(results) > page_size
+    return CursorPage(results[:page_size],
+                      next_cursor=str(offset + page_size) if has_next else None,
+                      previous_cursor=str(max(offset - page_size, 0)) if offset else None)
+
+def event_list_queryset(request):
+    qs = Event.objects.approved().select_related('category', 'owner')
+    category_slug = request.GET.get('category')
+    if category_slug:
+        qs = qs.filter(category__slug=category_slug)
+    return qs
+
+def event_detail_queryset(user):
+    qs = Event.objects.visible_to(user).select_related('category', 'owner')
+    if user.is_authenticated:
+        # the viewer's ticket/favorite/review ride along on the event query
+        mine = {'event': OuterRef('pk'), 'user': user}
+        my_review = Review.objects.filter(**mine)
+        qs = qs.annotate(
+            has_ticket=Exists(Ticket.objects.filter(**mine)),
+            is_favorite=Exists(Favorite.objects.filter(**mine)),
+            on_waitlist=Exists(WaitlistEntry.objects.filter(**mine)),
+            my_review_id=Subquery(my_review.values('pk')[:1]),
+            my_review_rating=Subquery(my_review.values('rating')[:1]),
+            my_review_comment=Subquery(my_review.values('comment')[:1]),
+        )
+    return qs
+
+def visible_event(request, slug):
+    """The event behind slug, or 404 unless approved (or the user owns or moderates it)."""
+    return get_object_or_404(Event.objects.visible_to(request.user), slug=slug)
+
+def event_detail_context(event, user, reviews):
+    ctx = {'ticket_form': TicketForm(), 'review_form': ReviewForm(), 'reviews': reviews}
+    if user.is_authenticated:
+        ctx['has_ticket'] = event.has_ticket
+        ctx['is_favorite'] = event.is_favorite
+        ctx['on_waitlist'] = event.on_waitlist
+        if event.my_review_id:
+            ctx['my_review'] = Review(pk=event.my_review_id, rating=event.my_review_rating,
+                                      comment=event.my_review_comment, event=event, user=user)
+    return ctx
+
+def review_paginator(queryset):
+    queryset = queryset.select_related('user').only('event', 'rating', 'comment', 'created_at', 'user__username')
+    return CursorPaginator(queryset, ('-created_at', '-id'), settings.REVIEWS_PAGE_SIZE)
+
+def review_page(queryset, cursor):
+    return review_paginator(queryset).page(cursor)
+
+@cache_anonymous
+def event_reviews(request, slug):
+    """Next page of an event's reviews as an HTML fragment (see _review_page.html)."""
+    event = Event.objects.visible_to(request.user).filter(slug=slug)
+    page = review_page(Review.objects.filter(event__in=event), request.GET.get('cursor'))
+    return render(request, 'events/_review_page.html', {'reviews': page, 'slug': slug})
+
 # PRIVATE VIEWS (CRUD)
+def needs_moderation(user, form):
+    """True if a user who can't approve events changed what a moderator approved."""
+    return (any(name in form.changed_data for name in Event.MODERATED_FIELDS)
+            and not user.has_perm('events.approve_event'))
+
 class EventCreateView(LoginRequiredMixin, CreateView):
     model = Event
     form_class = EventForm
@@ -50,7 +147,12 @@ class EventCreateView(LoginRequiredMixin, CreateView):
 
     def form_valid(self, form):
         form.instance.owner = self.request.user
-        messages.success(self.request, "Event created successfully.")
+        if self.request.user.has_perm('events.approve_event'):
+            form.instance.status = Event.Status.APPROVED
+            form.instance.moderated_at, form.instance.moderated_by = timezone.now(), self.request.user
+            messages.success(self.request, "Event created successfully.")
+        else:
+            messages.success(self.request, "Event created. It will be listed once a moderator approves it.")
         return super().form_valid(form)
 
 class EventUpdateView(OwnerRequiredMixin, UpdateView):
@@ -61,8 +163,15 @@ class EventUpdateView(OwnerRequiredMixin, UpdateView):
     slug_url_kwarg = 'slug'
 
     def form_valid(self, form):
-        messages.success(self.request, "Event updated successfully.")
-        return super().form_valid(form)
+        if needs_moderation(self.request.user, form):
+            form.instance.status = Event.Status.PENDING
+            messages.success(self.request, "Event updated. It will be listed again once a moderator approves it.")
+        else:
+            messages.success(self.request, "Event updated successfully.")
+        response = super().form_valid(form)
+        if 'capacity' in form.changed_data:
+            waitlist.schedule(self.object.pk)  # more seats for the people waiting
+        return response
 
 class EventDeleteView(OwnerRequiredMixin, DeleteView):
     model = Event
@@ -75,6 +184,39 @@ class EventDeleteView(OwnerRequiredMixin, DeleteView):
         messages.success(self.request, "Event deleted.")
         return super().delete(request, *args, **kwargs)
 
+# Series
+class EventSeriesCreateView(LoginRequiredMixin, CreateView):
+    model = EventSeries
+    form_class = EventSeriesForm
+    template_name = 'events/series_form.html'
+    success_url = reverse_lazy('dashboard:home')
+
+    def form_valid(self, form):
+        form.instance.owner = self.request.user
+        if self.request.user.has_perm('events.approve_event'):
+            form.instance.status = Event.Status.APPROVED
+        response = super().form_valid(form)
+        created = EventSeries.materialize(EventSeries.objects.filter(pk=self.object.pk))
+        messages.success(self.request, f"Series created with {created} upcoming event(s).")
+        return response
+
+class EventSeriesUpdateView(OwnerRequiredMixin, UpdateView):
+    model = EventSeries
+    form_class = EventSeriesForm
+    template_name = 'events/series_form.html'
+    success_url = reverse_lazy('dashboard:home')
+
+    def form_valid(self, form):
+        status = Event.Status.PENDING if needs_moderation(self.request.user, form) else None
+        if status:
+            form.instance.status = status
+        response = super().form_valid(form)
+        if any(name in form.changed_data for name in EventSeries.RULE_FIELDS):
+            self.object.reschedule()
+        updated = self.object.update_occurrences(status=status)
+        messages.success(self.request, f"Series updated, with {updated} upcoming event(s).")
+        return response
+
 # Tickets
 class TicketCreateView(LoginRequiredMixin, CreateView):
     model = Ticket
@@ -82,26 +224,106 @@ class TicketCreateView(LoginRequiredMixin, CreateView):
     template_name = 'events/ticket_form.html'
 
     def dispatch(self, request, *args, **kwargs):
-        self.event = get_object_or_404(Event, slug=kwargs['slug'])
-        if self.event.tickets_count >= self.event.capacity:
-            messages.error(request, "This event is sold out.")
+        self.event = visible_event(request, kwargs['slug'])
+        if not self.event.seats_left():
+            messages.error(request, "This event is sold out. Join the waitlist and we'll book you a seat if one frees up.")
             return redirect(self.event.get_absolute_url())
         return super().dispatch(request, *args, **kwargs)
 
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        # seat types whose pool is full get a waitlist of their own
+        full = set(SeatPool.objects.filter(event=self.event, booked__gte=F('capacity'))
+                   .values_list('seat_type', flat=True))
+        ctx['waitlist_seats'] = [(value, label) for value, label in Ticket.Seat.choices if value in full]
+        return ctx
+
     def form_valid(self, form):
-        form.instance.user = self.request.user
-        form.instance.event = self.event
+        if booking_queue.is_enabled():
+            try:
+                req = booking_queue.get_queue().submit(self.request.user, self.event, form.cleaned_data['seat_type'])
+            except booking_queue.QueueFull as exc:
+                messages.error(self.request, str(exc))
+                return redirect(self.event.get_absolute_url())
+            return redirect('events:ticket_status', slug=self.event.slug, token=req.token)
         try:
-            response = super().form_valid(form)
-        except Exception:
-            messages.error(self.request, "You already have a ticket for this event.")
+            self.object = book_ticket(self.request.user, self.event, form.cleaned_data['seat_type'])
+        except SoldOut as exc:
+            self.event.refresh_from_db(fields=['tickets_booked'])
+            if self.event.seats_left():  # just this seat type; its waitlist is on the booking page
+                messages.error(self.request, f"{exc} You can join the waitlist for them below.")
+                return redirect('events:ticket_create', slug=self.event.slug)
+            messages.error(self.request, f"{exc} Join the waitlist and we'll book you a seat if one frees up.")
+            return redirect(self.event.get_absolute_url())
+        except BookingError as exc:
+            messages.error(self.request, str(exc))
             return redirect(self.event.get_absolute_url())
+        send_ticket_confirmations.enqueue(ticket_ids=[self.object.pk])
         messages.success(self.request, "Ticket booked. See you there!")
-        return response
+        return redirect(self.get_success_url())
 
     def get_success_url(self):
         return self.event.get_absolute_url()
 
+@login_required
+def ticket_status(request, slug, token):
+    req = booking_queue.get_queue().get(token)
+    event = get_object_or_404(Event, slug=slug)
+    if req is None or req.user_id != request.user.pk:
+        # queued by another process, or forgotten after BOOKING_QUEUE_RESULT_TTL
+        if Ticket.objects.filter(user=request.user, event=event).exists():
+            messages.success(request, booking_queue.MESSAGES[booking_queue.BOOKED])
+            return redirect(event.get_absolute_url())
+        raise Http404("Unknown booking request.")
+    if req.status == booking_queue.BOOKED:
+        messages.success(request, req.message)
+        return redirect(event.get_absolute_url())
+    if req.status != booking_queue.PENDING:
+        messages.error(request, req.message)
+        return redirect(event.get_absolute_url())
+    return render(request, 'events/ticket_status.html', {
+        'event': event,
+        'position': booking_queue.get_queue().position(req),
+    })
+
+@login_required
+def ticket_cancel(request, slug):
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    event = get_object_or_404(Event, slug=slug)
+    ticket = Ticket.objects.filter(user=request.user, event=event).first()
+    if ticket is not None:
+        ticket.delete()  # the seat goes to the waitlist, see events.waitlist
+        messages.info(request, "Your ticket was cancelled.")
+    return redirect(event.get_absolute_url())
+
+@login_required
+def waitlist_join(request, slug):
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    event = visible_event(request, slug)
+    form = TicketForm(request.POST)
+    seat_type = form.cleaned_data['seat_type'] if form.is_valid() else Ticket.Seat.STANDARD
+    if event.seats_left(seat_type):
+        messages.info(request, f"{Ticket.Seat(seat_type).label} seats are available, you can book right away.")
+        return redirect('events:ticket_create', slug=event.slug)
+    try:
+        entry = waitlist.join(request.user, event, seat_type)
+    except BookingError as exc:
+        messages.error(request, str(exc))
+        return redirect(event.get_absolute_url())
+    messages.success(request, f"You're number {entry.position()} on the waitlist. We'll email you if a seat frees up.")
+    return redirect(event.get_absolute_url())
+
+@login_required
+def waitlist_leave(request, slug):
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    event = get_object_or_404(Event, slug=slug)
+    WaitlistEntry.objects.filter(user=request.user, event=event).delete()
+    messages.info(request, "You left the waitlist.")
+    return redirect(event.get_absolute_url())
+
 # Reviews
 class ReviewCreateView(LoginRequiredMixin, CreateView):
     model = Review
@@ -109,7 +331,7 @@ class ReviewCreateView(LoginRequiredMixin, CreateView):
     template_name = 'events/review_form.html'
 
     def dispatch(self, request, *args, **kwargs):
-        self.event = get_object_or_404(Event, slug=kwargs['slug'])
+        self.event = visible_event(request, kwargs['slug'])
         return super().dispatch(request, *args, **kwargs)
 
     def form_valid(self, form):
@@ -126,31 +348,21 @@ class ReviewCreateView(LoginRequiredMixin, CreateView):
     def get_success_url(self):
         return self.event.get_absolute_url()
 
-class ReviewUpdateView(LoginRequiredMixin, UpdateView):
-    model = Review
+class ReviewUpdateView(OwnerRequiredMixin, UpdateView):
+    queryset = Review.objects.select_related('event')
     form_class = ReviewForm
     template_name = 'events/review_form.html'
     pk_url_kwarg = 'review_id'
-
-    def dispatch(self, request, *args, **kwargs):
-        review = self.get_object()
-        if review.user != request.user and not request.user.is_staff:
-            return HttpResponseForbidden("Not allowed.")
-        return super().dispatch(request, *args, **kwargs)
+    owner_field = 'user'
 
     def get_success_url(self):
         return self.object.event.get_absolute_url()
 
-class ReviewDeleteView(LoginRequiredMixin, DeleteView):
-    model = Review
+class ReviewDeleteView(OwnerRequiredMixin, DeleteView):
+    queryset = Review.objects.select_related('event')
     template_name = 'events/event_confirm_delete.html'
     pk_url_kwarg = 'review_id'
-
-    def dispatch(self, request, *args, **kwargs):
-        review = self.get_object()
-        if review.user != request.user and not request.user.is_staff:
-            return HttpResponseForbidden("Not allowed.")
-        return super().dispatch(request, *args, **kwargs)
+    owner_field = 'user'
 
     def get_success_url(self):
         return self.object.event.get_absolute_url()
@@ -160,7 +372,7 @@ class ReviewDeleteView(LoginRequiredMixin, DeleteView):
 def favorite_add(request, slug):
     if request.method != 'POST':
         return HttpResponseNotAllowed(['POST'])
-    event = get_object_or_404(Event, slug=slug)
+    event = visible_event(request, slug)
     Favorite.objects.get_or_create(user=request.user, event=event)
     messages.success(request, "Added to favorites.")
     return redirect(event.get_absolute_url())
@@ -174,15 +386,25 @@ def favorite_remove(request, slug):
     messages.info(request, "Removed from favorites.")
     return redirect(event.get_absolute_url())
 
-class FavoriteListView(LoginRequiredMixin, ListView):
+class FavoriteListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     model = Favorite
     template_name = 'events/favorites.html'
     context_object_name = 'favorites'
     paginate_by = 10
+    cursor_ordering = ('-created_at', '-id')
 
     def get_queryset(self):
         return Favorite.objects.filter(user=self.request.user).select_related('event')
 
+@login_required
+def attendees_export(request, slug):
+    """Owner's attendee list as CSV, streamed straight from the database."""
+    event = get_object_or_404(Event.objects.only('pk', 'slug', 'owner_id'), slug=slug)
+    if event.owner_id != request.user.pk and not request.user.is_staff:
+        return HttpResponseForbidden("Only the organizer can export attendees.")
+    tickets = Ticket.objects.filter(event_id=event.pk)
+    return bulk_io.streaming_csv('attendees', tickets, f'{event.slug}-attendees.csv')
+
 # Error handlers
 def custom_404(request, exception):
     return render(request, '404.html', status=404)
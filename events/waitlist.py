@@ -0,0 +1,137 @@
+"""Waitlists for sold-out events, and promotion when seats free up.
+
+Every ticket delete (the owner cancelling, admin, queryset deletes, User
+cascades) schedules its event for promotion; see events.signals. Scheduling
+queues an events.promote_waitlist task in the same transaction, deduplicated
+per event, so a burst of cancellations for one event costs a single promotion
+and nothing is lost if a process exits: `manage.py run_tasks` runs it.
+
+promote() hands out seats first come, first served within each seat type: a
+VIP waiter doesn't block the standard waiters behind them when only standard
+seats are free. Seats are taken with the booking service's conditional
+UPDATEs (events.booking), so promotion can't oversell against concurrent
+bookings, and everyone promoted in one call gets their confirmation from a
+single background task (events.tasks).
+"""
+import collections
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from eventhub.db import retry_on_lock
+
+from .booking import AlreadyBooked, SoldOut, reserve_seats
+from .models import Event, SeatPool, Ticket, WaitlistEntry
+
+
+def join(user, event, seat_type=Ticket.Seat.STANDARD):
+    """Put user on event's waitlist (or move them to another seat type); returns the entry."""
+    if Ticket.objects.filter(user=user, event=event).exists():
+        raise AlreadyBooked("You already have a ticket for this event.")
+    try:
+        entry, created = WaitlistEntry.objects.get_or_create(user=user, event=event,
+                                                             defaults={'seat_type': seat_type})
+    except IntegrityError:  # a double submit won the race
+        entry, created = WaitlistEntry.objects.get(user=user, event=event), False
+    if not created and entry.seat_type != seat_type:
+        entry.seat_type = seat_type
+        entry.save(update_fields=['seat_type'])  # keeps the original place in line
+    # seats may have freed up between the sold-out check and the insert
+    schedule(event.pk)
+    return entry
+
+
+def _free_seats(event_ids):
+    """({event_id: free}, {(event_id, seat_type): free} for events sold per seat type).
+
+    Locks the event rows where the database can, so no booking for these
+    events commits until the promotion does.
+    """
+    events = dict(Event.objects.select_for_update().filter(pk__in=event_ids)
+                  .values_list('pk', F('capacity') - F('tickets_booked')))
+    pools = {(event_id, seat_type): capacity - booked for event_id, seat_type, capacity, booked in
+             SeatPool.objects.filter(event_id__in=event_ids).values_list('event_id', 'seat_type', 'capacity', 'booked')}
+    return events, pools
+
+
+def _take(event_id, seat_type, wanted, pooled):
+    """Reserve up to `wanted` seats of one type; returns how many were taken."""
+    while wanted > 0:
+        try:
+            with transaction.atomic():
+                reserve_seats(event_id, seat_type, wanted, has_pools=pooled)
+            return wanted
+        except SoldOut:
+            # a booking got in since we counted; recount and ask for what's left
+            events, pools = _free_seats([event_id])
+            free = min(events.get(event_id, 0), pools.get((event_id, seat_type), 0) if pooled else wanted)
+            wanted = min(wanted - 1, free)
+    return 0
+
+
+def _open(entries):
+    """Entries for events still taking bookings: approved and not started yet."""
+    return entries.filter(event__status=Event.Status.APPROVED, event__starts_at__gte=timezone.now())
+
+
+def promote(event_ids):
+    """Turn waitlist entries into tickets while seats are free, oldest entries first.
+
+    Events that aren't approved or have already started are skipped.
+
+    Runs in one transaction: seats, tickets, the removed entries and the
+    confirmation task commit together. Returns the new tickets.
+    """
+    with transaction.atomic():
+        # lock first, so a concurrent promotion of these events reads the entries this one leaves
+        events, pools = _free_seats(set(event_ids))
+        entries = list(_open(WaitlistEntry.objects.filter(event_id__in=events)).order_by('created_at', 'id'))
+        if not entries:
+            return []
+        pooled = {event_id for event_id, _ in pools}
+        holders = set(Ticket.objects.filter(event_id__in=events, user_id__in={e.user_id for e in entries})
+                      .values_list('user_id', 'event_id'))
+        stale, chosen = [], []
+        for entry in entries:
+            key = (entry.event_id, entry.seat_type)
+            if (entry.user_id, entry.event_id) in holders:
+                stale.append(entry.pk)  # booked directly in the meantime
+            elif events.get(entry.event_id, 0) > 0 and (entry.event_id not in pooled or pools.get(key, 0) > 0):
+                events[entry.event_id] -= 1
+                if entry.event_id in pooled:
+                    pools[key] -= 1
+                chosen.append(entry)
+        wanted = collections.Counter((e.event_id, e.seat_type) for e in chosen)
+        taken = {key: _take(*key, n, key[0] in pooled) for key, n in wanted.items()}
+        tickets, promoted = [], []
+        for entry in chosen:
+            key = (entry.event_id, entry.seat_type)
+            if taken[key]:
+                taken[key] -= 1
+                ticket = Ticket(user_id=entry.user_id, event_id=entry.event_id, seat_type=entry.seat_type)
+                ticket._counter_reserved = True
+                tickets.append(ticket)
+                promoted.append(entry.pk)
+        Ticket.objects.bulk_create(tickets)
+        WaitlistEntry.objects.filter(pk__in=stale + promoted).delete()
+        if tickets:
+            from .tasks import send_ticket_confirmations
+            send_ticket_confirmations.enqueue(ticket_ids=[t.pk for t in tickets], from_waitlist=True)
+    return tickets
+
+
+def promote_all(batch_size=None):
+    """Promote on every event that has people waiting (the promote_waitlists sweep)."""
+    batch_size = batch_size or settings.WAITLIST_BATCH_SIZE
+    waiting = _open(WaitlistEntry.objects.all())
+    event_ids = list(waiting.order_by('event_id').values_list('event_id', flat=True).distinct())
+    return sum(len(retry_on_lock(promote, event_ids[offset:offset + batch_size]))
+               for offset in range(0, len(event_ids), batch_size))
+
+
+def schedule(event_id):
+    """Promote from event_id's waitlist in the background once the current transaction commits."""
+    from .tasks import promote_waitlist
+    promote_waitlist.enqueue(event_id=event_id, dedupe_key=f'waitlist:{event_id}')
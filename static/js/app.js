@@ -17,4 +17,16 @@
   document.querySelectorAll('[data-add-class]').forEach(el => {
     el.classList.add(el.getAttribute('data-add-class'));
   });
-  
\ No newline at end of file
+  
+  // "show more" links in paginated lists: swap the link's row for the next page fragment
+  document.addEventListener('click', event => {
+    const link = event.target.closest('[data-load-more]');
+    if (!link) return;
+    event.preventDefault();
+    const row = link.closest('li') || link;
+    link.classList.add('disabled');
+    fetch(link.href, {headers: {'X-Requested-With': 'XMLHttpRequest'}})
+      .then(response => response.ok ? response.text() : Promise.reject(response))
+      .then(html => { row.outerHTML = html; })
+      .catch(() => { window.location.href = link.href; });
+  });
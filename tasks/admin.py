@@ -0,0 +1,36 @@
+from django.contrib import admin
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'run_at', 'attempts', 'max_attempts', 'dedupe_key', 'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('=name', '=dedupe_key')
+    readonly_fields = ('name', 'kwargs', 'status', 'attempts', 'dedupe_key', 'locked_by', 'locked_at',
+                       'last_error', 'created_at', 'finished_at')
+    fields = readonly_fields[:2] + ('run_at', 'max_attempts') + readonly_fields[2:]
+    show_full_result_count = False
+    actions = ['retry_now']
+
+    def has_add_permission(self, request):
+        return False  # tasks come from enqueue()
+
+    @admin.action(description="Run selected failed or queued tasks again now")
+    def retry_now(self, request, queryset):
+        now = timezone.now()
+        with transaction.atomic():
+            selected = queryset.filter(status__in=[Task.Status.FAILED, Task.Status.QUEUED])
+            retry = list(selected.filter(dedupe_key=None).values_list('pk', flat=True))
+            keyed = dict(selected.exclude(dedupe_key=None).order_by('pk').values_list('dedupe_key', 'pk'))
+            # at most one queued task per dedupe_key: run the queued one now, else the newest selected
+            queued = Task.objects.filter(status=Task.Status.QUEUED, dedupe_key__in=keyed)
+            merged = set(queued.values_list('dedupe_key', flat=True))
+            queued.update(run_at=now, attempts=0)
+            retry += [pk for key, pk in keyed.items() if key not in merged]
+            updated = Task.objects.filter(pk__in=retry).update(
+                status=Task.Status.QUEUED, run_at=now, attempts=0, finished_at=None)
+        self.message_user(request, f"{updated + len(merged)} task(s) queued.")
@@ -0,0 +1,30 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tasks.worker import Worker
+
+
+class Command(BaseCommand):
+    help = ("Run queued background tasks on a thread pool until stopped (Ctrl-C or SIGTERM finish the "
+            "running tasks first). Start as many as you like; they share the queue.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=settings.TASKS_THREADS,
+                            help="Tasks run at once; 0 runs them one by one in the main thread.")
+        parser.add_argument('--poll', type=float, default=settings.TASKS_POLL_INTERVAL,
+                            help="Seconds between polls when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Exit when no task is due (cron, deploys).")
+        parser.add_argument('--no-periodic', action='store_true', help="Don't schedule TASKS_PERIODIC.")
+
+    def handle(self, *args, **options):
+        worker = Worker(threads=options['threads'], poll_interval=options['poll'])
+        if not options['no_periodic']:
+            worker.schedule_periodic()
+        if not options['once']:
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *args: worker.stop())
+            self.stdout.write(f"{worker.name}: running tasks on {options['threads']} thread(s)")
+        processed = worker.run(once=options['once'])
+        self.stdout.write(f"{processed} task(s) run")
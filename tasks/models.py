@@ -0,0 +1,42 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """A stored call to a registered task function; see tasks.queue."""
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    dedupe_key = models.CharField(max_length=200, null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-pk']
+        indexes = [
+            # the worker's poll: due tasks, oldest first
+            models.Index(fields=['run_at', 'id'], condition=Q(status='queued'), name='task_due_idx'),
+            # dead-worker recovery
+            models.Index(fields=['locked_at'], condition=Q(status='running'), name='task_running_idx'),
+        ]
+        constraints = [
+            # at most one queued task per key; a running one doesn't block the next
+            models.UniqueConstraint(fields=['dedupe_key'], condition=Q(status='queued'),
+                                    name='task_queued_dedupe_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
@@ -0,0 +1,85 @@
+"""Database-backed background tasks, no broker needed.
+
+Register a function with @task and enqueue it instead of calling it. The call
+is stored as a Task row in the caller's transaction, so it only runs if the
+caller's writes commit, and `manage.py run_tasks` picks it up (tasks.worker).
+Arguments are keyword-only and must be JSON-serializable: pass ids, not model
+instances.
+
+    @task(max_attempts=5, retry_delay=60)
+    def send_receipt(ticket_id): ...
+
+    send_receipt.enqueue(ticket_id=ticket.pk)             # as soon as a worker is free
+    send_receipt.enqueue(delay=300, ticket_id=ticket.pk)  # or later
+    warm_cache.enqueue(dedupe_key='warm_cache')           # at most one queued at a time
+
+A failed run is retried after retry_delay * 2**(attempt - 1) seconds until
+max_attempts, then the task stays FAILED with its traceback (see the admin).
+Tasks named in TASKS_PERIODIC are kept scheduled by the worker itself.
+"""
+from datetime import timedelta
+from functools import update_wrapper
+
+from django.db import IntegrityError, transaction
+from django.db.models import Value
+from django.db.models.functions import Least
+from django.utils import timezone
+
+from .models import Task
+
+registry = {}
+
+
+class TaskFunction:
+    def __init__(self, func, name, max_attempts, retry_delay):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        update_wrapper(self, func)
+
+    def __call__(self, **kwargs):
+        return self.func(**kwargs)
+
+    def __repr__(self):
+        return f"<task {self.name}>"
+
+    def enqueue(self, *, run_at=None, delay=None, dedupe_key=None, **kwargs):
+        return enqueue(self.name, kwargs, run_at=run_at, delay=delay, dedupe_key=dedupe_key)
+
+    def retry_at(self, attempts):
+        return timezone.now() + timedelta(seconds=self.retry_delay * 2 ** max(attempts - 1, 0))
+
+
+def task(func=None, *, name=None, max_attempts=3, retry_delay=10):
+    """Register func as a task, named '<app>.<function>' unless name is given."""
+    def decorator(func):
+        task_name = name or f"{func.__module__.split('.')[0]}.{func.__name__}"
+        if task_name in registry and registry[task_name].func is not func:
+            raise ValueError(f"Task {task_name!r} is already registered.")
+        registry[task_name] = TaskFunction(func, task_name, max_attempts, retry_delay)
+        return registry[task_name]
+    return decorator(func) if func else decorator
+
+
+def enqueue(name, kwargs=None, *, run_at=None, delay=None, dedupe_key=None):
+    """Store a call to the task called name; returns the Task.
+
+    With a dedupe_key, a task already queued under that key is returned
+    instead (moved earlier if this call asks for an earlier run_at).
+    """
+    if name not in registry:
+        raise LookupError(f"No task registered as {name!r}.")
+    run_at = run_at or timezone.now() + timedelta(seconds=delay or 0)
+    fields = {'name': name, 'kwargs': kwargs or {}, 'run_at': run_at, 'max_attempts': registry[name].max_attempts}
+    if dedupe_key is None:
+        return Task.objects.create(**fields)
+    while True:
+        try:
+            with transaction.atomic():
+                return Task.objects.create(dedupe_key=dedupe_key, **fields)
+        except IntegrityError:
+            queued = Task.objects.filter(dedupe_key=dedupe_key, status=Task.Status.QUEUED)
+            if queued.update(run_at=Least('run_at', Value(run_at))):
+                return queued.get()
+            # claimed by a worker in between; queue a fresh one
@@ -0,0 +1,8 @@
+from .queue import task
+from .worker import prune as prune_finished
+
+
+@task
+def prune():
+    """Keep the task table small (periodic, see TASKS_PERIODIC)."""
+    prune_finished()
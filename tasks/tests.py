@@ -0,0 +1,185 @@
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Task
+from .queue import enqueue, task
+from .worker import Worker
+
+calls = Counter()
+calls_lock = threading.Lock()
+
+
+@task(name='tests.record')
+def record(key):
+    with calls_lock:
+        calls[key] += 1
+
+
+@task(name='tests.tick')
+def tick():
+    record(key='tick')
+
+
+@task(name='tests.flaky', max_attempts=3, retry_delay=10)
+def flaky(key, failures):
+    record(key=key)
+    if calls[key] <= failures:
+        raise RuntimeError(f"attempt {calls[key]} failed")
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def run_worker(self):
+        return Worker(threads=0).run(once=True)
+
+    def test_enqueue_is_one_insert_and_runs_later(self):
+        with self.assertNumQueries(1):
+            queued = record.enqueue(key='a')
+        self.assertEqual(calls['a'], 0)
+        self.assertEqual(self.run_worker(), 1)
+        self.assertEqual(calls['a'], 1)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Task.Status.DONE, 1))
+        self.assertIsNotNone(queued.finished_at)
+
+    def test_failures_retry_with_backoff_then_stop(self):
+        queued = flaky.enqueue(key='f', failures=5)
+        self.run_worker()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Task.Status.QUEUED, 1))
+        self.assertIn("attempt 1 failed", queued.last_error)
+        self.assertAlmostEqual((queued.run_at - timezone.now()).total_seconds(), 10, delta=2)
+        self.assertEqual(self.run_worker(), 0)  # not due yet
+
+        Task.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+        self.run_worker()
+        queued.refresh_from_db()
+        self.assertAlmostEqual((queued.run_at - timezone.now()).total_seconds(), 20, delta=2)
+        Task.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+        self.run_worker()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts, calls['f']), (Task.Status.FAILED, 3, 3))
+        self.assertIn("RuntimeError", queued.last_error)
+
+    def test_retry_succeeds(self):
+        queued = flaky.enqueue(key='g', failures=1)
+        self.run_worker()
+        Task.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+        self.run_worker()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.last_error), (Task.Status.DONE, ''))
+
+    def test_dedupe_key_keeps_one_queued_task(self):
+        later = record.enqueue(delay=60, dedupe_key='warm', key='d')
+        sooner = record.enqueue(dedupe_key='warm', key='d')
+        self.assertEqual(later.pk, sooner.pk)
+        self.assertEqual(Task.objects.count(), 1)
+        self.assertEqual(self.run_worker(), 1)  # moved up to the earlier time
+        # once it has run (or while it runs), the key is free again
+        self.assertNotEqual(record.enqueue(dedupe_key='warm', key='d').pk, later.pk)
+
+    def test_scheduled_tasks_wait_until_due(self):
+        record.enqueue(run_at=timezone.now() + timedelta(hours=1), key='s')
+        record.enqueue(key='now')
+        self.assertEqual(self.run_worker(), 1)
+        self.assertEqual(dict(calls), {'now': 1})
+
+    @override_settings(TASKS_LOCK_TIMEOUT=60)
+    def test_tasks_of_dead_workers_are_retried(self):
+        queued = record.enqueue(key='r')
+        Task.objects.filter(pk=queued.pk).update(status=Task.Status.RUNNING, attempts=1, locked_by='gone:1',
+                                                 locked_at=timezone.now() - timedelta(minutes=5))
+        Worker(threads=0).recover()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.locked_by), (Task.Status.QUEUED, ''))
+        self.assertIn("gone:1", queued.last_error)
+
+    @override_settings(TASKS_PERIODIC={'tests.tick': 300})
+    def test_periodic_tasks_reschedule_themselves(self):
+        worker = Worker(threads=0)
+        worker.schedule_periodic()
+        worker.schedule_periodic()  # a second worker starting up
+        self.assertEqual(Task.objects.count(), 1)
+        self.assertEqual(worker.run(once=True), 1)
+        following = Task.objects.get(status=Task.Status.QUEUED)
+        self.assertEqual(following.dedupe_key, 'periodic:tests.tick')
+        self.assertAlmostEqual((following.run_at - timezone.now()).total_seconds(), 300, delta=5)
+
+    def test_unknown_tasks(self):
+        with self.assertRaises(LookupError):
+            enqueue('tests.nope')
+        Task.objects.create(name='tests.removed', max_attempts=1)
+        self.run_worker()
+        self.assertEqual(Task.objects.get(name='tests.removed').status, Task.Status.FAILED)
+
+    def test_admin_retry_keeps_one_queued_task_per_dedupe_key(self):
+        admin = get_user_model().objects.create_superuser('admin', password='pw')
+        self.client.force_login(admin)
+        failed = [Task.objects.create(name='tests.tick', dedupe_key='periodic:tests.tick', status=Task.Status.FAILED)
+                  for _ in range(2)]
+        plain = Task.objects.create(name='tests.tick', status=Task.Status.FAILED)
+        url = reverse('admin:tasks_task_changelist')
+        response = self.client.post(url, {'action': 'retry_now', '_selected_action': [t.pk for t in failed + [plain]]})
+        self.assertEqual(response.status_code, 302)
+        queued = Task.objects.filter(status=Task.Status.QUEUED)
+        self.assertEqual(set(queued.values_list('pk', flat=True)), {failed[1].pk, plain.pk})
+        # already queued under that key: it's moved up instead of a second copy
+        later = failed[1]
+        Task.objects.filter(pk=later.pk).update(run_at=timezone.now() + timedelta(hours=1))
+        response = self.client.post(url, {'action': 'retry_now', '_selected_action': [failed[0].pk]})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(queued.count(), 2)
+        self.assertEqual(Task.objects.get(pk=failed[0].pk).status, Task.Status.FAILED)
+        self.assertLessEqual(Task.objects.get(pk=later.pk).run_at, timezone.now())
+
+    def test_run_tasks_command(self):
+        record.enqueue(key='c')
+        out = StringIO()
+        call_command('run_tasks', once=True, no_periodic=True, threads=0, stdout=out)
+        self.assertEqual(calls['c'], 1)
+        self.assertIn("1 task(s) run", out.getvalue())
+
+
+class WorkerConcurrencyTests(TransactionTestCase):
+    tasks = 300
+
+    def setUp(self):
+        calls.clear()
+        Task.objects.bulk_create([Task(name='tests.record', kwargs={'key': i}) for i in range(self.tasks)])
+
+    @override_settings(BOOKING_LOCK_RETRIES=200, BOOKING_LOCK_BACKOFF=0.001)
+    def test_workers_share_the_queue_without_running_a_task_twice(self):
+        workers = [Worker(threads=4, poll_interval=0.01, name=f'w{i}') for i in range(2)]
+
+        def drain(worker):
+            try:
+                while Task.objects.filter(status=Task.Status.QUEUED).exists():
+                    worker.run(once=True)
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=drain, args=(w,)) for w in workers]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(60)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(set(calls), set(range(self.tasks)))
+        self.assertEqual(set(calls.values()), {1})
+        self.assertEqual(Task.objects.filter(status=Task.Status.DONE).count(), self.tasks)
+        self.assertEqual(sum(w.processed for w in workers), self.tasks)
+        self.assertLess(elapsed, 60, f"{self.tasks} tasks took {elapsed:.1f}s")
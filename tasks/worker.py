@@ -0,0 +1,158 @@
+"""The loop behind `manage.py run_tasks`.
+
+The worker claims due tasks with one conditional UPDATE (status queued ->
+running, stamped with a claim token), so any number of worker processes can
+share the table without running a task twice. Claimed tasks run on a thread
+pool, each thread with its own database connection; the worker only claims
+as many tasks as it has idle threads, so nothing sits claimed behind a slow
+task. A task left running longer than TASKS_LOCK_TIMEOUT (its worker died)
+counts as a failed attempt and is retried, so delivery is at least once:
+tasks should be safe to run twice.
+"""
+import logging
+import os
+import socket
+import threading
+import traceback
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from eventhub.db import retry_on_lock
+
+from .models import Task
+from .queue import enqueue, registry
+
+logger = logging.getLogger(__name__)
+
+PERIODIC_PREFIX = 'periodic:'
+
+
+class Worker:
+    def __init__(self, threads=None, poll_interval=None, name=None):
+        """threads=0 runs tasks inline, in the calling thread (tests, debugging)."""
+        self.threads = settings.TASKS_THREADS if threads is None else threads
+        self.poll_interval = poll_interval if poll_interval is not None else settings.TASKS_POLL_INTERVAL
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.processed = 0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def stop(self):
+        """Finish the running tasks, claim no more."""
+        self._stopping.set()
+
+    def run(self, once=False):
+        """Run tasks until stop(), or with once=True until none are due; returns how many ran."""
+        pool = ThreadPoolExecutor(self.threads, thread_name_prefix='task') if self.threads else None
+        running = set()
+        try:
+            while not self._stopping.is_set():
+                try:
+                    retry_on_lock(self.recover)
+                    tasks = retry_on_lock(self.claim, max(self.threads - len(running), 0) if pool else 1)
+                except DatabaseError:
+                    logger.exception("claiming tasks failed")
+                    tasks = []
+                if pool:
+                    running |= {pool.submit(self._execute_in_thread, task) for task in tasks}
+                else:
+                    for task in tasks:
+                        self.execute(task)
+                if running:
+                    _, running = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                elif not tasks:
+                    if once:
+                        break
+                    self._stopping.wait(self.poll_interval)
+        finally:
+            if pool:
+                pool.shutdown(wait=True)
+        return self.processed
+
+    def claim(self, limit):
+        """Mark up to limit due tasks as running by this worker and return them."""
+        if limit < 1:
+            return []
+        now = timezone.now()
+        token = f'{self.name}:{uuid.uuid4().hex[:12]}'
+        with transaction.atomic():
+            due = list(Task.objects.filter(status=Task.Status.QUEUED, run_at__lte=now)
+                       .order_by('run_at', 'id').values_list('pk', flat=True)[:limit])
+            if not due:
+                return []
+            # status is checked again so a concurrent worker's claim wins cleanly
+            Task.objects.filter(pk__in=due, status=Task.Status.QUEUED).update(
+                status=Task.Status.RUNNING, locked_by=token, locked_at=now, attempts=F('attempts') + 1)
+        return list(Task.objects.filter(pk__in=due, locked_by=token).order_by('run_at', 'id'))
+
+    def recover(self):
+        """Fail the attempts of tasks whose worker stopped reporting back."""
+        stale = Task.objects.filter(status=Task.Status.RUNNING,
+                                    locked_at__lt=timezone.now() - timedelta(seconds=settings.TASKS_LOCK_TIMEOUT))
+        for task in stale[:100]:
+            self.failed(task, f"Worker {task.locked_by} didn't finish within {settings.TASKS_LOCK_TIMEOUT}s.")
+
+    def _execute_in_thread(self, task):
+        try:
+            self.execute(task)
+        finally:
+            close_old_connections()
+
+    def execute(self, task):
+        func = registry.get(task.name)
+        try:
+            if func is None:
+                raise LookupError(f"No task registered as {task.name!r}.")
+            func(**task.kwargs)
+        except Exception:
+            logger.exception("task %s failed (attempt %d of %d)", task, task.attempts, task.max_attempts)
+            retry_on_lock(self.failed, task, traceback.format_exc())
+        else:
+            retry_on_lock(self.done, task)
+        finally:
+            with self._lock:
+                self.processed += 1
+            if (task.dedupe_key or '').startswith(PERIODIC_PREFIX):
+                retry_on_lock(self.schedule_periodic, [task.name])
+
+    def done(self, task):
+        Task.objects.filter(pk=task.pk, locked_by=task.locked_by).update(
+            status=Task.Status.DONE, finished_at=timezone.now(), last_error='')
+
+    def failed(self, task, error):
+        mine = Task.objects.filter(pk=task.pk, status=Task.Status.RUNNING, locked_by=task.locked_by)
+        func = registry.get(task.name)
+        if func is not None and task.attempts < task.max_attempts:
+            try:
+                with transaction.atomic():
+                    mine.update(status=Task.Status.QUEUED, run_at=func.retry_at(task.attempts),
+                                last_error=error, locked_by='', locked_at=None)
+                return
+            except IntegrityError:
+                error += "\nNot retried: the same task is queued again already."
+        mine.update(status=Task.Status.FAILED, finished_at=timezone.now(), last_error=error)
+
+    def schedule_periodic(self, names=None):
+        """Queue each TASKS_PERIODIC task to run now, or just names after their interval.
+
+        A periodic task already queued keeps its place (the earlier of the two
+        times wins), so calling this on every worker start is safe.
+        """
+        for name, seconds in settings.TASKS_PERIODIC.items():
+            if names is None or name in names:
+                enqueue(name, run_at=None if names is None else timezone.now() + timedelta(seconds=seconds),
+                        dedupe_key=PERIODIC_PREFIX + name)
+
+
+def prune():
+    """Delete finished tasks older than TASKS_KEEP_DAYS; failed ones are kept twice as long."""
+    now = timezone.now()
+    keep = timedelta(days=settings.TASKS_KEEP_DAYS)
+    return Task.objects.filter(Q(status=Task.Status.DONE, finished_at__lt=now - keep)
+                               | Q(status=Task.Status.FAILED, finished_at__lt=now - 2 * keep)).delete()[0]